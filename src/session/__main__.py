@@ -1,53 +1,122 @@
 import argparse
+import concurrent.futures
+import functools
 import multiprocessing
 import os
+from queue import Queue
 import sys
 import threading
-from typing import Dict, List, Set, Tuple
-import numpy as np
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
 
 os.environ["OPENCV_VIDEOIO_MSMF_ENABLE_HW_TRANSFORMS"] = "0"
-import cv2
-
-from webcam_hand_triangulation.capture.display_loop import display_loop
-from webcam_hand_triangulation.capture.hand_3d_visualization_loop import (
-    hand_3d_visualization_loop,
-)
-from webcam_hand_triangulation.capture.high_priority import set_high_priority
-from webcam_hand_triangulation.capture.landmark_transforms import landmark_transforms
-from webcam_hand_triangulation.capture.cap_reading_loop import cap_reading
-from webcam_hand_triangulation.capture.finalizable_queue import (
-    ProcessFinalizableQueue,
-    ThreadFinalizableQueue,
-)
-from webcam_hand_triangulation.capture.ordering_loop import ordering_loop
-from webcam_hand_triangulation.capture.wrapped import Wrapped
-from webcam_hand_triangulation.capture.models import CameraParams
-from webcam_hand_triangulation.capture.cam_conf import load_cameras_parameters
-
-from .rec_window_loop import rec_window_loop
-from .signal_window_loop import signal_window_loop
-from .recording_loop import recording_loop
-from .processing_loop import processing_loop
-from .emg_couple_loop import emg_coupling_loop
+
+# NOTE: child processes re-import this module, so only light imports are kept at the top level,
+#       the heavy ones (cv2, mediapipe, ...) are done lazily in `main`
+
+from .control import DEFAULT_CONTROL_PORT
+from .dataset_writer import DEFAULT_W, allocate_dataset_file
+from .device_profile import EmgDeviceProfile, load_device_profile
+from .pose_filter import PoseFilterParams
+from .protocol import ProtocolStep, load_protocol
+from .scheduling import StagePolicy, load_scheduling, run_with_policy
+from .shutdown import Shutdown
+from .startup_profile import StartupProfiler, process_main
+
+if TYPE_CHECKING:
+    from webcam_hand_triangulation.capture.models import CameraParams
+
+# Seconds every stage has to drain once the previous one is done
+SHUTDOWN_DEADLINES = {
+    "cameras": 2.0,
+    "coupling": 5.0,  # a few serial read timeouts
+    "processing": 15.0,  # the triangulation backlog
+    "ordering": 5.0,
+    "recording": 120.0,  # writing the in-progress recording
+    "preview": 2.0,
+    "gui": 3.0,
+}
 
 
 def main(
     # datasets
     datasets_path: str,
     # triangulation
-    cameras_params: Dict[int, CameraParams],
+    cameras_params: Dict[int, "CameraParams"],
     desired_window_size: Tuple[int, int],
     triangulation_workers_num: int,
+    pose_filter_params: PoseFilterParams,
     display_cameras: bool,
     draw_origin_landmarks: bool,
+    presence_gating: bool,
+    presence_scale: float,
+    triangulation_cache_size: int,
+    # mjpeg capture
+    mjpeg_mode: Tuple[int, int, int] | None,  # (width, height, fps)
+    preview_decode_scale: int,
     # emg
-    serial_port: str,
-    channels_num: int,
+    serial_ports: List[str],
+    device_profile: EmgDeviceProfile,
     hide_channels: Set[int],
+    W: int,
+    # control
+    headless: bool,
+    preview_rate: float,
+    control_address: Tuple[str, int] | None,
+    protocol_steps: List[ProtocolStep] | None,
+    raw_capture: bool,
+    stage_policies: Dict[str, StagePolicy],
+    profile_startup: bool,
+    memory_profile_period: float | None,
+    memory_profile_frames: int,
 ):
+    profiler = StartupProfiler(profile_startup)
+
+    with profiler.span("import cv2"):
+        import cv2
+        import numpy as np
+
+    with profiler.span("import capture"):
+        from webcam_hand_triangulation.capture.high_priority import set_high_priority
+        from webcam_hand_triangulation.capture.landmark_transforms import (
+            landmark_transforms,
+        )
+        from webcam_hand_triangulation.capture.cap_reading_loop import cap_reading
+        from webcam_hand_triangulation.capture.finalizable_queue import (
+            ProcessFinalizableQueue,
+            ThreadFinalizableQueue,
+        )
+        from webcam_hand_triangulation.capture.ordering_loop import ordering_loop
+        from webcam_hand_triangulation.capture.wrapped import Wrapped
+
+        from .clock_drift import EmgTiming
+        from .control import ControlServer, RecordingStatus
+        from .memory_profile import MemoryProfiler, ReportedSizes, memory_profile_path
+        from .preview_relay import LatestState, preview_relay_loop
+        from .protocol import ProtocolRunner
+        from .raw_capture import RawCaptureWriter, raw_capture_loop, raw_capture_path
+        from .recording_loop import recording_loop
+        from .emg_couple_loop import emg_coupling_loop
+        from .mjpeg_capture import DECODE_FLAGS, mjpeg_cap_reading
+        from .pose_filter import pose_filter_loop
+        from .triangulation_cache import TriangulationCache
+
+    with profiler.span("import mediapipe"):
+        from webcam_hand_triangulation.capture.processing_loop import HandTriangulator
+
+        from .processing_loop import processing_loop
+        from .hand_presence import HandPresenceDetector, HandPresenceGate
+
     set_high_priority()
 
+    def staged(stage: str, target):
+        """Thread target applying the scheduling policy of the stage first"""
+        policy = stage_policies.get(stage)
+        if policy is None:
+            return target
+        return functools.partial(run_with_policy, stage, policy, target)
+
+    channels_num = device_profile.channels * len(serial_ports)
+
     # Validate hide_channels
     if not all(0 <= ch < channels_num for ch in hide_channels):
         invalid_channels = [ch for ch in hide_channels if ch >= channels_num or ch < 0]
@@ -55,6 +124,14 @@ def main(
             f"Invalid channels in hide_channels: {invalid_channels}. All channels must be in range [0, {channels_num})"
         )
 
+    if W <= 0:
+        raise ValueError(f"Chunk size must be positive, got {W}")
+
+    if headless and control_address is None:
+        raise ValueError("Headless session needs the control API to be enabled")
+    if headless:
+        display_cameras = False
+
     # Check camera parameters
     if len(cameras_params) < 2:
         print("Need at least two cameras with calibration data.")
@@ -75,22 +152,18 @@ def main(
             print("Dataset path creation declined. Exiting.")
             return 1
 
-    # Count the number of files in the datasets folder
-    curr_dataset_id = len(os.listdir(datasets_path))
-
-    # Define the current dataset file path
-    curr_dataset_filepath = os.path.join(
-        datasets_path, "flex" + str(curr_dataset_id) + ".z"
-    )
-    if os.path.exists(curr_dataset_filepath):
-        print(f"{os.path.normpath(curr_dataset_filepath)} already exists.")
-        return 1
+    # Reserve the current dataset file
+    curr_dataset_filepath = allocate_dataset_file(datasets_path)
+    print(f"Writing to {os.path.normpath(curr_dataset_filepath)}")
 
     ##########################################################################################
     ###                                     Pipeline                                       ###
     ##########################################################################################
 
-    with multiprocessing.Manager() as manager:
+    with profiler.span("start manager"):
+        manager = multiprocessing.Manager()
+
+    with manager:
         cameras_ids = list(cameras_params.keys())
 
         # Shared
@@ -98,19 +171,139 @@ def main(
         last_frame: List[Wrapped[Tuple[np.ndarray, int] | None]] = [
             Wrapped() for _ in cameras_ids
         ]
+        recording_active = threading.Event()
+        emg_timing = EmgTiming(device_profile.sample_rate)
 
-        # Capture cameras
-        caps: List[threading.Thread] = [
-            threading.Thread(
-                target=cap_reading,
+        # Queues
+        emg_frames_queue = ThreadFinalizableQueue()
+        raw_capture_queue = ThreadFinalizableQueue() if raw_capture else None
+        processing_results = ThreadFinalizableQueue()
+        processed_queues = (
+            [ThreadFinalizableQueue() for _ in cameras_ids] if display_cameras else None
+        )
+        ordered_processing_results = ThreadFinalizableQueue()
+        filtered_angles = ThreadFinalizableQueue()
+        record_control_channels = []
+        rec_window_control_channel = None
+        if not headless:
+            rec_window_control_channel = ProcessFinalizableQueue()
+            record_control_channels.append(rec_window_control_channel)
+        control_requests = Queue() if control_address is not None else None
+        # a single state in flight, the preview relay drops the ones the renderer isn't ready for
+        hand_angles_queue = None if headless else ProcessFinalizableQueue(maxsize=1)
+        signal_chunks_queue = None if headless else ProcessFinalizableQueue()
+        ordered_processed_queues = (
+            [ProcessFinalizableQueue() for _ in cameras_ids]
+            if display_cameras
+            else None
+        )
+
+        # GUI processes are started first, so that their imports overlap with the models loading
+        def start_process(label: str, module: str, func: str, args: Tuple):
+            process = multiprocessing.Process(
+                target=process_main,
                 args=(
-                    idx,
-                    cams_stop_event,
-                    my_last_frame,
-                    cam_param,
+                    label,
+                    module,
+                    func,
+                    args,
+                    profiler.child(label),
+                    stage_policies.get("gui"),
                 ),
                 daemon=True,
             )
+            process.start()
+            return process
+
+        # Headless sessions are driven through the control API only
+        signal_visualizer = None
+        hand_3d_visualizer = None
+        rec_window = None
+        signal_window_sizes = (
+            multiprocessing.Queue()
+            if memory_profile_period is not None and not headless
+            else None
+        )
+        if not headless:
+            # Visualize signal
+            signal_visualizer = start_process(
+                "signal window",
+                "session.signal_window_loop",
+                "signal_window_loop",
+                (
+                    "EMG",
+                    channels_num - len(hide_channels),
+                    cams_stop_event,
+                    signal_chunks_queue,
+                    signal_window_sizes,
+                ),
+            )
+
+            # Visualize 3d hand
+            hand_3d_visualizer = start_process(
+                "3d hand window",
+                "webcam_hand_triangulation.capture.hand_3d_visualization_loop",
+                "hand_3d_visualization_loop",
+                (
+                    desired_window_size,
+                    cams_stop_event,
+                    hand_angles_queue,
+                ),
+            )
+
+            # A save asking worker
+            rec_window = start_process(
+                "rec window",
+                "session.rec_window_loop",
+                "rec_window_loop",
+                (
+                    cams_stop_event,
+                    rec_window_control_channel,
+                ),
+            )
+
+        # Displaying loops
+        display_loops = None
+        if ordered_processed_queues is not None:
+            display_loops = [
+                start_process(
+                    f"display {idx}",
+                    "webcam_hand_triangulation.capture.display_loop",
+                    "display_loop",
+                    (
+                        idx,
+                        cams_stop_event,
+                        frame_queue,
+                    ),
+                )
+                for idx, frame_queue in zip(cameras_ids, ordered_processed_queues)
+            ]
+
+        # Capture cameras
+        caps: List[threading.Thread] = [
+            (
+                threading.Thread(
+                    target=staged("cameras", mjpeg_cap_reading),
+                    args=(
+                        idx,
+                        cams_stop_event,
+                        my_last_frame,
+                        mjpeg_mode,
+                    ),
+                    daemon=True,
+                )
+                if mjpeg_mode is not None
+                else threading.Thread(
+                    target=staged("cameras", cap_reading),
+                    args=(
+                        idx,
+                        cams_stop_event,
+                        my_last_frame,
+                        cam_param,
+                    ),
+                    daemon=True,
+                )
+            )
             for my_last_frame, (idx, cam_param) in zip(
                 last_frame, cameras_params.items()
             )
@@ -118,50 +311,107 @@ def main(
         for process in caps:
             process.start()
 
+        # Load the models of all the processing workers concurrently
+        presence_gate = (
+            HandPresenceGate(
+                recording_active,
+                hold=max(1, round(device_profile.sample_rate / W)),  # ~1s
+            )
+            if presence_gating
+            else None
+        )
+        triangulation_cache = (
+            TriangulationCache(triangulation_cache_size)
+            if triangulation_cache_size > 0
+            else None
+        )
+
+        def load_worker_models(i: int):
+            with profiler.span(f"worker {i} models"):
+                return (
+                    HandTriangulator(
+                        [landmark_transforms[cp.track] for cp in cameras_params.values()],
+                        list(cameras_params.values()),
+                    ),
+                    (
+                        HandPresenceDetector(presence_scale)
+                        if presence_gate is not None
+                        else None
+                    ),
+                )
+
+        with profiler.span("load models"):
+            with concurrent.futures.ThreadPoolExecutor(
+                triangulation_workers_num
+            ) as executor:
+                workers_models = list(
+                    executor.map(load_worker_models, range(triangulation_workers_num))
+                )
+
         # Couple frames and emg
-        emg_frames_queue = ThreadFinalizableQueue()
         coupling_worker = threading.Thread(
-            target=emg_coupling_loop,
+            target=staged("coupling", emg_coupling_loop),
             args=(
-                2,
-                channels_num,
+                W,
+                device_profile,
                 hide_channels,
-                12,
-                serial_port,
+                serial_ports,
                 cams_stop_event,
                 last_frame,
                 emg_frames_queue,
+                raw_capture_queue,
+                emg_timing,
+                stage_policies.get("emg"),
             ),
             daemon=True,
         )
         coupling_worker.start()
 
+        # Keep the raw frames and emg for an offline replay
+        raw_capture_worker = None
+        if raw_capture_queue is not None:
+            raw_capture_worker = threading.Thread(
+                target=raw_capture_loop,
+                args=(
+                    RawCaptureWriter(
+                        raw_capture_path(curr_dataset_filepath),
+                        cameras_ids,
+                        W,
+                        channels_num - len(hide_channels),
+                        device_profile.sample_rate / W,
+                        {"dataset": os.path.basename(curr_dataset_filepath)},
+                    ),
+                    raw_capture_queue,
+                ),
+                daemon=True,
+            )
+            raw_capture_worker.start()
+
         # Processing workers
-        processing_results = ThreadFinalizableQueue()
-        processed_queues = (
-            [ThreadFinalizableQueue() for _ in cameras_ids] if display_cameras else None
-        )
         processing_loops_pool = [
             threading.Thread(
-                target=processing_loop,
+                target=staged("processing", processing_loop),
                 args=(
-                    [landmark_transforms[cp.track] for cp in cameras_params.values()],
+                    triangulator,
                     draw_origin_landmarks,
                     desired_window_size,
                     list(cameras_params.values()),
                     emg_frames_queue,
                     processing_results,
                     processed_queues,
+                    presence_gate,
+                    presence_detector,
+                    triangulation_cache,
+                    DECODE_FLAGS[preview_decode_scale],
                 ),
                 daemon=True,
             )
-            for _ in range(triangulation_workers_num)
+            for triangulator, presence_detector in workers_models
         ]
         for process in processing_loops_pool:
             process.start()
 
         # Sort processing results
-        ordered_processing_results = ThreadFinalizableQueue()
         results_sorter = threading.Thread(
             target=ordering_loop,
             args=(
@@ -172,65 +422,93 @@ def main(
         )
         results_sorter.start()
 
-        # Record and decouple
-        record_control_channel = ProcessFinalizableQueue()
-        hand_angles_queue = ProcessFinalizableQueue()
-        signal_chunks_queue = ProcessFinalizableQueue()
-        recorder = threading.Thread(
-            target=recording_loop,
+        # Smooth poses and bridge short hand dropouts
+        pose_filter = threading.Thread(
+            target=pose_filter_loop,
             args=(
-                manager,
-                record_control_channel,
-                curr_dataset_filepath,
+                pose_filter_params,
+                device_profile.sample_rate / W,
                 ordered_processing_results,
-                hand_angles_queue,
-                signal_chunks_queue,
+                filtered_angles,
             ),
             daemon=True,
         )
-        recorder.start()
+        pose_filter.start()
+
+        # The 3d preview renders only the latest hand at its own rate
+        recording_status = RecordingStatus()
+        hand_angles_latest = None
+        preview_relay = None
+        if hand_angles_queue is not None:
+            hand_angles_latest = LatestState()
+            preview_relay = threading.Thread(
+                target=staged("gui", preview_relay_loop),
+                args=(
+                    hand_angles_latest,
+                    hand_angles_queue,
+                    preview_rate,
+                    recording_status,
+                ),
+                daemon=True,
+            )
+            preview_relay.start()
 
-        # Visualize signal
-        signal_visualizer = multiprocessing.Process(
-            target=signal_window_loop,
+        # Record and decouple
+        recorder_cut_short = threading.Event()
+        recorder = threading.Thread(
+            target=staged("recording", recording_loop),
             args=(
-                "EMG",
-                channels_num - len(hide_channels),
-                cams_stop_event,
+                manager,
+                record_control_channels,
+                curr_dataset_filepath,
+                filtered_angles,
+                hand_angles_latest,
                 signal_chunks_queue,
+                W,
+                channels_num - len(hide_channels),
+                device_profile.sample_rate,
+                {
+                    "device": device_profile.to_metadata(),
+                    "devices_num": len(serial_ports),
+                    "hide_channels": sorted(hide_channels),
+                    "pose_filter": pose_filter_params.to_metadata(),
+                    "triangulator": {},  # HandTriangulator options, its defaults
+                    **(
+                        {"protocol": [step._asdict() for step in protocol_steps]}
+                        if protocol_steps is not None
+                        else {}
+                    ),
+                },
+                recording_active,
+                recording_status,
+                (
+                    ProtocolRunner(protocol_steps, device_profile.sample_rate / W)
+                    if protocol_steps is not None
+                    else None
+                ),
+                emg_timing,
+                control_requests,
+                recorder_cut_short,
             ),
             daemon=True,
         )
-        signal_visualizer.start()
-
-        # Visualize 3d hand
-        hand_3d_visualizer = multiprocessing.Process(
-            target=hand_3d_visualization_loop,
-            args=(
-                desired_window_size,
-                cams_stop_event,
-                hand_angles_queue,
-            ),
-            daemon=True,
-        )
-        hand_3d_visualizer.start()
+        recorder.start()
 
-        # A save asking worker
-        rec_window = multiprocessing.Process(
-            target=rec_window_loop,
-            args=(
+        # Remote control
+        control_server = None
+        if control_address is not None:
+            assert control_requests is not None
+            control_server = ControlServer(
+                *control_address,
+                control_requests,
+                recording_status,
                 cams_stop_event,
-                record_control_channel,
-            ),
-            daemon=True,
-        )
-        rec_window.start()
+            )
+            control_server.start()
 
         # Sort processing workers output
-        ordered_processed_queues = None
         display_ordering_loops = None
-        if processed_queues is not None:
-            ordered_processed_queues = [ProcessFinalizableQueue() for _ in cameras_ids]
+        if processed_queues is not None and ordered_processed_queues is not None:
             display_ordering_loops = [
                 threading.Thread(
                     target=ordering_loop,
@@ -247,61 +525,142 @@ def main(
             for process in display_ordering_loops:
                 process.start()
 
-        # Displaying loops
-        display_loops = None
-        if ordered_processed_queues is not None:
-            display_loops = [
-                multiprocessing.Process(
-                    target=display_loop,
-                    args=(
-                        idx,
-                        cams_stop_event,
-                        frame_queue,
+        profiler.report()
+
+        # Memory of every process, queue and buffer over the session
+        memory_profiler = None
+        if memory_profile_period is not None:
+            sized_queues = {
+                "coupled": emg_frames_queue,
+                "raw_capture": raw_capture_queue,
+                "processed": processing_results,
+                "ordered": ordered_processing_results,
+                "filtered": filtered_angles,
+                "hand_3d_window": hand_angles_queue,
+                "signal_window": signal_chunks_queue,
+                **{
+                    f"display {idx}": queue
+                    for idx, queue in zip(cameras_ids, processed_queues or [])
+                },
+                **{
+                    f"display {idx} ordered": queue
+                    for idx, queue in zip(cameras_ids, ordered_processed_queues or [])
+                },
+            }
+            signal_sizes = (
+                ReportedSizes(signal_window_sizes)
+                if signal_window_sizes is not None
+                else None
+            )
+            memory_profiler = MemoryProfiler(
+                memory_profile_path(curr_dataset_filepath),
+                memory_profile_period,
+                lambda: {
+                    "main": os.getpid(),
+                    "signal window": signal_visualizer and signal_visualizer.pid,
+                    "3d hand window": hand_3d_visualizer and hand_3d_visualizer.pid,
+                    "rec window": rec_window and rec_window.pid,
+                    **{
+                        f"display {idx}": process.pid
+                        for idx, process in zip(cameras_ids, display_loops or [])
+                    },
+                },
+                {
+                    **{
+                        f"queue {name}": lambda queue=queue: queue.qsize()
+                        for name, queue in sized_queues.items()
+                        if queue is not None
+                    },
+                    "recording buffer bytes": lambda: recording_status.snapshot().get(
+                        "buffered_bytes"
                     ),
-                    daemon=True,
-                )
-                for idx, frame_queue in zip(cameras_ids, ordered_processed_queues)
-            ]
-            for process in display_loops:
-                process.start()
+                    **(
+                        {"triangulation cache": lambda: len(triangulation_cache)}
+                        if triangulation_cache is not None
+                        else {}
+                    ),
+                    **(
+                        {
+                            "signal window samples": lambda: signal_sizes.get(
+                                "signal window samples"
+                            )
+                        }
+                        if signal_sizes is not None
+                        else {}
+                    ),
+                },
+                frames=memory_profile_frames,
+                jitter=emg_timing.jitter,
+            )
+            memory_profiler.start()
 
         # Wait for a stop signal
         cams_stop_event.wait()
 
-        # Free resources
+        # Free resources, stage by stage in the pipeline order
         print("Freeing resources...")
-        coupling_worker.join()
-
-        for worker in caps:
-            worker.join()
+        shutdown = Shutdown()
+
+        shutdown.stage("cameras", caps, SHUTDOWN_DEADLINES["cameras"])
+        shutdown.stage("coupling", [coupling_worker], SHUTDOWN_DEADLINES["coupling"])
+        shutdown.stage(
+            "processing",
+            processing_loops_pool + [raw_capture_worker],
+            SHUTDOWN_DEADLINES["processing"],
+        )
 
-        coupling_worker.join()
+        if presence_gate is not None:
+            print(
+                f"Presence gating: {presence_gate.triangulated} triangulated, "
+                f"{presence_gate.probed} probed, {presence_gate.skipped} skipped."
+            )
 
-        for worker in processing_loops_pool:
-            worker.join()
+        if triangulation_cache is not None:
+            print(
+                f"Triangulation cache: {triangulation_cache.hits} hits, {triangulation_cache.misses} misses "
+                f"({triangulation_cache.hit_rate * 100:.1f}% of the triangulations reused)."
+            )
 
         processing_results.finalize()
         if processed_queues is not None:
             for queue in processed_queues:
                 queue.finalize()
 
-        results_sorter.join()
-        if display_ordering_loops is not None:
-            for worker in display_ordering_loops:
-                worker.join()
+        shutdown.stage(
+            "ordering",
+            [results_sorter, pose_filter]
+            + (display_ordering_loops or []),
+            SHUTDOWN_DEADLINES["ordering"],
+        )
 
-        recorder.join()
-        hand_angles_queue.finalize()
-        signal_chunks_queue.finalize()
-        record_control_channel.finalize()
+        # The recorder flushes an in-progress recording and is never abandoned, past its deadline
+        # it skips the remaining frames and is waited for until its archive is closed
+        shutdown.stage(
+            "recording",
+            [recorder],
+            SHUTDOWN_DEADLINES["recording"],
+            overtime=recorder_cut_short.set,
+        )
+        if hand_angles_latest is not None:
+            hand_angles_latest.close()
+        shutdown.stage("preview", [preview_relay], SHUTDOWN_DEADLINES["preview"])
+        for queue in (hand_angles_queue, signal_chunks_queue):
+            if queue is not None:
+                queue.finalize()
+        for queue in record_control_channels:
+            queue.finalize()
 
-        signal_visualizer.join()
-        rec_window.join()
+        if control_server is not None:
+            control_server.close()
 
-        hand_3d_visualizer.join()
-        if display_loops is not None:
-            for worker in display_loops:
-                worker.join()
+        shutdown.stage(
+            "gui",
+            [signal_visualizer, rec_window, hand_3d_visualizer] + (display_loops or []),
+            SHUTDOWN_DEADLINES["gui"],
+        )
+        shutdown.report()
+        if memory_profiler is not None:
+            memory_profiler.close()
 
         cv2.destroyAllWindows()
 
@@ -315,11 +674,24 @@ if __name__ == "__main__":
         default="datasets",
         help="Path to where to append datasets",
     )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="emg_capture",
+        help="EMG device profile: a builtin profile name or a json5 file with baud, channels, bytes_per_channel, payload_bits, delimiter (hex) and sample_rate",
+    )
     parser.add_argument(
         "--channels",
         type=int,
-        default=6,
-        help="Number of channels the EMG device is expected to send",
+        default=None,
+        help="Override the number of channels each EMG device is expected to send",
+    )
+    parser.add_argument(
+        "-w",
+        "--chunk_size",
+        type=int,
+        default=DEFAULT_W,
+        help="Number of EMG samples coupled with a frame set (W), pose rate is sample_rate / W",
     )
     parser.add_argument(
         "--hide_channels",
@@ -345,6 +717,29 @@ if __name__ == "__main__":
         default=8,
         help="Size of triangulation workers pool",
     )
+    parser.add_argument(
+        "--smooth",
+        help="Smooth the hand angles with a One-Euro filter",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--smooth_min_cutoff",
+        type=float,
+        default=1.0,
+        help="One-Euro min cutoff (Hz), lower is smoother for a still hand",
+    )
+    parser.add_argument(
+        "--smooth_beta",
+        type=float,
+        default=0.05,
+        help="One-Euro speed coefficient, higher is less lag on fast motions",
+    )
+    parser.add_argument(
+        "--max_gap",
+        type=int,
+        default=0,
+        help="Max number of frames without a hand to bridge by interpolation instead of pausing the recording (interpolated frames are flagged in the dataset)",
+    )
     parser.add_argument(
         "-dc",
         "--display_cameras",
@@ -354,31 +749,167 @@ if __name__ == "__main__":
     parser.add_argument(
         "-ol", "--origin_landmarks", help="Draw origin landmarks", action="store_true"
     )
+    parser.add_argument(
+        "--presence_gating",
+        help="Skip triangulation of idle frames (no recording and no hand seen recently), probing them with a cheap downscaled hand detection instead",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--presence_scale",
+        type=float,
+        default=0.25,
+        help="Downscale factor of the frames probed for a hand presence",
+    )
+    parser.add_argument(
+        "--control_port",
+        type=int,
+        default=None,
+        help=f"Serve the recording control API (start/pause/continue/save/status) on this localhost port, e.g. {DEFAULT_CONTROL_PORT}",
+    )
+    parser.add_argument(
+        "--control_host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to bind the control API to",
+    )
+    parser.add_argument(
+        "--headless",
+        help="Run without any windows, recording is driven through the control API only (requires --control_port)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--preview_rate",
+        type=float,
+        default=30.0,
+        help="Max render rate of the 3d hand window, it always gets the latest hand and at most one at a time",
+    )
+    parser.add_argument(
+        "--protocol",
+        type=str,
+        default=None,
+        help="json5 protocol file (gestures with durations and rests) to start, save and label the recordings automatically",
+    )
+    parser.add_argument(
+        "--raw_capture",
+        help="Also keep the raw camera frames (MJPG) and EMG next to the dataset (flexN.raw), to re-run the triangulation later with `python -m session.replay`",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--triangulation_cache",
+        type=int,
+        default=32,
+        help="Number of the latest frame sets whose triangulation is reused when the cameras haven't delivered new frames since, 0 to disable",
+    )
+    parser.add_argument(
+        "--mjpeg",
+        type=str,
+        default=None,
+        metavar="WxH@FPS",
+        help="Request MJPEG at the frame size and fps the cameras were calibrated at and keep the frames compressed until a processing worker needs them (less USB bandwidth, no decoding in the capture threads)",
+    )
+    parser.add_argument(
+        "--preview_decode_scale",
+        type=int,
+        choices=[1, 2, 4, 8],
+        default=1,
+        help="Decode the MJPEG frames for the presence probes and the camera windows at 1/N scale, triangulation always gets full frames",
+    )
+    parser.add_argument(
+        "--scheduling",
+        type=str,
+        default=None,
+        help="json5 file of per stage (emg, coupling, cameras, processing, recording, gui) cores, SCHED_FIFO priority and niceness, see src/session/scheduling.py",
+    )
+    parser.add_argument(
+        "--memory_profile",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Sample the memory of every process, the pipeline queues and buffers and the top allocation sites every SECONDS into flexN.mem.jsonl next to the dataset",
+    )
+    parser.add_argument(
+        "--memory_profile_frames",
+        type=int,
+        default=1,
+        help="Traceback depth of the profiled allocation sites, every frame adds to the tracing cost in the main process",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        dest="profile_startup",
+        help="Print a timeline of the imports and initialization costs of the session startup",
+        action="store_true",
+    )
     parser.add_argument(
         "-p",
         "--port",
         type=str,
         required=True,
-        help="Serial port name or 'synthetic' for synthetic data",
+        help="Serial port name or 'synthetic' for synthetic data, comma-separated for several devices read concurrently (their channels are concatenated in the given order)",
+    )
+    parser.add_argument(
+        "-b",
+        "--baud",
+        type=int,
+        default=None,
+        help="Override the baud rate of the EMG device profile",
     )
-    parser.add_argument("-b", "--baud", type=int, default=256000)
     args = parser.parse_args()
 
+    from webcam_hand_triangulation.capture.cam_conf import load_cameras_parameters
+
     desired_window_size = tuple(map(int, args.window_size.split("x")))
     if len(desired_window_size) != 2:
         print("Error: window_size must be a AxB value", file=sys.stderr)
         sys.exit(1)
 
+    mjpeg_mode = None
+    if args.mjpeg is not None:
+        size, _, fps = args.mjpeg.partition("@")
+        mjpeg_mode = (*map(int, size.split("x")), int(fps or 0))
+        if len(mjpeg_mode) != 3 or not fps:
+            print("Error: mjpeg must be a WxH@FPS value", file=sys.stderr)
+            sys.exit(1)
+
     sys.exit(
         main(
             datasets_path=args.datasets_path,
             cameras_params=load_cameras_parameters(args.cfile),
             desired_window_size=desired_window_size,
             triangulation_workers_num=args.workers,
+            pose_filter_params=PoseFilterParams(
+                smooth=args.smooth,
+                min_cutoff=args.smooth_min_cutoff,
+                beta=args.smooth_beta,
+                d_cutoff=1.0,
+                max_gap=args.max_gap,
+            ),
             display_cameras=args.display_cameras,
             draw_origin_landmarks=args.origin_landmarks,
-            serial_port=args.port,
-            channels_num=args.channels,
+            presence_gating=args.presence_gating,
+            presence_scale=args.presence_scale,
+            triangulation_cache_size=args.triangulation_cache,
+            mjpeg_mode=mjpeg_mode,
+            preview_decode_scale=args.preview_decode_scale,
+            serial_ports=args.port.split(","),
+            device_profile=load_device_profile(args.device, args.channels, args.baud),
             hide_channels=args.hide_channels,
+            W=args.chunk_size,
+            headless=args.headless,
+            preview_rate=args.preview_rate,
+            control_address=(
+                (args.control_host, args.control_port)
+                if args.control_port is not None
+                else None
+            ),
+            protocol_steps=(
+                load_protocol(args.protocol) if args.protocol is not None else None
+            ),
+            raw_capture=args.raw_capture,
+            stage_policies=(
+                load_scheduling(args.scheduling) if args.scheduling is not None else {}
+            ),
+            profile_startup=args.profile_startup,
+            memory_profile_period=args.memory_profile,
+            memory_profile_frames=args.memory_profile_frames,
         )
     )
@@ -0,0 +1,284 @@
+import concurrent.futures
+from typing import Iterator, List, NamedTuple, Tuple
+import numpy as np
+
+from .dataset_reader import DatasetReader
+
+# NOTE: a window is `frames` consecutive couples of a segment:
+#       emg (frames * W, C) and the poses at its ends and between the chunks (frames + 1, 20),
+#       the same layout as the segments, so emg[k * W : (k + 1) * W] is between poses[k] and poses[k + 1]
+# NOTE: every augmentation works on a whole batch at once, randomness comes from the given generator only
+
+
+class Windows(NamedTuple):
+    emg: np.ndarray  # (N, T, C) float32, T = frames * W
+    poses: np.ndarray  # (N, frames + 1, 20) float32
+    interpolated: np.ndarray  # (N, frames + 1) bool
+
+
+def read_windows(
+    paths: List[str],
+    frames: int,
+    stride: int,
+    skip_interpolated: bool = False,
+) -> Windows:
+    """All windows of `frames` couples every `stride` couples of the archives (which must share W and C)"""
+    emg: List[np.ndarray] = []
+    poses: List[np.ndarray] = []
+    interpolated: List[np.ndarray] = []
+    shape: Tuple[int, int | None] | None = None
+
+    for path in paths:
+        with DatasetReader(path) as reader:
+            if shape is None:
+                shape = (reader.W, reader.C)
+            elif shape != (reader.W, reader.C):
+                raise ValueError(
+                    f"{path} has W, C = {reader.W}, {reader.C}, expected {shape}"
+                )
+
+            for recording in reader.recordings():
+                for segment in reader.segments(recording):
+                    data = reader.read_segment(recording, segment)
+                    couples = len(data.emg)
+                    if couples < frames:
+                        continue
+
+                    # windows are views of the segment until they are flattened
+                    starts = np.arange(0, couples - frames + 1, stride)
+                    e = np.lib.stride_tricks.sliding_window_view(
+                        data.emg, frames, axis=0
+                    )[starts]
+                    p = np.lib.stride_tricks.sliding_window_view(
+                        data.frames, frames + 1, axis=0
+                    )[starts]
+                    i = np.lib.stride_tricks.sliding_window_view(
+                        data.interpolated, frames + 1
+                    )[starts]
+
+                    if skip_interpolated:
+                        keep = ~i.any(axis=1)
+                        e, p, i = e[keep], p[keep], i[keep]
+
+                    # sliding_window_view puts the window axis last
+                    emg.append(
+                        np.moveaxis(e, -1, 1).reshape(len(e), -1, data.emg.shape[2])
+                    )
+                    poses.append(np.moveaxis(p, -1, 1))
+                    interpolated.append(i)
+
+    if not emg:
+        raise ValueError(f"No windows of {frames} couples in {paths}")
+
+    return Windows(
+        np.concatenate(emg),
+        np.concatenate(poses),
+        np.concatenate(interpolated),
+    )
+
+
+class AugmentParams(NamedTuple):
+    channel_shift: int = 0  # max electrode shift (channels roll) either way, 0 to disable
+    channel_permute: bool = False  # random channel permutation (for unordered electrodes)
+    gain_std: float = 0.0  # std of the per channel log gain
+    noise_snr_db: float | None = None  # additive white noise relative to the channel power
+    warp_std: float = 0.0  # std of the relative speed of the time warp, 0 to disable
+    warp_knots: int = 4  # speed control points of the time warp, at least 2
+
+
+def _gather_channels(emg: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """emg (N, T, C), index (N, C) per window channel order"""
+    return np.take_along_axis(emg, index[:, None, :], axis=2)
+
+
+def channel_shift(
+    emg: np.ndarray, max_shift: int, rng: np.random.Generator
+) -> np.ndarray:
+    N, _, C = emg.shape
+    shifts = rng.integers(-max_shift, max_shift + 1, size=(N, 1))
+    return _gather_channels(emg, (np.arange(C)[None, :] + shifts) % C)
+
+
+def channel_permute(emg: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    N, _, C = emg.shape
+    return _gather_channels(emg, np.argsort(rng.random((N, C)), axis=1))
+
+
+def gain_jitter(emg: np.ndarray, std: float, rng: np.random.Generator) -> np.ndarray:
+    N, _, C = emg.shape
+    gains = np.exp(rng.normal(0.0, std, size=(N, 1, C))).astype(np.float32)
+    return emg * gains
+
+
+def additive_noise(
+    emg: np.ndarray, snr_db: float, rng: np.random.Generator
+) -> np.ndarray:
+    # the signal power of every window channel sets its noise level
+    power = emg.var(axis=1, keepdims=True)
+    std = np.sqrt(power / 10 ** (snr_db / 10)).astype(np.float32)
+    return emg + rng.standard_normal(emg.shape, dtype=np.float32) * std
+
+
+def time_warp(
+    emg: np.ndarray,
+    poses: np.ndarray,
+    std: float,
+    knots: int,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Resamples the windows along a smooth random monotonic time map keeping their ends,
+    the poses are resampled by the same map so they stay coupled with the emg
+    """
+    N, T, _ = emg.shape
+    F = poses.shape[1]  # frames + 1
+    W = T // (F - 1)
+
+    # Random positive speed at the knots, linearly interpolated over the samples
+    speed = np.exp(rng.normal(0.0, std, size=(N, knots)))
+    t = np.linspace(0.0, knots - 1, T)
+    lo = np.minimum(t.astype(np.int64), knots - 2)
+    frac = t - lo
+    speed = speed[:, lo] * (1 - frac) + speed[:, lo + 1] * frac
+
+    # source sample of every output sample, from 0 to T - 1
+    src = np.cumsum(speed, axis=1) - speed[:, :1]
+    src *= (T - 1) / src[:, -1:]
+
+    warped_emg = _interp(emg, src)
+
+    # pose k sits at sample k * W (the last one right after the last chunk)
+    pose_src = np.concatenate((src[:, ::W], np.full((N, 1), float(T))), axis=1) / W
+    warped_poses = _interp(poses, pose_src)
+
+    return warped_emg, warped_poses
+
+
+def _interp(x: np.ndarray, src: np.ndarray) -> np.ndarray:
+    """x (N, L, D) linearly sampled at the fractional positions src (N, M)"""
+    lo = np.clip(np.floor(src).astype(np.int64), 0, x.shape[1] - 1)
+    hi = np.minimum(lo + 1, x.shape[1] - 1)
+    frac = (src - lo)[:, :, None].astype(np.float32)
+    a = np.take_along_axis(x, lo[:, :, None], axis=1)
+    b = np.take_along_axis(x, hi[:, :, None], axis=1)
+    return a + (b - a) * frac
+
+
+def augment(
+    emg: np.ndarray,
+    poses: np.ndarray,
+    params: AugmentParams,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Augmented copies of a batch, emg (N, T, C) float32 and poses (N, frames + 1, 20) float32"""
+    if params.warp_std > 0:
+        emg, poses = time_warp(emg, poses, params.warp_std, params.warp_knots, rng)
+    if params.channel_permute:
+        emg = channel_permute(emg, rng)
+    elif params.channel_shift > 0:
+        emg = channel_shift(emg, params.channel_shift, rng)
+    if params.gain_std > 0:
+        emg = gain_jitter(emg, params.gain_std, rng)
+    if params.noise_snr_db is not None:
+        emg = additive_noise(emg, params.noise_snr_db, rng)
+    return emg, poses
+
+
+_worker_windows: Windows | None = None
+
+
+def _init_worker(paths: List[str], frames: int, stride: int, skip_interpolated: bool):
+    global _worker_windows
+    _worker_windows = read_windows(paths, frames, stride, skip_interpolated)
+
+
+def _augment_batch(
+    index: np.ndarray, params: AugmentParams, seed: np.random.SeedSequence
+) -> Tuple[np.ndarray, np.ndarray]:
+    assert _worker_windows is not None
+    return augment(
+        _worker_windows.emg[index],
+        _worker_windows.poses[index],
+        params,
+        np.random.default_rng(seed),
+    )
+
+
+class AugmentedBatches:
+    """
+    Shuffled augmented batches over the windows of some archives, an epoch per iteration.
+
+    Every batch has its own child seed of `seed`, so the batches don't depend on
+    the number of processes. With `processes` > 0 every worker reads the windows
+    once and only the batch indices are sent to it.
+    """
+
+    def __init__(
+        self,
+        paths: List[str],
+        frames: int,
+        batch_size: int,
+        params: AugmentParams,
+        stride: int = 1,
+        skip_interpolated: bool = False,
+        seed: int | None = None,
+        processes: int = 0,
+        prefetch: int = 4,  # batches in flight per process
+    ):
+        self.windows = read_windows(paths, frames, stride, skip_interpolated)
+        self.batch_size = batch_size
+        self.params = params
+        self.prefetch = prefetch
+        self._seed = np.random.SeedSequence(seed)
+        self._executor = (
+            concurrent.futures.ProcessPoolExecutor(
+                processes,
+                initializer=_init_worker,
+                initargs=(paths, frames, stride, skip_interpolated),
+            )
+            if processes > 0
+            else None
+        )
+        self._processes = processes
+
+    def __len__(self) -> int:
+        return len(self.windows.emg) // self.batch_size
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        epoch_seed, *batch_seeds = self._seed.spawn(len(self) + 1)
+        order = np.random.default_rng(epoch_seed).permutation(len(self.windows.emg))
+        batches = [
+            (order[i * self.batch_size : (i + 1) * self.batch_size], seed)
+            for i, seed in enumerate(batch_seeds)
+        ]
+
+        if self._executor is None:
+            for index, seed in batches:
+                yield augment(
+                    self.windows.emg[index],
+                    self.windows.poses[index],
+                    self.params,
+                    np.random.default_rng(seed),
+                )
+            return
+
+        # Keep a bounded number of batches in flight, in order
+        pending: List[concurrent.futures.Future] = []
+        for index, seed in batches:
+            pending.append(
+                self._executor.submit(_augment_batch, index, self.params, seed)
+            )
+            if len(pending) >= self.prefetch * self._processes:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
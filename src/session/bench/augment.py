@@ -0,0 +1,125 @@
+import argparse
+import os
+import tempfile
+import time
+from typing import Tuple
+import numpy as np
+
+from ..augment import AugmentedBatches, AugmentParams, augment
+from ..dataset_writer import DatasetWriter, HandEmgRecordingSegmentCollector
+
+
+def _per_window(
+    emg: np.ndarray, poses: np.ndarray, params: AugmentParams, rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sample by sample augmentation, as the downstream scripts did it"""
+    out_emg = np.empty_like(emg)
+    out_poses = np.empty_like(poses)
+    for n in range(len(emg)):
+        e, p = emg[n].copy(), poses[n].copy()
+        T, C = e.shape
+        F = len(p)
+        W = T // (F - 1)
+
+        if params.warp_std > 0:
+            knots = np.exp(rng.normal(0.0, params.warp_std, params.warp_knots))
+            speed = np.interp(
+                np.linspace(0, params.warp_knots - 1, T),
+                np.arange(params.warp_knots),
+                knots,
+            )
+            src = np.cumsum(speed) - speed[0]
+            src *= (T - 1) / src[-1]
+            e = np.stack([np.interp(src, np.arange(T), e[:, c]) for c in range(C)], 1)
+            pose_src = np.append(src[::W], T) / W
+            p = np.stack(
+                [np.interp(pose_src, np.arange(F), p[:, j]) for j in range(20)], 1
+            )
+
+        if params.channel_permute:
+            e = e[:, rng.permutation(C)]
+        elif params.channel_shift > 0:
+            shift = rng.integers(-params.channel_shift, params.channel_shift + 1)
+            e = np.roll(e, shift, 1)
+
+        for c in range(C):
+            if params.gain_std > 0:
+                e[:, c] = e[:, c] * np.exp(rng.normal(0.0, params.gain_std))
+            if params.noise_snr_db is not None:
+                std = np.sqrt(e[:, c].var() / 10 ** (params.noise_snr_db / 10))
+                e[:, c] = e[:, c] + rng.normal(0.0, std, T)
+
+        out_emg[n], out_poses[n] = e, p
+    return out_emg, out_poses
+
+
+def write_archive(path: str, couples: int, W: int, C: int):
+    rng = np.random.default_rng(0)
+    collector = HandEmgRecordingSegmentCollector(W)
+    for _ in range(couples + 1):
+        collector.add(
+            rng.standard_normal((W, C), dtype=np.float32),
+            rng.random(20, dtype=np.float32),
+        )
+    with DatasetWriter(path, W) as writer:
+        writer.add_recording().add_segment(collector.finalize())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark per window vs batched augmentation of recorded windows"
+    )
+    parser.add_argument("--couples", type=int, default=20000)
+    parser.add_argument("--frames", type=int, default=16, help="Couples per window")
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("-W", type=int, default=64)
+    parser.add_argument("-C", type=int, default=6)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    params = AugmentParams(channel_shift=1, gain_std=0.1, noise_snr_db=20.0, warp_std=0.2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.z")
+        write_archive(path, args.couples, args.W, args.C)
+
+        with AugmentedBatches([path], args.frames, args.batch, params, seed=0) as batches:
+            emg, poses = batches.windows.emg, batches.windows.poses
+            print(
+                f"{len(emg)} windows of {emg.shape[1]}x{emg.shape[2]} samples, batch {args.batch}"
+            )
+
+            rng = np.random.default_rng(0)
+            n = min(len(emg), 4 * args.batch)
+            start = time.perf_counter()
+            for i in range(0, n, args.batch):
+                _per_window(
+                    emg[i : i + args.batch], poses[i : i + args.batch], params, rng
+                )
+            base = n / (time.perf_counter() - start)
+            print(f"per window : {base:10.0f} windows/s")
+
+            start = time.perf_counter()
+            for i in range(0, n, args.batch):
+                augment(emg[i : i + args.batch], poses[i : i + args.batch], params, rng)
+            r = n / (time.perf_counter() - start)
+            print(f"batched    : {r:10.0f} windows/s ({r / base:5.1f}x)")
+
+            start = time.perf_counter()
+            for _ in batches:
+                pass
+            r = len(batches) * args.batch / (time.perf_counter() - start)
+            print(f"epoch      : {r:10.0f} windows/s ({r / base:5.1f}x)")
+
+        if args.processes > 0:
+            with AugmentedBatches(
+                [path], args.frames, args.batch, params, seed=0, processes=args.processes
+            ) as batches:
+                next(iter(batches))  # let the workers read the windows
+                start = time.perf_counter()
+                for _ in batches:
+                    pass
+                r = len(batches) * args.batch / (time.perf_counter() - start)
+                print(
+                    f"{args.processes:2} procs   : {r:10.0f} windows/s ({r / base:5.1f}x)"
+                )
@@ -0,0 +1,111 @@
+import argparse
+import concurrent.futures
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from ..dataset_writer import (
+    DatasetWriter,
+    HandEmgRecordingSegment,
+    HandEmgRecordingSegmentCollector,
+)
+
+
+class BytesIOCollector:
+    """The previous collector, kept for comparison"""
+
+    def __init__(self):
+        self._bio = io.BytesIO()
+        self._first = True
+
+    def add(self, emg: np.ndarray, frame: np.ndarray):
+        if not self._first:
+            self._bio.write(emg.flatten().tobytes())
+        self._first = False
+        self._bio.write(frame.tobytes())
+
+    def finalize(self) -> bytes:
+        return self._bio.getvalue()
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def run(impl: str, couples: int, W: int, C: int, write: bool):
+    rng = np.random.default_rng(0)
+    emg = rng.random((W, C), dtype=np.float32)
+    frame = rng.random(20, dtype=np.float32)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    collector = (
+        HandEmgRecordingSegmentCollector(W) if impl == "arena" else BytesIOCollector()
+    )
+    for _ in range(couples):
+        collector.add(emg, frame)
+    added = time.perf_counter()
+
+    segment = collector.finalize()
+    finalized = time.perf_counter()
+
+    if write:
+        with tempfile.TemporaryDirectory() as tmp:
+            with DatasetWriter(os.path.join(tmp, "bench.z"), W) as writer:
+                if isinstance(segment, HandEmgRecordingSegment):
+                    writer.add_recording().add_segment(segment)
+                else:
+                    # the previous writer did a single writestr of the whole buffer
+                    assert writer.archive is not None
+                    writer.archive.writestr("recordings/0/segments/0", segment)
+    written = time.perf_counter()
+
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "couples/s": couples / (added - start),
+        "finalize s": finalized - added,
+        "write s": written - finalized,
+        "traced peak MB": traced_peak / 2**20,
+        "peak RSS MB": peak_rss_mb(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark segment collectors on a long recording"
+    )
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--rate", type=float, default=32.0, help="Couples per second")
+    parser.add_argument("-W", type=int, default=64)
+    parser.add_argument("-C", type=int, default=6)
+    parser.add_argument(
+        "--write", help="Also write the segment to an archive", action="store_true"
+    )
+    args = parser.parse_args()
+
+    couples = int(args.minutes * 60 * args.rate)
+    print(f"{couples} couples of W={args.W} C={args.C}")
+
+    # Every implementation runs in a fresh process so peak RSS is its own
+    for impl in ("bytesio", "arena"):
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            stats = executor.submit(
+                run, impl, couples, args.W, args.C, args.write
+            ).result()
+        print(
+            f"{impl:8}: "
+            + ", ".join(
+                f"{k} {v:.2f}" if v is not None else f"{k} n/a"
+                for k, v in stats.items()
+            )
+        )
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from .dataset_reader import DatasetReader
+from .dataset_writer import DATASET_NAME
+
+
+def catalog(
+    datasets_path: str, verify: bool = False, deep: bool = False
+) -> List[Dict[str, Any]]:
+    """One entry per recording of every `flexN.z` in the folder, read from the archive manifests"""
+    entries = []
+    names = [
+        entry.name for entry in os.scandir(datasets_path) if DATASET_NAME.match(entry.name)
+    ]
+    names.sort(key=lambda name: int(DATASET_NAME.match(name).group(1)))  # type: ignore
+    for name in names:
+        path = os.path.join(datasets_path, name)
+        if os.path.getsize(path) == 0:
+            continue  # allocated by a running session
+
+        try:
+            with DatasetReader(path) as reader:
+                manifest = reader.manifest()
+                if manifest is None:
+                    print(f">>> {name} has no manifest, skipped.", file=sys.stderr)
+                    continue
+                bad = reader.verify(deep) if verify else []
+        except Exception as e:
+            print(f">>> Can't read {name}: {e}", file=sys.stderr)
+            continue
+
+        for rec in manifest["recordings"]:
+            entries.append(
+                {
+                    "dataset": name,
+                    "W": manifest["W"],
+                    "C": manifest["C"],
+                    **{k: v for k, v in rec.items() if k != "segments"},
+                    "segments": len(rec["segments"]),
+                    **(
+                        {
+                            "corrupted_segments": [
+                                s["segment"]
+                                for s in rec["segments"]
+                                if f"recordings/{rec['index']}/segments/{s['segment']}"
+                                in bad
+                            ]
+                        }
+                        if verify
+                        else {}
+                    ),
+                }
+            )
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List the recordings of the datasets without decompressing them."
+    )
+    parser.add_argument("datasets_path", type=str, nargs="?", default="datasets")
+    parser.add_argument(
+        "--verify",
+        help="Check the segment members against the manifest checksums",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--deep",
+        help="With --verify, also decompress the segments to check their data",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--json",
+        help="Print JSON lines instead of a table",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    entries = catalog(args.datasets_path, args.verify, args.deep)
+    for e in entries:
+        if args.json:
+            print(json.dumps(e))
+        else:
+            print(
+                f"{e['dataset']:>10} #{e['index']:<4} {e['duration_s'] or 0:8.1f}s"
+                f" {e['couples']:7} couples {e['segments']:3} segments"
+                f" nan {e['nan_values']} interpolated {e['interpolated_frames']}"
+                f" dropped {e['dropped_samples']}"
+                + (f" [{e['gesture']}]" if e["gesture"] else "")
+                + (
+                    f" CORRUPTED {e['corrupted_segments']}"
+                    if e.get("corrupted_segments")
+                    else ""
+                )
+            )
+
+    if args.verify and any(e.get("corrupted_segments") for e in entries):
+        sys.exit(1)
@@ -0,0 +1,119 @@
+import threading
+from typing import Any, Dict, List
+
+
+class ClockDriftEstimator:
+    """
+    Online least squares fit of the host read time against the device sample index,
+    the slope is the true sample period of the device clock.
+
+    A discontinuity of unknown length (e.g. a device reset without a sample counter) starts
+    a new fit segment, the slope is pooled over the segments so the unknown offsets don't matter.
+    """
+
+    def __init__(self, min_samples: int = 2048):
+        self.min_samples = min_samples  # span needed before the estimate is reported
+        self._sxx = 0.0  # pooled over the closed segments
+        self._sxy = 0.0
+        self._span = 0
+        self._start_segment()
+
+    def _start_segment(self):
+        self._n = 0
+        self._mx = 0.0
+        self._my = 0.0
+        self._seg_sxx = 0.0
+        self._seg_sxy = 0.0
+        self._seg_first: int | None = None
+        self._seg_last = 0
+
+    def add(self, sample_index: int, timestamp: float):
+        """`timestamp` of the host when the sample `sample_index` (counted from the start) was read"""
+        if self._seg_first is None:
+            self._seg_first = sample_index
+        self._seg_last = sample_index
+
+        # Welford style update, stays exact over hours of samples
+        x = float(sample_index)
+        self._n += 1
+        dx = x - self._mx
+        self._mx += dx / self._n
+        self._my += (timestamp - self._my) / self._n
+        self._seg_sxx += dx * (x - self._mx)
+        self._seg_sxy += dx * (timestamp - self._my)
+
+    def gap(self):
+        """The next sample index is not continuous with the previous ones"""
+        self._sxx += self._seg_sxx
+        self._sxy += self._seg_sxy
+        if self._seg_first is not None:
+            self._span += self._seg_last - self._seg_first
+        self._start_segment()
+
+    @property
+    def rate(self) -> float | None:
+        """Effective samples per second of the host clock, None until enough samples are seen"""
+        span = self._span
+        if self._seg_first is not None:
+            span += self._seg_last - self._seg_first
+        sxy = self._sxy + self._seg_sxy
+        if span < self.min_samples or sxy <= 0:
+            return None
+        return (self._sxx + self._seg_sxx) / sxy
+
+
+class EmgTiming:
+    """
+    Latest clock and drop stats of every EMG device,
+    updated by the coupling loop and read by the recording loop
+    """
+
+    def __init__(self, nominal_rate: float):
+        self.nominal_rate = nominal_rate
+        self._lock = threading.Lock()
+        self._devices: List[Dict[str, Any]] = []
+        self._jitter: Dict[str, Dict[str, float]] = {}
+
+    def update(self, devices: List[Dict[str, Any]]):
+        with self._lock:
+            self._devices = devices
+
+    def update_jitter(self, jitter: Dict[str, Dict[str, float]]):
+        """`JitterStats` summaries of the EMG path by stage (coupling, every device read)"""
+        with self._lock:
+            self._jitter = jitter
+
+    def jitter(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return dict(self._jitter)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(d) for d in self._devices]
+
+    def effective_rate(self) -> float:
+        """Mean effective rate of the devices, the nominal one while unknown"""
+        rates = [d["rate"] for d in self.snapshot() if d.get("rate") is not None]
+        return sum(rates) / len(rates) if rates else self.nominal_rate
+
+    def recording_metadata(self, start: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Per device stats of a recording, given the snapshot taken at its start"""
+        res = []
+        for i, device in enumerate(self.snapshot()):
+            before = start[i] if i < len(start) else {}
+            rate = device.get("rate")
+            res.append(
+                {
+                    "name": device["name"],
+                    "effective_rate": round(rate, 3) if rate is not None else None,
+                    "drift_ppm": (
+                        round((rate / self.nominal_rate - 1) * 1e6, 1)
+                        if rate is not None
+                        else None
+                    ),
+                    "dropped_samples": device["dropped_samples"]
+                    - before.get("dropped_samples", 0),
+                    "errors": device["errors"] - before.get("errors", 0),
+                }
+            )
+        return res
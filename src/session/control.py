@@ -0,0 +1,201 @@
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Tuple
+
+DEFAULT_CONTROL_PORT = 8765
+REQUEST_TIMEOUT = 2.0  # seconds for the recorder to take an action (it does once per chunk)
+
+
+class RecordingStatus:
+    """
+    Live state of the recorder, updated by `recording_loop` and read by the control server
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status: Dict[str, Any] = {"state": "starting"}
+
+    def update(self, **fields: Any):
+        with self._lock:
+            self._status.update(fields)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._status)
+
+
+class ControlRequest:
+    """An action for `recording_loop` to apply, answered with an error message if it can't"""
+
+    def __init__(self, action: str):
+        self.action = action
+        self.error: str | None = None
+        self.cancelled = False  # the client gave up waiting, not to be applied anymore
+        self._done = threading.Event()
+
+    def reply(self, error: str | None = None):
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._done.wait(timeout)
+
+
+class ControlServer:
+    """
+    Localhost HTTP interface to the recording state machine, the same one the rec window drives:
+
+      GET  /status    live status and metrics
+      POST /start     start a recording (when idle)
+      POST /pause     pause the recording (when recording)
+      POST /continue  continue the paused recording (when paused)
+      POST /save      save the paused recording (when paused)
+      POST /stop      stop the session
+
+    Actions are applied by `recording_loop` itself (taken from `requests` once per chunk), so it
+    publishes the resulting commands to every controller just as for its own state changes,
+    conflicting requests get 409 and ones the recorder didn't take in time get 503.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        requests: queue.Queue,  # of ControlRequest
+        status: RecordingStatus,
+        stop_event: Any,  # Event
+    ):
+        self.requests = requests
+        self.status = status
+        self.stop_event = stop_event
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.control = self  # type: ignore
+
+        self._server = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._httpd.server_address[:2]  # type: ignore
+
+    def start(self):
+        self._server.start()
+        print(f"Control API listening on http://{self.address[0]}:{self.address[1]}")
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def command(self, action: str) -> Tuple[int, str | None]:
+        """Has the action applied, returns the HTTP code and an error message if it wasn't"""
+        if action == "stop":
+            self.stop_event.set()
+            return 200, None
+
+        request = ControlRequest(action)
+        self.requests.put(request)
+        if not request.wait(REQUEST_TIMEOUT):
+            request.cancelled = True
+            return 503, "Recorder is not responding"
+        if request.error is not None:
+            return 409, request.error
+        return 200, None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    ACTIONS = {"/start", "/pause", "/continue", "/save", "/stop"}
+
+    def do_GET(self):
+        if self.path != "/status":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        self._reply(200, self.server.control.status.snapshot())  # type: ignore
+
+    def do_POST(self):
+        if self.path not in self.ACTIONS:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        control: ControlServer = self.server.control  # type: ignore
+        code, error = control.command(self.path[1:])
+        if error is not None:
+            self._reply(code, {"error": error})
+        else:
+            self._reply(code, control.status.snapshot())
+
+    def _reply(self, code: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # requests are not worth a line in the session log
+
+
+class ControlClient:
+    """
+    Client of `ControlServer`, for scripting sessions.
+    Rejected commands raise RuntimeError with the server message.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_CONTROL_PORT,
+        timeout: float = 5.0,
+    ):
+        self.url = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def status(self) -> Dict[str, Any]:
+        return self._request("GET", "/status")
+
+    def start(self) -> Dict[str, Any]:
+        return self._request("POST", "/start")
+
+    def pause(self) -> Dict[str, Any]:
+        return self._request("POST", "/pause")
+
+    def resume(self) -> Dict[str, Any]:
+        return self._request("POST", "/continue")
+
+    def save(self) -> Dict[str, Any]:
+        return self._request("POST", "/save")
+
+    def stop(self) -> Dict[str, Any]:
+        return self._request("POST", "/stop")
+
+    def _request(self, method: str, path: str) -> Dict[str, Any]:
+        request = urllib.request.Request(self.url + path, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read()).get("error", str(e))) from None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Control a running session")
+    parser.add_argument(
+        "action",
+        choices=["status", "start", "pause", "continue", "save", "stop"],
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_CONTROL_PORT)
+    args = parser.parse_args()
+
+    client = ControlClient(args.host, args.port)
+    action = "resume" if args.action == "continue" else args.action
+    try:
+        print(json.dumps(getattr(client, action)(), indent=2))
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        exit(1)
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
+import json
+import re
+import numpy as np
+import yaml
+import zipfile
+
+from .dataset_writer import DEFAULT_W, MANIFEST, MANIFEST_VERSION, recording_manifest
+
+RECORDING_MANIFEST = re.compile(r"^recordings/(\d+)/manifest\.(\d+)\.json$")
+
+
+class HandEmgRecordingSegmentData(NamedTuple):
+    frames: np.ndarray  # (N + 1, 20) float32, the last one is the sigma frame
+    emg: np.ndarray  # (N, W, C) float32, emg[i] is captured between frames[i] and frames[i + 1]
+    interpolated: np.ndarray  # (N + 1,) bool, frames interpolated over a hand dropout
+
+
+class DatasetReader:
+    """
+    A context manager for reading archives written by `DatasetWriter`
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.archive = None
+        self.metadata: Dict[str, Any] = {}
+        self._names_cache: Set[str] | None = None
+
+    def __enter__(self):
+        self.archive = zipfile.ZipFile(self.filename, mode="r")
+        if "metadata.yml" in self.archive.namelist():
+            self.metadata = yaml.safe_load(self.archive.read("metadata.yml")) or {}
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.archive is not None:
+            self.archive.close()
+
+    @property
+    def W(self) -> int:
+        return self.metadata.get("W", DEFAULT_W)
+
+    @property
+    def C(self) -> int | None:
+        return self.metadata.get("C")
+
+    def manifest(self) -> Dict[str, Any] | None:
+        """
+        The summary written by `DatasetWriter.manifest`, None for the archives written before it.
+
+        An archive recovered from a session that didn't close it has no manifest.json,
+        its manifest is put together from the entries every segment left (marked `partial`).
+        """
+        if MANIFEST in self._names():
+            return json.loads(self._archive().read(MANIFEST))
+
+        members: Dict[int, List[Tuple[int, str]]] = {}
+        for name in self._names():
+            m = RECORDING_MANIFEST.match(name)
+            if m is not None:
+                members.setdefault(int(m.group(1)), []).append((int(m.group(2)), name))
+        if not members:
+            return None
+
+        recordings = []
+        for recording in sorted(members):
+            entries = [
+                json.loads(self._archive().read(name))
+                for _, name in sorted(members[recording])
+            ]
+            latest = entries[-1]  # the recording totals are as of its last segment
+            recordings.append(
+                recording_manifest(
+                    recording,
+                    [entry["segment"] for entry in entries],
+                    latest["W"],
+                    latest["rate"],
+                    latest["dropped_samples"],
+                    latest["gesture"],
+                )
+            )
+        return {
+            "version": MANIFEST_VERSION,
+            "pose_format": "AnatomicAngles",
+            "W": latest["W"],
+            "C": latest["C"],
+            "sample_rate": latest["sample_rate"],
+            "recordings": recordings,
+            "partial": True,
+        }
+
+    def verify(self, deep: bool = False) -> List[str]:
+        """
+        Names of the segments not matching the manifest, checked against the zip directory,
+        `deep` also decompresses every segment to check its data against the crc32
+        """
+        manifest = self.manifest()
+        if manifest is None:
+            raise ValueError(f"{self.filename} has no {MANIFEST}")
+
+        bad = []
+        for rec in manifest["recordings"]:
+            for entry in rec["segments"]:
+                name = f"recordings/{rec['index']}/segments/{entry['segment']}"
+                if name not in self._names():
+                    bad.append(name)
+                    continue
+                info = self._archive().getinfo(name)
+                if info.CRC != entry["crc32"] or info.file_size != entry["bytes"]:
+                    bad.append(name)
+                    continue
+                if deep:
+                    try:
+                        with self._archive().open(name) as f:
+                            while f.read(1 << 20):
+                                pass  # the crc is checked by zipfile at the end
+                    except zipfile.BadZipFile:
+                        bad.append(name)
+        return bad
+
+    def recordings(self) -> List[int]:
+        return sorted(
+            {
+                int(name.split("/")[1])
+                for name in self._archive().namelist()
+                if name.startswith("recordings/")
+            }
+        )
+
+    def segments(self, recording: int) -> List[int]:
+        prefix = f"recordings/{recording}/segments/"
+        return sorted(
+            int(name[len(prefix) :])
+            for name in self._archive().namelist()
+            if name.startswith(prefix) and name[len(prefix) :].isdigit()
+        )
+
+    def read_segment(self, recording: int, segment: int) -> HandEmgRecordingSegmentData:
+        C = self.C
+        if C is None:
+            raise ValueError("Number of EMG channels is not set in metadata.yml")
+
+        name = f"recordings/{recording}/segments/{segment}"
+        buff = self._archive().read(name)
+        data = np.frombuffer(buff, dtype=np.float32)
+
+        # [<frame>, [<emg>, <frame>], [<emg>, <frame>], ...]
+        couples = data[20:].view(
+            np.dtype([("emg", np.float32, (self.W, C)), ("frame", np.float32, (20,))])
+        )
+        frames = np.concatenate((data[None, :20], couples["frame"]))
+
+        interpolated = np.zeros(len(frames), dtype=np.bool_)
+        if name + ".interpolated" in self._names():
+            interpolated[:] = np.frombuffer(
+                self._archive().read(name + ".interpolated"), dtype=np.uint8
+            ).astype(np.bool_)
+
+        return HandEmgRecordingSegmentData(frames, couples["emg"], interpolated)
+
+    def _names(self):
+        if self._names_cache is None:
+            self._names_cache = set(self._archive().namelist())
+        return self._names_cache
+
+    def _archive(self) -> zipfile.ZipFile:
+        if self.archive is None:
+            raise RuntimeError("Archive is not open. Use 'with' statement to open it.")
+        return self.archive
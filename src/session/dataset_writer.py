@@ -1,66 +1,134 @@
-from typing import NamedTuple
+from typing import Any, Dict, List, NamedTuple
+import json
 import numpy as np
 import yaml
-import io
+import os
+import re
 import zipfile
 
 # NOTE: `frame` here refers to hand pose angles
+# NOTE: `W` is the number of emg samples coupled with a frame, it's a session parameter
 
-W = 64
+DEFAULT_W = 64  # the value used by the archives written before W was recorded into metadata
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+RECORDING_MANIFEST = "recordings/{recording}/manifest.{segment}.json"
 
 
 class HandEmgRecordingSegment(NamedTuple):
-    buff: bytes
+    blocks: List[memoryview]  # the segment bytes, in order
     channels: int
+    W: int
+    interpolated: bytes  # uint8 flag per frame, 1 if the frame was interpolated over a hand dropout
+
+    @property
+    def nbytes(self) -> int:
+        return sum(block.nbytes for block in self.blocks)
+
+    @property
+    def frames(self) -> int:
+        return len(self.interpolated)
+
+    def nan_values(self) -> int:
+        return sum(
+            int(np.count_nonzero(np.isnan(np.frombuffer(block, dtype=np.float32))))
+            for block in self.blocks
+        )
 
 
 class HandEmgRecordingSegmentCollector:
-    _channels: int | None = None
-    _bio: io.BytesIO
+    """
+    Collects couples in place into preallocated float32 blocks, finalized blocks are handed
+    to the writer as they are - nothing is copied after `add`, growing only allocates a new block.
+    """
 
-    def __init__(self) -> None:
-        self._bio = io.BytesIO()
+    BLOCK_BYTES = 1 << 20
+
+    def __init__(self, W: int) -> None:
+        self.W = W
+        self.reset()
+
+    @property
+    def empty(self) -> bool:
+        return self._channels is None
+
+    @property
+    def allocated_bytes(self) -> int:
+        return sum(block.nbytes for block in self._blocks) + self._block.nbytes
 
     # Assuming emg is captured before frame
     def add(
         self,
         emg: np.ndarray,  # (W, C), float32 expected
         frame: np.ndarray,  # (20,), float32 expected
+        interpolated: bool = False,
     ):
         first = self._channels is None
         if first:
-            self._channels = emg.shape[1]
-
-        C = self._channels
+            self._start(emg.shape[1])
 
-        assert emg.dtype == np.float32, f"EMG dtype must be float32, got {emg.dtype}"
-        assert frame.shape == (20,), f"Frame shape must be (20,), got {frame.shape}"
-        assert (
-            frame.dtype == np.float32
-        ), f"Frame dtype must be float32, got {frame.dtype}"
-        assert (
-            emg.shape[0] == W and emg.shape[1] == C
-        ), f"EMG shape must be ({W}, {C}), got {emg.shape}"
+        if frame.shape != (20,) or frame.dtype != np.float32:
+            raise ValueError(
+                f"Frame must be (20,) float32, got {frame.shape} {frame.dtype}"
+            )
+        if emg.shape != self._emg_shape or emg.dtype != np.float32:
+            raise ValueError(
+                f"EMG must be {self._emg_shape} float32, got {emg.shape} {emg.dtype}"
+            )
 
         # For the first couple, throw early emg
-        if not first:
-            self._bio.write(emg.flatten().tobytes())
-
-        self._bio.write(frame.tobytes())
+        if first:
+            self._block[:20] = frame
+            self._pos = 20
+        else:
+            if self._pos + self._row > len(self._block):
+                self._blocks.append(self._block[: self._pos])
+                self._block = np.empty(
+                    self._rows_per_block * self._row, dtype=np.float32
+                )
+                self._pos = 0
+
+            emg_end = self._pos + self._emg_size
+            self._block[self._pos : emg_end].reshape(self._emg_shape)[...] = emg
+            self._block[emg_end : emg_end + 20] = frame
+            self._pos = emg_end + 20
+
+        self._interpolated.append(interpolated)
 
     def finalize(self):
         assert self._channels is not None, "Number of EMG channels is not set"
 
-        res = HandEmgRecordingSegment(self._bio.getvalue(), self._channels)
+        blocks = self._blocks + [self._block[: self._pos]]
+        res = HandEmgRecordingSegment(
+            [memoryview(block).cast("B") for block in blocks],
+            self._channels,
+            self.W,
+            bytes(self._interpolated),
+        )
 
         self.reset()
 
         return res
 
     def reset(self):
-        del self._bio
-        self._bio = io.BytesIO()
-        self._channels = None
+        self._channels: int | None = None
+        self._blocks: List[np.ndarray] = []
+        self._block = np.empty(0, dtype=np.float32)
+        self._pos = 0
+        self._interpolated = bytearray()
+
+    def _start(self, channels: int):
+        self._channels = channels
+        self._emg_shape = (self.W, channels)
+        self._emg_size = self.W * channels
+        self._row = self._emg_size + 20  # floats per couple
+        self._rows_per_block = max(1, self.BLOCK_BYTES // (4 * self._row))
+
+        # The first block also holds the first frame
+        self._block = np.empty(
+            20 + self._rows_per_block * self._row, dtype=np.float32
+        )
 
 
 class RecordingWriter:
@@ -69,12 +137,17 @@ class RecordingWriter:
 
     Each segment is written in format:
     [ [<20 x float32: frame>, <W x C float32: emg>], [...], ... <20 x float32: sigma frame> ]
+
+    If any frame of the segment was interpolated over a hand dropout, a sidecar member
+    `<segment>.interpolated` holds a uint8 flag per frame.
     """
 
     def __init__(self, context: "DatasetWriter", index: int):
         self.context = context
         self.index = index
         self.count = 0
+        self.metadata: Dict[str, Any] = {}  # stored under `recordings` in metadata.yml
+        self.segments: List[Dict[str, Any]] = []  # manifest entries of the written segments
 
     def add_segment(self, segment: HandEmgRecordingSegment):
         """
@@ -93,19 +166,130 @@ class RecordingWriter:
         if self.context.C is None:
             # Store C for metadata
             self.context.C = C
-            self.context.archive.writestr(
-                "metadata.yml", yaml.dump({"pose_format": "AnatomicAngles", "C": C})
-            )
 
         elif self.context.C != C:
             raise ValueError("Inconsistent number of EMG channels across recordings.")
 
-        # Save the segment
+        if self.context.W != segment.W:
+            raise ValueError(
+                f"Segment chunk size {segment.W} doesn't match the dataset chunk size {self.context.W}."
+            )
+
+        if self.count == 0:
+            self.context.recordings.append(self)
+
+        # Save the segment, streaming the blocks
+        name = f"recordings/{self.index}/segments/{self.count}"
+        with self.context.archive.open(
+            name,
+            mode="w",
+            force_zip64=segment.nbytes > zipfile.ZIP64_LIMIT,
+        ) as dest:
+            for block in segment.blocks:
+                dest.write(block)
+        interpolated_frames = sum(segment.interpolated)
+        if interpolated_frames:
+            self.context.archive.writestr(
+                f"{name}.interpolated",
+                segment.interpolated,
+            )
+
+        # the crc is the one zip computed while writing, so the manifest costs no extra pass over the data
+        info = self.context.archive.getinfo(name)
+        rate = self._rate(self.context.sample_rate)
+
+        # time ranges are seconds since the session start if the coupling indices are known
+        # (`couples` metadata), since the recording start otherwise
+        ranges = self.metadata.get("couples")
+        first = (
+            ranges[self.count][0]
+            if isinstance(ranges, list) and len(ranges) > self.count
+            else sum(entry["frames"] for entry in self.segments)
+        )
+        entry = {
+            "segment": self.count,
+            "frames": segment.frames,
+            "couples": segment.frames - 1,
+            "nan_values": segment.nan_values(),
+            "interpolated_frames": interpolated_frames,
+            "bytes": info.file_size,
+            "crc32": info.CRC,
+            "start_s": couples_seconds(first, self.context.W, rate),
+            "end_s": couples_seconds(first + segment.frames, self.context.W, rate),
+        }
+        self.segments.append(entry)
+
+        # The manifest.json is written on close only, so every segment also leaves its own entry,
+        # those of a recovered archive (e.g. `zip -FF` after a crash) remain
         self.context.archive.writestr(
-            f"recordings/{self.index}/segments/{self.count}", segment.buff
+            RECORDING_MANIFEST.format(recording=self.index, segment=self.count),
+            json.dumps(
+                {
+                    "W": self.context.W,
+                    "C": self.context.C,
+                    "sample_rate": self.context.sample_rate,
+                    "index": self.index,
+                    "segment": entry,
+                    "rate": rate,
+                    "dropped_samples": self._dropped_samples(),
+                    "gesture": self.metadata.get("gesture"),
+                }
+            ),
         )
         self.count += 1
 
+    def _rate(self, sample_rate: float | None) -> float | None:
+        """The device clock as estimated on the host if known, `sample_rate` otherwise"""
+        rates = [
+            device["effective_rate"]
+            for device in self.metadata.get("emg_timing", [])
+            if device.get("effective_rate") is not None
+        ]
+        return sum(rates) / len(rates) if rates else sample_rate
+
+    def _dropped_samples(self) -> int:
+        return sum(
+            device.get("dropped_samples", 0)
+            for device in self.metadata.get("emg_timing", [])
+        )
+
+    def manifest(self, sample_rate: float | None) -> Dict[str, Any]:
+        """Summary of the recording, see `recording_manifest`"""
+        return recording_manifest(
+            self.index,
+            self.segments,
+            self.context.W,
+            self._rate(sample_rate),
+            self._dropped_samples(),
+            self.metadata.get("gesture"),
+        )
+
+
+def couples_seconds(couples: int, W: int, rate: float | None) -> float | None:
+    return round(couples * W / rate, 3) if rate else None
+
+
+def recording_manifest(
+    index: int,
+    segments: List[Dict[str, Any]],  # entries of the segments, in order
+    W: int,
+    rate: float | None,
+    dropped_samples: int,
+    gesture: str | None,
+) -> Dict[str, Any]:
+    """Manifest entry of a recording, totals put together from the entries of its segments"""
+    couples = sum(entry["couples"] for entry in segments)
+    return {
+        "index": index,
+        "segments": segments,
+        "couples": couples,
+        "duration_s": couples_seconds(couples, W, rate),
+        "nan_values": sum(entry["nan_values"] for entry in segments),
+        "interpolated_frames": sum(entry["interpolated_frames"] for entry in segments),
+        "dropped_samples": dropped_samples,
+        "gesture": gesture,
+    }
+
 
 class DatasetWriter:
     """
@@ -114,11 +298,15 @@ class DatasetWriter:
     Archive looks like this:
 
     dataset.zip/
-      metadata.yml
+      metadata.yml  (written on close: session metadata + per recording metadata)
+      manifest.json  (written on close: per recording and segment summary, see `manifest`)
       recordings/
         1/
+          manifest.1.json  (the manifest entry of the segment 1)
+          manifest.2.json
           segments/
            1
+           1.interpolated  (optional)
            2
         2/
           segments/
@@ -126,11 +314,19 @@ class DatasetWriter:
             2
     """
 
-    def __init__(self, filename: str):
+    def __init__(
+        self,
+        filename: str,
+        W: int,
+        metadata: Dict[str, Any] | None = None,
+    ):
         self.filename = filename
         self.archive = None
         self.recording_index = -1
+        self.W = W  # Number of emg samples per frame
         self.C: int | None = None  # To store the number of EMG channels
+        self.metadata: Dict[str, Any] = dict(metadata or {})  # session-wide metadata
+        self.recordings: List[RecordingWriter] = []  # recordings having segments
 
     def __enter__(self):
         self.archive = zipfile.ZipFile(
@@ -143,8 +339,37 @@ class DatasetWriter:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.archive is not None:
+            self.archive.writestr("metadata.yml", yaml.dump(self._metadata()))
+            self.archive.writestr(MANIFEST, json.dumps(self.manifest()))
             self.archive.close()
 
+    def _metadata(self) -> Dict[str, Any]:
+        return {
+            "pose_format": "AnatomicAngles",
+            "W": self.W,
+            "C": self.C,
+            **self.metadata,
+            "recordings": {rec.index: rec.metadata for rec in self.recordings},
+        }
+
+    def manifest(self) -> Dict[str, Any]:
+        """
+        A few KB summary of the archive (sizes in couples, time ranges, NaN and loss counts,
+        crc32 of the segment members), so catalogs don't need to decompress any segment
+        """
+        return {
+            "version": MANIFEST_VERSION,
+            "pose_format": "AnatomicAngles",
+            "W": self.W,
+            "C": self.C,
+            "sample_rate": self.sample_rate,
+            "recordings": [rec.manifest(self.sample_rate) for rec in self.recordings],
+        }
+
+    @property
+    def sample_rate(self) -> float | None:
+        return self.metadata.get("device", {}).get("sample_rate")
+
     def add_recording(self):
         """
         NOTE: recording is actually written only after calling RecordingWriter.add,
@@ -152,3 +377,51 @@ class DatasetWriter:
         """
         self.recording_index += 1
         return RecordingWriter(self, self.recording_index)
+
+
+DATASET_NAME = re.compile(r"^flex(\d+)\.z$")
+NEXT_INDEX_HINT = ".flex_next"  # index to try first, saves scanning the datasets folder
+
+
+def allocate_dataset_file(datasets_path: str) -> str:
+    """
+    Reserve the next free `flexN.z` in the datasets folder by creating it exclusively (O_EXCL),
+    so concurrent sessions on a shared volume never get the same file.
+
+    The first candidate comes from a hint file, the folder is scanned only if the hint is missing.
+    A stale hint only costs an extra exclusive create per taken index.
+    """
+    hint_path = os.path.join(datasets_path, NEXT_INDEX_HINT)
+    try:
+        with open(hint_path, "r") as f:
+            index = int(f.read().strip())
+    except (OSError, ValueError):
+        index = max(
+            (
+                int(m.group(1)) + 1
+                for entry in os.scandir(datasets_path)
+                if (m := DATASET_NAME.match(entry.name))
+            ),
+            default=0,
+        )
+
+    while True:
+        filepath = os.path.join(datasets_path, f"flex{index}.z")
+        try:
+            fd = os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            index += 1
+            continue
+        os.close(fd)
+        break
+
+    # Best effort, the replace is atomic so a concurrent reader never sees a partial hint
+    tmp_path = f"{hint_path}.{os.getpid()}"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(str(index + 1))
+        os.replace(tmp_path, hint_path)
+    except OSError:
+        pass
+
+    return filepath
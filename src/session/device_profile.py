@@ -0,0 +1,122 @@
+import os
+from typing import Any, Dict, NamedTuple
+import json5
+
+
+class EmgDeviceProfile(NamedTuple):
+    """
+    Wire protocol of an EMG device
+
+    Every packet is `channels` little-endian unsigned values of `bytes_per_channel` bytes
+    each (only the lower `payload_bits` are used), optionally followed by a little-endian
+    wrapping sample counter of `counter_bytes` bytes, followed by the `delimiter`.
+    """
+
+    baud: int
+    channels: int
+    bytes_per_channel: int
+    payload_bits: int
+    delimiter: bytes
+    sample_rate: float  # packets per second
+    counter_bytes: int = 0  # 0 if the device doesn't send a sample counter
+
+    @property
+    def packet_size(self) -> int:
+        return (
+            self.channels * self.bytes_per_channel
+            + self.counter_bytes
+            + len(self.delimiter)
+        )
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.packet_size * self.sample_rate
+
+    def validate(self):
+        if self.channels <= 0:
+            raise ValueError(f"Device must have channels, got {self.channels}")
+        if not 1 <= self.bytes_per_channel <= 4:
+            raise ValueError(
+                f"bytes_per_channel must be in [1, 4], got {self.bytes_per_channel}"
+            )
+        if not 1 <= self.payload_bits <= 8 * self.bytes_per_channel:
+            raise ValueError(
+                f"payload_bits must be in [1, {8 * self.bytes_per_channel}], got {self.payload_bits}"
+            )
+        if len(self.delimiter) == 0:
+            raise ValueError("Delimiter must not be empty")
+        if not 0 <= self.counter_bytes <= 4:
+            raise ValueError(
+                f"counter_bytes must be in [0, 4], got {self.counter_bytes}"
+            )
+        if self.sample_rate <= 0:
+            raise ValueError(f"sample_rate must be positive, got {self.sample_rate}")
+        if self.bytes_per_second * 10 > self.baud:  # 8N1 framing costs 10 bits per byte
+            print(
+                f">>> Warning: {self.bytes_per_second:.0f} B/s at {self.baud} baud"
+                " exceeds the serial link capacity."
+            )
+
+    def to_metadata(self) -> Dict[str, Any]:
+        return {
+            "baud": self.baud,
+            "channels": self.channels,
+            "bytes_per_channel": self.bytes_per_channel,
+            "payload_bits": self.payload_bits,
+            "delimiter": self.delimiter.hex(),
+            "sample_rate": self.sample_rate,
+            "counter_bytes": self.counter_bytes,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "EmgDeviceProfile":
+        return cls(
+            baud=int(d["baud"]),
+            channels=int(d["channels"]),
+            bytes_per_channel=int(d["bytes_per_channel"]),
+            payload_bits=int(d["payload_bits"]),
+            delimiter=bytes.fromhex(d["delimiter"]),
+            sample_rate=float(d["sample_rate"]),
+            counter_bytes=int(d.get("counter_bytes", 0)),
+        )
+
+
+DEVICE_PROFILES: Dict[str, EmgDeviceProfile] = {
+    # src/emg_capture firmware
+    "emg_capture": EmgDeviceProfile(
+        baud=256000,
+        channels=6,
+        bytes_per_channel=2,
+        payload_bits=12,
+        delimiter=b"\xff\xff",
+        sample_rate=2048.0,
+    ),
+}
+
+
+def load_device_profile(
+    name_or_path: str,
+    channels: int | None = None,
+    baud: int | None = None,
+) -> EmgDeviceProfile:
+    """
+    Load a builtin profile by name or a json5 file with the `EmgDeviceProfile` fields
+    (delimiter is a hex string, e.g. "ffff"), optionally overriding channels and baud.
+    """
+    if name_or_path in DEVICE_PROFILES:
+        profile = DEVICE_PROFILES[name_or_path]
+    elif os.path.exists(name_or_path):
+        with open(name_or_path, "r") as f:
+            profile = EmgDeviceProfile.from_dict(json5.load(f))
+    else:
+        raise ValueError(
+            f"Unknown device profile '{name_or_path}', expected one of {list(DEVICE_PROFILES)} or a json5 file"
+        )
+
+    if channels is not None:
+        profile = profile._replace(channels=channels)
+    if baud is not None:
+        profile = profile._replace(baud=baud)
+
+    profile.validate()
+    return profile
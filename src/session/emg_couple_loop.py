@@ -4,77 +4,163 @@ import time
 from typing import List, Set, Tuple
 import cv2
 import numpy as np
-from session.dataset_writer import W
-from session.emg_device import EmgDevice
+from session.clock_drift import EmgTiming
+from session.device_profile import EmgDeviceProfile
+from session.emg_reader import EmgMerger, EmgReader
+from session.messages import CoupledFrames
+from session.mjpeg_capture import CompressedFrame
+from session.scheduling import JitterStats, StagePolicy
 from webcam_hand_triangulation.capture.fps_counter import FPSCounter
 from webcam_hand_triangulation.capture.finalizable_queue import FinalizableQueue
 from webcam_hand_triangulation.capture.wrapped import Wrapped
 
+HEALTH_REPORT_PERIOD = 30.0  # seconds
+JITTER_UPDATE_PERIOD = 5.0  # seconds, the summaries sort their windows
+MAX_RAW_BACKLOG = 64  # couples waiting for the raw capture writer with their frames
+
 
 def emg_coupling_loop(
-    bytes_per_channel: int,
-    channels: int,
+    W: int,
+    device_profile: EmgDeviceProfile,
     hide_channels: Set[int],
-    payload_bits: int,
-    serial_port: str,
+    serial_ports: List[str],
     stop_event: multiprocessing.synchronize.Event,
     last_frame: List[Wrapped[Tuple[np.ndarray, int] | None]],
     coupled_emg_frames_queue: FinalizableQueue,
+    raw_capture_queue: FinalizableQueue | None = None,
+    emg_timing: EmgTiming | None = None,
+    reader_policy: StagePolicy | None = None,
 ):
-    # Create mask for channels to keep
-    keep_channels = [i for i in range(channels) if i not in hide_channels]
+    # Create mask for channels to keep, channels of the devices are concatenated in the ports order
+    keep_channels = [
+        i
+        for i in range(device_profile.channels * len(serial_ports))
+        if i not in hide_channels
+    ]
 
     # Wait until at least one frame is available from all cameras
     while True:
         if all(a_last_frame.get() is not None for a_last_frame in last_frame):
             break
+        if stop_event.is_set():
+            coupled_emg_frames_queue.finalize()
+            if raw_capture_queue is not None:
+                raw_capture_queue.finalize()
+            return
         time.sleep(0.1)
 
     fps_counter = FPSCounter()
     index = 0
 
-    with EmgDevice(
-        bytes_per_channel,
-        payload_bits,
-        channels,
-        serial_port,
-    ) as emg_capture:
-        emg_capture.position_head()
-
-        while True:
-            if stop_event.is_set():
-                break
-
-            try:
-                signal_chunk = emg_capture.read_packets(W)
-                signal_chunk = signal_chunk[:, keep_channels]
-            except Exception as e:
-                print(">>> Error reading EMG:", e)
-
-                # send chunk full of NaNs in case of error
-                signal_chunk = np.full((W, len(keep_channels)), np.nan)
-
-            frames = []
-            for frame in last_frame:
-                v = frame.get()
-                assert v is not None
-                frame, fps = v
-                frames.append((cv2.flip(frame, 1), fps))
-
-            # Send coupled postfactum frames + signal
-            coupled_emg_frames_queue.put(
-                (
-                    index,
-                    frames,
-                    fps_counter.get_fps(),
-                    signal_chunk,
+    # Cameras are sampled faster than they may deliver, a new frame is a new object in `last_frame`,
+    # so frames are numbered per camera by identity (and flipped only once,
+    # compressed frames are flipped by the worker that decodes them)
+    frame_objs: List[np.ndarray | CompressedFrame | None] = [None] * len(last_frame)
+    flipped_frames: List[np.ndarray | CompressedFrame | None] = [None] * len(
+        last_frame
+    )
+    frame_seqs = [-1] * len(last_frame)
+
+    print(
+        f"Coupling {W} EMG samples per frame set (~{device_profile.sample_rate / W:.1f} pose samples per second)."
+    )
+
+    # Every device is read concurrently in its own reader
+    readers = [
+        EmgReader(f"EMG device {i} ({port})", W, device_profile, port, reader_policy)
+        for i, port in enumerate(serial_ports)
+    ]
+    emg_capture = EmgMerger(readers, device_profile.sample_rate)
+
+    last_health_report = time.time()
+    last_health = emg_capture.health()
+    jitter = JitterStats(W / device_profile.sample_rate)
+    last_jitter_update = time.time()
+
+    while True:
+        if stop_event.is_set():
+            break
+
+        signal_chunk = emg_capture.read()[:, keep_channels]
+
+        frames = []
+        for cam, frame in enumerate(last_frame):
+            v = frame.get()
+            assert v is not None
+            frame, fps = v
+            if frame is not frame_objs[cam]:
+                frame_objs[cam] = frame
+                flipped_frames[cam] = (
+                    frame if isinstance(frame, CompressedFrame) else cv2.flip(frame, 1)
+                )
+                frame_seqs[cam] += 1
+            frames.append((flipped_frames[cam], fps))
+
+        # Send coupled postfactum frames + signal
+        item = CoupledFrames(
+            index,
+            frames,
+            fps_counter.get_fps(),
+            signal_chunk,
+            tuple(frame_seqs),
+        )
+        coupled_emg_frames_queue.put(item)
+        if raw_capture_queue is not None:
+            if raw_capture_queue.qsize() < MAX_RAW_BACKLOG:
+                raw_capture_queue.put(item)
+            else:
+                # the writer fell behind, the couple goes without its frames
+                raw_capture_queue.put(
+                    CoupledFrames(
+                        index,
+                        [(None, fps) for _, fps in frames],
+                        item.coupling_fps,
+                        signal_chunk,
+                        t_coupled=item.t_coupled,
+                    )
+                )
+        index += 1
+        fps_counter.count()
+        jitter.add(time.perf_counter())
+
+        if emg_timing is not None:
+            emg_timing.update(emg_capture.timing())
+            if time.time() - last_jitter_update > JITTER_UPDATE_PERIOD:
+                last_jitter_update = time.time()
+                emg_timing.update_jitter(
+                    {
+                        "coupling": jitter.summary(),
+                        **{h["name"]: h["jitter"] for h in emg_capture.health()},
+                    }
                 )
+
+        # Report devices health if something went wrong since the last report
+        if time.time() - last_health_report > HEALTH_REPORT_PERIOD:
+            last_health_report = time.time()
+            health = emg_capture.health()
+            if any(
+                (h["errors"], h["dropped"], h["timeouts"], h["dropped_samples"])
+                != (l["errors"], l["dropped"], l["timeouts"], l["dropped_samples"])
+                for h, l in zip(health, last_health)
+            ):
+                print(">>> EMG devices health:", health)
+            last_health = health
+
+            # Jitter above a half of the chunk period is worth a scheduling policy
+            worst = max(
+                j.get("p99_ms", 0.0)
+                for j in [jitter.summary()] + [h["jitter"] for h in health]
             )
-            index += 1
-            fps_counter.count()
+            if worst > 500 * W / device_profile.sample_rate:
+                print(
+                    f">>> EMG path jitter (p99 {worst:.1f} ms) is above a half chunk period,"
+                    " consider --scheduling."
+                )
 
-            if np.isnan(signal_chunk).any():
-                print(">>> EMG signal failure detected, resetting EMG device.")
-                emg_capture.position_head()
+    emg_capture.close()
+    print("EMG devices health:", emg_capture.health())
+    print("Coupling jitter:", jitter.summary())
 
-        coupled_emg_frames_queue.finalize()
+    coupled_emg_frames_queue.finalize()
+    if raw_capture_queue is not None:
+        raw_capture_queue.finalize()
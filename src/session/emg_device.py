@@ -1,46 +1,67 @@
-from typing import Any
 import numpy as np
 import serial
 
+from .device_profile import EmgDeviceProfile
 from .synthetic_serial import SyntheticSerial
 
+MIN_READ_TIMEOUT = 1.0  # seconds
+
+
+def read_timeout(W: int, sample_rate: float) -> float:
+    """Serial read timeout, a few chunk periods so a stuck device can't block forever"""
+    return max(MIN_READ_TIMEOUT, 4 * W / sample_rate)
+
 
 class EmgDevice:
     def __init__(
         self,
-        bytes_per_channel: int,
-        payload_bits: int,
-        channels: int,
+        profile: EmgDeviceProfile,
         serial_port: str,
+        W: int,  # packets per read
     ):
-        self.channels = channels
-        self.bytes_per_channel = bytes_per_channel
-        self.payload_bits = payload_bits
-        self.packet_size = channels * bytes_per_channel
-        self.packet_with_delimiter_size = self.packet_size + self.bytes_per_channel
-        self.delimiter_etalon = b"\xff" * self.bytes_per_channel
+        self.profile = profile
+        self.read_timeout = read_timeout(W, profile.sample_rate)
+        self.channels = profile.channels
+        self.bytes_per_channel = profile.bytes_per_channel
+        self.payload_bits = profile.payload_bits
+        self.packet_size = self.channels * self.bytes_per_channel
+        self.counter_bytes = profile.counter_bytes
+        self.frame_size = self.packet_size + self.counter_bytes  # all before the delimiter
+        self.packet_with_delimiter_size = self.frame_size + len(profile.delimiter)
+        self.delimiter_etalon = profile.delimiter
         self.max_value = (1 << self.payload_bits) - 1
         self.dtype = f"<u{self.bytes_per_channel}"  # Little-endian unsigned int
 
+        self._delimiter = np.frombuffer(self.delimiter_etalon, dtype=np.uint8)
+
+        # Samples lost on the way, known only if the device sends a sample counter
+        self.dropped_samples = 0
+        self._last_counter: int | None = None
+
         if serial_port == "synthetic":
             # Use synthetic data generator
-            self.ser = SyntheticSerial(channels)
+            self.ser = SyntheticSerial(profile, self.read_timeout)
             print("Starting synthetic data mode...")
         else:
             # Open real serial connection
             try:
-                self.ser = serial.Serial(serial_port, 256000, timeout=None)
+                self.ser = serial.Serial(
+                    serial_port, profile.baud, timeout=self.read_timeout
+                )
 
-                # Increase serial input buffer size if supported (Windows/Linux only)
+                # Increase serial input buffer size if supported (Windows/Linux only),
+                # enough to hold ~250ms of the stream
                 if hasattr(self.ser, "set_buffer_size"):
-                    self.ser.set_buffer_size(rx_size=4096)
+                    self.ser.set_buffer_size(
+                        rx_size=max(4096, int(profile.bytes_per_second / 4))
+                    )
 
-                print(f"Listening on {serial_port}...")
+                print(f"Listening on {serial_port} at {profile.baud} baud...")
             except Exception as e:
                 raise ValueError(f"Serial connection error: {e}")
 
     def position_head(self):
-        # Read a bunch of data that contains a \ff for sure (assuming uncorrupted)
+        # Read a bunch of data that contains a delimiter for sure (assuming uncorrupted)
         incoming = self.ser.read(2 * self.packet_with_delimiter_size)
 
         # get the last packet part
@@ -51,40 +72,62 @@ class EmgDevice:
             )
 
         # eat up the rest of the packet so that head is at the right position
-        self.ser.read(delimiter_index - self.packet_size)
+        self.ser.read(delimiter_index - self.frame_size)
 
     def read_packets(self, amount: int) -> np.ndarray:
         data = self.ser.read(amount * self.packet_with_delimiter_size)
+        if len(data) != amount * self.packet_with_delimiter_size:
+            raise ValueError("Malformed packet: Incomplete read")
+
+        # View the data as rows of packet + delimiter
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(
+            amount, self.packet_with_delimiter_size
+        )
+
+        # Check if all the delimiters are correct
+        if not (raw[:, self.frame_size :] == self._delimiter).all():
+            raise ValueError("Malformed packet: Incorrect delimiter")
+
+        if self.counter_bytes:
+            self._count_drops(raw[:, self.packet_size : self.frame_size])
+
+        # Parse the packets data into (amount, channels)
+        packets = self._decode(raw[:, : self.packet_size])
+
+        # Normalize the packet data to [0, 1]
+        return packets.astype(np.float32) / self.max_value
+
+    def _count_drops(self, counter_bytes: np.ndarray):
+        counters = np.zeros(len(counter_bytes), dtype=np.int64)
+        for i in range(self.counter_bytes):
+            counters |= counter_bytes[:, i].astype(np.int64) << (8 * i)
+
+        # gaps between consecutive counters (also across reads and resets), modulo the wrap
+        if self._last_counter is not None:
+            counters = np.concatenate(([self._last_counter], counters))
+        gaps = (np.diff(counters) - 1) % (1 << (8 * self.counter_bytes))
+        self.dropped_samples += int(gaps.sum())
+        self._last_counter = int(counters[-1])
+
+    def _decode(self, payload: np.ndarray) -> np.ndarray:
+        if self.bytes_per_channel in (1, 2, 4):
+            return (
+                np.ascontiguousarray(payload)
+                .view(self.dtype)
+                .reshape(-1, self.channels)
+            )
 
-        # Split the data into packets and delimiters
-        packets: Any = [None] * amount
-        for i in range(amount):
-            start = i * self.packet_with_delimiter_size
-            end = start + self.packet_with_delimiter_size
-            packet_with_delimiter = data[start:end]
-
-            # Check if the delimiter is correct
-            delimiter = packet_with_delimiter[
-                self.packet_size : self.packet_with_delimiter_size
-            ]
-            if delimiter != self.delimiter_etalon:
-                raise ValueError("Malformed packet: Incorrect delimiter")
-
-            # Extract the packet data
-            packet_data = packet_with_delimiter[: self.packet_size]
-
-            # Parse the packet data into a numpy array
-            packet = np.frombuffer(packet_data, dtype=self.dtype)
-
-            # Normalize the packet data to [0, 1]
-            packet = packet.astype(np.float32) / self.max_value
-
-            packets[i] = packet
-
-        # Stack the packets into a single numpy array
-        packets_array = np.vstack(packets)
-
-        return packets_array
+        # No numpy dtype for odd widths (e.g. 24 bit ADCs), assemble the bytes manually
+        payload = payload.reshape(-1, self.channels, self.bytes_per_channel)
+        values = np.zeros(payload.shape[:2], dtype=np.uint32)
+        for i in range(self.bytes_per_channel):
+            values |= payload[:, :, i].astype(np.uint32) << (8 * i)
+        return values
+
+    def cancel(self):
+        """Interrupts a blocking read from another thread, the read returns what it got so far"""
+        if hasattr(self.ser, "cancel_read"):
+            self.ser.cancel_read()
 
     def close(self):
         self.ser.close()
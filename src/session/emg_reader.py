@@ -0,0 +1,243 @@
+import queue
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple
+import numpy as np
+
+from .clock_drift import ClockDriftEstimator
+from .device_profile import EmgDeviceProfile
+from .emg_device import EmgDevice
+from .scheduling import JitterStats, StagePolicy, apply_policy
+
+
+class EmgChunk(NamedTuple):
+    timestamp: float  # host time (perf_counter) when the chunk was read
+    signal: np.ndarray  # (W, C), full of NaNs if reading failed
+
+
+class EmgReader:
+    """
+    Reads chunks of W packets from a single EMG device in its own thread
+    """
+
+    def __init__(
+        self,
+        name: str,
+        W: int,
+        device_profile: EmgDeviceProfile,
+        serial_port: str,
+        policy: StagePolicy | None = None,  # scheduling of the reading thread
+    ):
+        self.name = name
+        self.policy = policy
+        self.W = W
+        self.channels = device_profile.channels
+        self.chunks: queue.Queue[EmgChunk] = queue.Queue()
+        self.running = True
+
+        # Health counters
+        self.chunks_read = 0
+        self.errors = 0
+
+        # Device clock, `samples` counts the samples sent by the device including the dropped ones
+        self.samples = 0
+        self.clock = ClockDriftEstimator()
+
+        # Read time jitter, the reads are expected every W samples
+        self.jitter = JitterStats(W / device_profile.sample_rate)
+
+        # Open the device here so connection errors surface to the caller
+        self._device = EmgDevice(device_profile, serial_port, W)
+        self.read_timeout = self._device.read_timeout
+        try:
+            self._device.position_head()
+        except Exception:
+            self._device.close()
+            raise
+
+        self.worker_thread = threading.Thread(target=self._worker, daemon=True)
+        self.worker_thread.start()
+
+    def _worker(self):
+        if self.policy is not None:
+            apply_policy(self.name, self.policy)
+
+        with self._device as emg_capture:
+            while self.running:
+                dropped = emg_capture.dropped_samples
+                try:
+                    signal_chunk = emg_capture.read_packets(self.W)
+                except Exception as e:
+                    if not self.running:
+                        break  # the read was cancelled by `stop`
+                    print(f">>> Error reading EMG from {self.name}:", e)
+
+                    # send chunk full of NaNs in case of error
+                    signal_chunk = np.full((self.W, self.channels), np.nan)
+                timestamp = time.perf_counter()
+                failed = bool(np.isnan(signal_chunk).any())
+
+                if failed:
+                    self.jitter.gap()
+                    if not emg_capture.counter_bytes:
+                        # samples lost in the reset are unknown without a counter
+                        self.clock.gap()
+                else:
+                    self.jitter.add(timestamp)
+                    self.samples += self.W + emg_capture.dropped_samples - dropped
+                    self.clock.add(self.samples, timestamp)
+
+                self.chunks.put(EmgChunk(timestamp, signal_chunk))
+                self.chunks_read += 1
+
+                if failed:
+                    self.errors += 1
+                    print(f">>> EMG signal failure detected, resetting {self.name}.")
+                    try:
+                        emg_capture.position_head()
+                    except Exception as e:
+                        print(f">>> Error resetting {self.name}:", e)
+
+    @property
+    def dropped_samples(self) -> int:
+        return self._device.dropped_samples
+
+    def timing(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "rate": self.clock.rate,
+            "dropped_samples": self.dropped_samples,
+            "errors": self.errors,
+        }
+
+    def get(self, timeout: float) -> EmgChunk:
+        """Raises queue.Empty on timeout"""
+        return self.chunks.get(timeout=timeout)
+
+    def backlog(self) -> int:
+        return self.chunks.qsize()
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """Interrupts a pending read, False if the thread hasn't finished in time"""
+        self.running = False
+        self._device.cancel()
+        self.worker_thread.join(timeout)
+        return not self.worker_thread.is_alive()
+
+
+class EmgMerger:
+    """
+    Couples chunks of several concurrently read devices into one (W, C_total) chunk.
+
+    Devices are aligned by the read timestamps - a chunk older than the newest one by
+    more than `tolerance` chunk periods belongs to an earlier step and is dropped,
+    so the residual misalignment is bounded by `tolerance` chunks
+    (kept above a half so that read jitter can't make devices drop chunks in turns).
+
+    A device that doesn't deliver within `timeout_chunks` chunk periods contributes NaNs,
+    so a single stuck device doesn't stall the whole pipeline. Its late chunks read before
+    the step following the NaN one are dropped, otherwise the device would stay one chunk
+    behind after every timeout (even alone, with no other device to align to).
+    """
+
+    def __init__(
+        self,
+        readers: List[EmgReader],
+        sample_rate: float,
+        tolerance: float = 0.75,
+        timeout_chunks: float = 4.0,
+    ):
+        self.readers = readers
+        self.period = readers[0].W / sample_rate
+        self.tolerance = tolerance * self.period
+        self.timeout = timeout_chunks * self.period
+
+        # Health counters per reader
+        self.dropped = [0] * len(readers)
+        self.timeouts = [0] * len(readers)
+
+        # Timestamp of the step expected after a reader timed out, None while it is on time
+        self._resync: List[float | None] = [None] * len(readers)
+
+    def read(self) -> np.ndarray:
+        heads: List[EmgChunk | None] = [self._next(i) for i in range(len(self.readers))]
+
+        # Drop stale chunks until every head is within tolerance from the newest one
+        while True:
+            newest = max((h.timestamp for h in heads if h is not None), default=None)
+            if newest is None:
+                break
+
+            stale = [
+                i
+                for i, h in enumerate(heads)
+                if h is not None and h.timestamp < newest - self.tolerance
+            ]
+            if not stale:
+                break
+
+            for i in stale:
+                self.dropped[i] += 1
+                heads[i] = self._next(i)
+
+        # The NaN step is emitted now, the next one is due a period later
+        emitted = time.perf_counter()
+        for i, h in enumerate(heads):
+            if h is None:
+                self._resync[i] = emitted + self.period
+
+        return np.hstack(
+            [
+                (
+                    h.signal
+                    if h is not None
+                    else np.full((reader.W, reader.channels), np.nan)
+                )
+                for h, reader in zip(heads, self.readers)
+            ]
+        )
+
+    def _next(self, i: int) -> EmgChunk | None:
+        try:
+            chunk = self.readers[i].get(self.timeout)
+
+            # After a timeout, the queued chunks older than the expected step belong
+            # to the steps already filled with NaNs
+            expected = self._resync[i]
+            while expected is not None and chunk.timestamp < expected - self.tolerance:
+                self.dropped[i] += 1
+                chunk = self.readers[i].get(self.timeout)
+            self._resync[i] = None
+            return chunk
+        except queue.Empty:
+            self.timeouts[i] += 1
+            print(f">>> {self.readers[i].name} has not delivered a chunk in time.")
+            return None
+
+    def timing(self) -> List[Dict[str, Any]]:
+        return [reader.timing() for reader in self.readers]
+
+    def health(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": reader.name,
+                "chunks": reader.chunks_read,
+                "errors": reader.errors,
+                "dropped": dropped,
+                "timeouts": timeouts,
+                "backlog": reader.backlog(),
+                "dropped_samples": reader.dropped_samples,
+                "jitter": reader.jitter.summary(),
+                "rate": (
+                    round(reader.clock.rate, 2) if reader.clock.rate is not None else None
+                ),
+            }
+            for reader, dropped, timeouts in zip(
+                self.readers, self.dropped, self.timeouts
+            )
+        ]
+
+    def close(self):
+        for reader in self.readers:
+            if not reader.stop(2 * reader.read_timeout):
+                print(f">>> {reader.name} didn't stop in time, left behind.")
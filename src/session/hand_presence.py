@@ -0,0 +1,79 @@
+import threading
+import cv2
+import mediapipe as mp
+import numpy as np
+
+
+class HandPresenceDetector:
+    """
+    Cheap hand presence check - palm detection with the lightest model on a downscaled frame.
+
+    Not thread safe, every processing worker owns its own detector.
+    """
+
+    def __init__(self, scale: float = 0.25):
+        self.scale = scale
+        self.hands = mp.solutions.hands.Hands(
+            static_image_mode=True,
+            max_num_hands=1,
+            model_complexity=0,
+            min_detection_confidence=0.5,
+        )
+
+    def detect(self, frame: np.ndarray) -> bool:
+        if self.scale != 1.0:
+            frame = cv2.resize(
+                frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+            )
+        res = self.hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        return res.multi_hand_landmarks is not None
+
+    def close(self):
+        self.hands.close()
+
+
+class HandPresenceGate:
+    """
+    Shared by the processing workers, decides which items are worth a full triangulation.
+
+    While a recording is active or a hand was seen within the last `hold` items every item
+    is triangulated. Otherwise only every `idle_stride`-th item is probed with a
+    `HandPresenceDetector` (cameras in turns) and the rest are passed through without a hand.
+    """
+
+    def __init__(
+        self,
+        recording_active: threading.Event,
+        hold: int = 32,
+        idle_stride: int = 4,
+    ):
+        self.recording_active = recording_active
+        self.hold = hold
+        self.idle_stride = idle_stride
+        self._lock = threading.Lock()
+        self._last_seen = -hold - 1  # index of the latest item a hand was found in
+
+        # Counters, updated by the workers through `count`
+        self.triangulated = 0
+        self.probed = 0
+        self.skipped = 0
+
+    def needs_triangulation(self, index: int) -> bool:
+        if self.recording_active.is_set():
+            return True
+        with self._lock:
+            return index - self._last_seen <= self.hold
+
+    def should_probe(self, index: int) -> bool:
+        return index % self.idle_stride == 0
+
+    def count(self, probed: int = 0, triangulated: int = 0, skipped: int = 0):
+        with self._lock:
+            self.probed += probed
+            self.triangulated += triangulated
+            self.skipped += skipped
+
+    def report(self, index: int, hand_found: bool):
+        if hand_found:
+            with self._lock:
+                self._last_seen = max(self._last_seen, index)
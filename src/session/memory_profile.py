@@ -0,0 +1,217 @@
+import json
+import os
+import queue
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+# NOTE: a memory profile is a JSON lines file next to the dataset (flexN.z -> flexN.mem.jsonl),
+#       one line per sample:
+#
+#   t            seconds since the profiling start
+#   rss          bytes per process label (main, gui windows, ...)
+#   sizes        items or bytes per pipeline queue and buffer, the gui processes report theirs
+#   top          largest tracemalloc allocation sites of the main process (kB) with their growth
+#                since the previous sample, a leaking stage shows up as a steadily growing site
+#   snapshot_ms  time the tracemalloc snapshot and its comparison took
+#   emg_jitter   `JitterStats` summaries of the EMG path (coupling, every device read)
+#
+# NOTE: profiling is not free. tracemalloc hooks every allocation of every thread of the main
+#       process, the EMG reading and coupling ones included, which slows allocation heavy code
+#       and keeps a trace (and `frames` frames) per live block. Taking and comparing a snapshot
+#       holds the GIL for as long as `snapshot_ms`, delaying the EMG reads meanwhile, so the
+#       traceback depth defaults to 1 frame and the EMG jitter is sampled along to compare with
+#       a session without profiling.
+
+
+def memory_profile_path(dataset_filepath: str) -> str:
+    return os.path.splitext(dataset_filepath)[0] + ".mem.jsonl"
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes(pid: int) -> int | None:
+    """Resident set size of a process, None if unknown"""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except psutil.Error:
+        return None
+
+
+class MemoryProfiler:
+    """
+    Samples the memory of the session every `period` seconds in its own thread.
+
+    `pids` and `sizes` are callables so that processes and queues made later
+    (or gone) are picked up, a failing size is recorded as None.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        period: float,
+        pids: Callable[[], Dict[str, int | None]],
+        sizes: Dict[str, Callable[[], int | None]],
+        top: int = 10,
+        frames: int = 1,  # traceback depth of the allocation sites, deeper costs more
+        jitter: Callable[[], Dict[str, Any]] | None = None,  # EMG path jitter summaries
+    ):
+        self.path = path
+        self.period = period
+        self.pids = pids
+        self.sizes = sizes
+        self.top = top
+        self.frames = frames
+        self.jitter = jitter
+        self._snapshot_ms: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._first: Dict[str, Any] | None = None
+        self._last: Dict[str, Any] | None = None
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self._thread.start()
+        print(f"Memory profile every {self.period:.0f}s to {self.path}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        tracemalloc.stop()
+        self._report()
+
+    def _loop(self):
+        start = time.perf_counter()
+        previous: tracemalloc.Snapshot | None = None
+        with open(self.path, "w") as f:
+            while True:
+                snapshot_start = time.perf_counter()
+                snapshot = tracemalloc.take_snapshot().filter_traces(
+                    (tracemalloc.Filter(False, tracemalloc.__file__),)
+                )
+                top = self._top(snapshot, previous)
+                snapshot_ms = (time.perf_counter() - snapshot_start) * 1000
+                self._snapshot_ms.append(snapshot_ms)
+
+                sample = {
+                    "t": round(time.perf_counter() - start, 1),
+                    "rss": {
+                        label: rss_bytes(pid)
+                        for label, pid in self.pids().items()
+                        if pid is not None
+                    },
+                    "sizes": {name: _size(size) for name, size in self.sizes.items()},
+                    "top": top,
+                    "snapshot_ms": round(snapshot_ms, 1),
+                    "emg_jitter": self.jitter() if self.jitter is not None else None,
+                }
+                previous = snapshot
+
+                f.write(json.dumps(sample) + "\n")
+                f.flush()
+
+                if self._first is None:
+                    self._first = sample
+                self._last = sample
+
+                # one last sample on close
+                if self._stop.is_set():
+                    break
+                self._stop.wait(self.period)
+
+    def _top(
+        self,
+        snapshot: tracemalloc.Snapshot,
+        previous: tracemalloc.Snapshot | None,
+    ) -> List[Dict[str, Any]]:
+        stats = (
+            snapshot.compare_to(previous, "traceback")
+            if previous is not None
+            else snapshot.statistics("traceback")
+        )
+        return [
+            {
+                "site": " <- ".join(
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                    for frame in stat.traceback
+                ),
+                "kB": round(stat.size / 1024, 1),
+                "growth_kB": round(getattr(stat, "size_diff", stat.size) / 1024, 1),
+                "count": stat.count,
+            }
+            for stat in stats[: self.top]
+        ]
+
+    def _report(self):
+        """Growth of every series over the session, the largest first"""
+        if self._first is None or self._last is None or self._first is self._last:
+            return
+
+        growth = []
+        for kind in ("rss", "sizes"):
+            for name, last in self._last[kind].items():
+                first = self._first[kind].get(name)
+                if first is not None and last is not None and last != first:
+                    growth.append((f"{kind} {name}", last - first))
+        growth.sort(key=lambda g: -abs(g[1]))
+
+        print(
+            f"Memory growth over {self._last['t'] / 60:.1f} min: "
+            + (
+                ", ".join(f"{name} {delta:+,}" for name, delta in growth[:8])
+                if growth
+                else "none"
+            )
+        )
+
+        # what the profiling cost the realtime path
+        worst_p99 = max(
+            (
+                stats.get("p99_ms", 0.0)
+                for stats in (self._last.get("emg_jitter") or {}).values()
+            ),
+            default=None,
+        )
+        print(
+            f"Memory profiling snapshots took {sum(self._snapshot_ms) / len(self._snapshot_ms):.1f} ms"
+            f" (max {max(self._snapshot_ms):.1f} ms)"
+            + (f", EMG jitter p99 {worst_p99:.1f} ms" if worst_p99 is not None else "")
+        )
+
+
+class ReportedSizes:
+    """
+    Sizes another process reports through a queue (e.g. the buffers of a gui window),
+    the latest report of every name is kept
+    """
+
+    def __init__(self, reports: Any):  # multiprocessing.Queue of Dict[str, int]
+        self.reports = reports
+        self._latest: Dict[str, int] = {}
+
+    def get(self, name: str) -> int | None:
+        while True:
+            try:
+                self._latest.update(self.reports.get_nowait())
+            except queue.Empty:
+                break
+        return self._latest.get(name)
+
+
+def _size(size: Callable[[], int | None]) -> int | None:
+    try:
+        return size()
+    except Exception:
+        return None
@@ -0,0 +1,93 @@
+import time
+from typing import List, Tuple
+import numpy as np
+
+# NOTE: messages are mutable, a stage fills its fields in and passes the same object on,
+#       `ordering_loop` still gets them in its `(index, message)` envelope
+
+
+class CoupledFrames:
+    """Camera frames coupled with an EMG chunk, made by `emg_coupling_loop`"""
+
+    __slots__ = (
+        "index",
+        "frames",
+        "coupling_fps",
+        "signal",
+        "frame_seqs",
+        "signal_ok",
+        "t_coupled",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        # (frame, capture fps) per camera, frames are `CompressedFrame` in the MJPEG capture mode
+        frames: List[Tuple[np.ndarray, int]],
+        coupling_fps: int,
+        signal: np.ndarray,  # (W, C)
+        frame_seqs: Tuple[int, ...] | None = None,  # capture sequence numbers of the frames
+        t_coupled: float | None = None,
+    ):
+        self.index = index
+        self.frames = frames
+        self.coupling_fps = coupling_fps
+        self.signal = signal
+        self.frame_seqs = frame_seqs
+        self.signal_ok = not np.isnan(signal).any()
+        self.t_coupled = time.perf_counter() if t_coupled is None else t_coupled
+
+
+class HandSample:
+    """
+    A coupled EMG chunk with its hand, filled along the way:
+    `processing_loop` -> points_3d and hand_angles,
+    `pose_filter_loop` -> maybe interpolated hand_angles
+    """
+
+    __slots__ = (
+        "index",
+        "points_3d",
+        "hand_angles",
+        "signal",
+        "coupling_fps",
+        "signal_ok",
+        "interpolated",
+        "t_coupled",
+        "t_processed",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        points_3d: np.ndarray | None,  # (21, 3), None if no hand
+        signal: np.ndarray,
+        coupling_fps: int,
+        signal_ok: bool,
+        t_coupled: float,
+    ):
+        self.index = index
+        self.points_3d = points_3d
+        self.hand_angles: np.ndarray | None = None  # (20,) float32
+        self.signal = signal
+        self.coupling_fps = coupling_fps
+        self.signal_ok = signal_ok
+        self.interpolated = False
+        self.t_coupled = t_coupled
+        self.t_processed = time.perf_counter()
+
+    @classmethod
+    def of(cls, coupled: CoupledFrames, points_3d: np.ndarray | None) -> "HandSample":
+        return cls(
+            coupled.index,
+            points_3d,
+            coupled.signal,
+            coupled.coupling_fps,
+            coupled.signal_ok,
+            coupled.t_coupled,
+        )
+
+    @property
+    def valid(self) -> bool:
+        """Has a hand and an uncorrupted signal, so it may be recorded"""
+        return self.hand_angles is not None and self.signal_ok
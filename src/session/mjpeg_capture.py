@@ -0,0 +1,147 @@
+import multiprocessing.synchronize
+import time
+from typing import List, Tuple
+import cv2
+import numpy as np
+
+from webcam_hand_triangulation.capture.fps_counter import FPSCounter
+from webcam_hand_triangulation.capture.wrapped import Wrapped
+
+# cv2.imdecode flags by the decode downscale factor
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class CompressedFrame:
+    """A camera frame kept as the JPEG bytes delivered by the device"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: np.ndarray):
+        self.data = data  # 1-D uint8
+
+
+def decode_frame(frame: "np.ndarray | CompressedFrame", flags: int) -> np.ndarray:
+    """Decoded (and mirrored, as the coupling does to raw frames) frame, raw frames are passed as is"""
+    if not isinstance(frame, CompressedFrame):
+        return frame
+    image = cv2.imdecode(frame.data, flags)
+    if image is None:
+        raise ValueError("Corrupted MJPEG frame")
+    return cv2.flip(image, 1)
+
+
+class DecodedFrames:
+    """
+    Frames of a couple decoded on demand, at most once per camera.
+
+    Triangulation gets full frames, previews (presence probes, display) may be decoded
+    at a reduced scale since they are downscaled anyway.
+    """
+
+    def __init__(
+        self,
+        frames: List["np.ndarray | CompressedFrame"],
+        preview_flags: int = cv2.IMREAD_COLOR,
+    ):
+        self._frames = frames
+        self._preview_flags = preview_flags
+        self._full: List[np.ndarray | None] = [None] * len(frames)
+        self._preview: List[np.ndarray | None] = [None] * len(frames)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def full(self, cam: int) -> np.ndarray:
+        frame = self._full[cam]
+        if frame is None:
+            frame = self._full[cam] = decode_frame(self._frames[cam], cv2.IMREAD_COLOR)
+        return frame
+
+    def preview(self, cam: int) -> np.ndarray:
+        if self._full[cam] is not None or self._preview_flags == cv2.IMREAD_COLOR:
+            return self.full(cam)
+        frame = self._preview[cam]
+        if frame is None:
+            frame = self._preview[cam] = decode_frame(
+                self._frames[cam], self._preview_flags
+            )
+        return frame
+
+    def all(self) -> List[np.ndarray]:
+        return [self.full(cam) for cam in range(len(self._frames))]
+
+
+def mjpeg_cap_reading(
+    idx: int,
+    stop_event: multiprocessing.synchronize.Event,
+    last_frame: Wrapped,
+    mode: Tuple[int, int, int],  # (width, height, fps) the camera was calibrated at
+):
+    """
+    Camera reader requesting MJPEG from the device and keeping the latest frame compressed,
+    so only the coupled frames are decoded (by the processing workers, see `DecodedFrames`).
+
+    Falls back to decoded frames if the backend doesn't hand out the compressed buffers.
+    The session is stopped if the camera delivers another frame size than the calibrated one.
+    """
+    width, height, fps = mode
+
+    cap = cv2.VideoCapture(idx)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc(*"MJPG"))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)  # keep the buffers compressed
+
+    if not cap.isOpened():
+        print(f">>> Camera {idx} can't be opened.")
+        return
+
+    print(
+        f"Camera {idx}: MJPEG {int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}"
+        f" @ {cap.get(cv2.CAP_PROP_FPS):.0f} fps"
+    )
+
+    fps_counter = FPSCounter()
+    compressed: bool | None = None  # decided on the first frame
+    while not stop_event.is_set():
+        ok, frame = cap.read()
+        if not ok:
+            print(f">>> Camera {idx} failed to deliver a frame.")
+            time.sleep(0.01)
+            continue
+
+        if compressed is None:
+            compressed = frame.ndim == 1 or frame.shape[0] == 1
+            if not compressed:
+                print(
+                    f">>> Camera {idx}: the backend decodes MJPEG itself, frames are kept decoded."
+                )
+
+            # the calibration holds for its frame size only
+            image = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_COLOR) if compressed else frame
+            if image is None:
+                compressed = None  # checked on the next frame
+                continue
+            delivered = (image.shape[1], image.shape[0])
+            if delivered != (width, height):
+                print(
+                    f">>> Camera {idx} delivers {delivered} frames, calibrated for {(width, height)}, stopping."
+                )
+                stop_event.set()
+                break
+
+        fps_counter.count()
+        last_frame.set(
+            (
+                CompressedFrame(frame.reshape(-1)) if compressed else frame,
+                fps_counter.get_fps(),
+            )
+        )
+
+    cap.release()
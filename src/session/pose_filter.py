@@ -0,0 +1,132 @@
+import math
+from typing import Any, Dict, List, NamedTuple
+import numpy as np
+from webcam_hand_triangulation.capture.finalizable_queue import (
+    EmptyFinalized,
+    FinalizableQueue,
+)
+
+from .messages import HandSample
+
+
+class PoseFilterParams(NamedTuple):
+    smooth: bool  # One-Euro smoothing of the angles
+    min_cutoff: float  # Hz, cutoff of a still hand
+    beta: float  # cutoff growth per unit of the angles speed
+    d_cutoff: float  # Hz, cutoff of the speed estimate
+    max_gap: int  # max frames without a hand to bridge by interpolation, 0 to disable
+
+    def to_metadata(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter (Casiez et al. 2012), vectorized over the components of the signal
+    """
+
+    def __init__(self, min_cutoff: float, beta: float, d_cutoff: float):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._x: np.ndarray | None = None
+        self._dx: np.ndarray | None = None
+
+    @staticmethod
+    def _alpha(cutoff: np.ndarray | float, dt: float) -> np.ndarray | float:
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x: np.ndarray, dt: float) -> np.ndarray:
+        if self._x is None or self._dx is None:
+            self._x = x
+            self._dx = np.zeros_like(x)
+            return x
+
+        a_d = self._alpha(self.d_cutoff, dt)
+        self._dx = a_d * (x - self._x) / dt + (1 - a_d) * self._dx
+
+        a = self._alpha(self.min_cutoff + self.beta * np.abs(self._dx), dt)
+        self._x = a * x + (1 - a) * self._x
+        return self._x
+
+
+def pose_filter_loop(
+    params: PoseFilterParams,
+    rate: float,  # frames per second
+    in_queue: FinalizableQueue,
+    out_queue: FinalizableQueue,
+):
+    """
+    Smooths the angles of `HandSample`s and bridges short hand dropouts.
+
+    Samples without a hand (but with a valid signal) are held back until the hand shows up
+    again within `max_gap` frames, then they get angles linearly interpolated between
+    the poses around the gap (flagged `interpolated`). Longer gaps and signal failures
+    are passed through as is.
+    """
+    dt = 1.0 / rate
+    smoother = OneEuroFilter(params.min_cutoff, params.beta, params.d_cutoff)
+
+    last: np.ndarray | None = None  # the latest emitted pose
+    pending: List[HandSample] = []  # samples held back in a gap
+
+    def flush_pending():
+        for sample in pending:
+            out_queue.put(sample)
+            in_queue.task_done()
+        pending.clear()
+
+    while True:
+        try:
+            sample: HandSample = in_queue.get()
+        except EmptyFinalized:
+            break
+
+        # Hold back a frame without a hand, maybe the hand comes back soon
+        if (
+            sample.hand_angles is None
+            and sample.signal_ok
+            and last is not None
+            and len(pending) < params.max_gap
+        ):
+            pending.append(sample)
+            continue
+
+        if sample.hand_angles is None:
+            # Gap is too long or the signal failed, give up bridging
+            flush_pending()
+            smoother.reset()
+            last = None
+            out_queue.put(sample)
+            in_queue.task_done()
+            continue
+
+        if params.smooth:
+            sample.hand_angles = smoother(
+                sample.hand_angles, dt * (len(pending) + 1)
+            ).astype(np.float32)
+        hand_angles = sample.hand_angles
+
+        # Bridge the gap
+        if pending:
+            assert last is not None
+            n = len(pending) + 1
+            for k, pending_sample in enumerate(pending, start=1):
+                pending_sample.hand_angles = (
+                    last + (hand_angles - last) * (k / n)
+                ).astype(np.float32)
+                pending_sample.interpolated = True
+                out_queue.put(pending_sample)
+                in_queue.task_done()
+            pending.clear()
+
+        last = hand_angles
+        out_queue.put(sample)
+        in_queue.task_done()
+
+    flush_pending()
+    out_queue.finalize()
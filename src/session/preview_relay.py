@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from typing import Any, Tuple
+
+from webcam_hand_triangulation.capture.finalizable_queue import FinalizableQueue
+
+from .control import RecordingStatus
+
+# NOTE: the 3d hand window renders whatever comes through its queue, so it is fed through a relay
+#       that keeps only the latest state and hands it over at the render rate, the queue holds
+#       a single item (maxsize=1) - a slow renderer then drops states instead of lagging behind
+
+
+class LatestState:
+    """The latest value put, replaced by every `put` (never blocks the producer)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value: Any = None
+        self._version = 0
+        self._closed = False
+
+    def put(self, value: Any):
+        with self._cond:
+            self._value = value
+            self._version += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def wait_newer(self, version: int, timeout: float) -> Tuple[int, Any] | None:
+        """(version, value) newer than `version`, None on timeout or once closed and consumed"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._version > version or self._closed, timeout
+            )
+            if self._version > version:
+                return self._version, self._value
+            return None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+def preview_relay_loop(
+    latest: LatestState,
+    out_queue: FinalizableQueue,  # of maxsize 1
+    render_rate: float,
+    status: RecordingStatus | None = None,
+):
+    period = 1.0 / render_rate
+    version = 0
+    sent = 0
+    dropped_versions = 0
+    busy = 0  # ticks the renderer hadn't taken the previous state yet
+    started = time.perf_counter()
+    last_report = started
+
+    while True:
+        tick = time.perf_counter()
+
+        got = latest.wait_newer(version, period)
+        if got is None:
+            if latest.closed:
+                break
+            continue
+
+        new_version, value = got
+        try:
+            out_queue.put_nowait(value)
+        except queue.Full:
+            # the previous state is still waiting, the latest one is tried on the next tick
+            busy += 1
+            if latest.closed:
+                break
+        else:
+            dropped_versions += new_version - version - 1
+            version = new_version
+            sent += 1
+
+        now = time.perf_counter()
+        if status is not None and now - last_report > 1.0:
+            status.update(
+                preview={
+                    "fps": round(sent / (now - started), 1),
+                    "dropped": dropped_versions,
+                    "busy": busy,
+                }
+            )
+            last_report = now
+
+        # Keep the render rate
+        remaining = period - (time.perf_counter() - tick)
+        if remaining > 0:
+            time.sleep(remaining)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"3d preview: {sent} states rendered ({sent / elapsed if elapsed > 0 else 0:.1f} fps), "
+        f"{dropped_versions} skipped, renderer busy on {busy} ticks."
+    )
@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
-from typing import Any, Callable, List, Tuple
-from src.webcam_hand_triangulation.capture.hand_utils import rm_th_base
+from typing import List, Tuple
 from webcam_hand_triangulation.capture.draw_utils import (
     draw_left_top,
     draw_origin_landmarks,
@@ -11,6 +10,7 @@ from webcam_hand_triangulation.capture.finalizable_queue import (
     EmptyFinalized,
     FinalizableQueue,
 )
+from webcam_hand_triangulation.capture.hand_utils import rm_th_base
 from webcam_hand_triangulation.capture.models import CameraParams
 from webcam_hand_triangulation.capture.processing_loop import (
     HandTriangulator,
@@ -18,77 +18,115 @@ from webcam_hand_triangulation.capture.processing_loop import (
     normalize_hand,
 )
 
+from .hand_presence import HandPresenceDetector, HandPresenceGate
+from .messages import CoupledFrames, HandSample
+from .mjpeg_capture import DecodedFrames
+from .triangulation_cache import TriangulationCache
+
+
+def hand_angles(points_3d: "np.ndarray | List") -> np.ndarray:
+    """(21, 3) triangulated landmarks -> (20,) float32 anatomic angles"""
+    return inverse_hand_angles_by_landmarks(
+        normalize_hand(rm_th_base(list(points_3d)))
+    ).astype(np.float32)
+
 
 def processing_loop(
-    landmark_transforms: List[Callable[..., Any]],
+    triangulator: HandTriangulator,
     to_draw_origin_landmarks: bool,
     desired_window_size: Tuple[int, int],
     cameras_params: List[CameraParams],
     coupled_emg_frames_queue: FinalizableQueue,
     results_queue: FinalizableQueue,
     display_queues: List[FinalizableQueue] | None,
+    presence_gate: HandPresenceGate | None = None,
+    presence_detector: HandPresenceDetector | None = None,
+    triangulation_cache: TriangulationCache | None = None,
+    preview_decode_flags: int = cv2.IMREAD_COLOR,
 ):
-    triangulator = HandTriangulator(landmark_transforms, cameras_params)
+    # NOTE: triangulator and presence_detector are owned by this worker,
+    #       they are created beforehand so that all the workers load their models concurrently
 
     while True:
         try:
-            elem = coupled_emg_frames_queue.get()
+            coupled: CoupledFrames = coupled_emg_frames_queue.get()
         except EmptyFinalized:
             break
 
-        index: int = elem[0]
-        indexed_frames: List[Tuple[np.ndarray, int]] = elem[1]
-        coupling_fps: int = elem[2]
-        signal_chunk: np.ndarray = elem[3]
-
-        cap_fps: List[int] = [item[1] for item in indexed_frames]
-        frames: List[np.ndarray] = [item[0] for item in indexed_frames]
-
-        del indexed_frames
-
-        landmarks, chosen_cams, points_3d = triangulator.triangulate(frames)
-
-        results_queue.put(
-            (
-                index,
-                (
-                    (
-                        inverse_hand_angles_by_landmarks(
-                            normalize_hand(rm_th_base(points_3d))
-                        ).astype(np.float32)
-                        if points_3d
-                        else None
-                    ),
-                    signal_chunk,
-                    coupling_fps,
-                ),
-            )
-        )
+        index = coupled.index
+        cap_fps: List[int] = [item[1] for item in coupled.frames]
+        # MJPEG frames are decoded here only when needed
+        frames = DecodedFrames([item[0] for item in coupled.frames], preview_decode_flags)
+
+        # Full triangulation unless the gate says the item is idle and no hand shows up in a probe
+        triangulated = True
+        if presence_gate is not None and not presence_gate.needs_triangulation(index):
+            assert presence_detector is not None
+            if presence_gate.should_probe(index):
+                presence_gate.count(probed=1)
+                # probe cameras in turns
+                camera = (index // presence_gate.idle_stride) % len(frames)
+                triangulated = presence_detector.detect(frames.preview(camera))
+            else:
+                triangulated = False
+
+        if triangulated:
+            if triangulation_cache is not None and coupled.frame_seqs is not None:
+                # the same frames as an earlier item, reuse its result
+                landmarks, chosen_cams, points_3d = (
+                    triangulation_cache.get_or_compute(
+                        coupled.frame_seqs, lambda: triangulator.triangulate(frames.all())
+                    )
+                )
+            else:
+                landmarks, chosen_cams, points_3d = triangulator.triangulate(
+                    frames.all()
+                )
+            if presence_gate is not None:
+                presence_gate.count(triangulated=1)
+                presence_gate.report(index, bool(points_3d))
+        else:
+            landmarks, chosen_cams, points_3d = None, [], []
+            assert presence_gate is not None
+            presence_gate.count(skipped=1)
+
+        sample = HandSample.of(coupled, np.asarray(points_3d) if points_3d else None)
+        if points_3d:
+            sample.hand_angles = hand_angles(points_3d)
+        results_queue.put((index, sample))
+        del coupled
 
         if display_queues is not None:
             # Resize frames before drawing
-            for i, frame in enumerate(frames):
-                frames[i] = cv2.resize(
-                    frame, desired_window_size, interpolation=cv2.INTER_AREA
+            previews: List[np.ndarray] = [
+                cv2.resize(
+                    frames.preview(i), desired_window_size, interpolation=cv2.INTER_AREA
                 )
+                for i in range(len(frames))
+            ]
 
-            # Draw original landmarks
-            if to_draw_origin_landmarks:
-                draw_origin_landmarks(landmarks, frames)
+            if triangulated:
+                # Draw original landmarks
+                if to_draw_origin_landmarks:
+                    draw_origin_landmarks(landmarks, previews)
 
-            # Draw reprojected landmarks
-            draw_reprojected_landmarks(points_3d, frames, cameras_params, chosen_cams)
+                # Draw reprojected landmarks
+                draw_reprojected_landmarks(
+                    points_3d, previews, cameras_params, chosen_cams
+                )
 
             # Draw cap fps for every pov
-            for fps, frame in zip(cap_fps, frames):
+            for fps, frame in zip(cap_fps, previews):
                 draw_left_top(0, f"Capture FPS: {fps}", frame)
 
             # Write results
-            for display_queue, frame in zip(display_queues, frames):
+            for display_queue, frame in zip(display_queues, previews):
                 display_queue.put((index, frame))
 
         coupled_emg_frames_queue.task_done()
 
     triangulator.close()
+    if presence_detector is not None:
+        presence_detector.close()
 
     print("A processing loop is finished.")
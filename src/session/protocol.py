@@ -0,0 +1,153 @@
+from typing import Any, Dict, List, NamedTuple
+import json5
+
+
+class ProtocolStep(NamedTuple):
+    gesture: str  # label stored into the recording metadata
+    duration: float  # seconds of recording
+    rest: float  # seconds of rest before the recording
+
+    def validate(self):
+        if not self.gesture:
+            raise ValueError("Protocol step must have a gesture label")
+        if self.duration <= 0:
+            raise ValueError(
+                f"Duration of '{self.gesture}' must be positive, got {self.duration}"
+            )
+        if self.rest < 0:
+            raise ValueError(
+                f"Rest before '{self.gesture}' must not be negative, got {self.rest}"
+            )
+
+
+def load_protocol(path: str) -> List[ProtocolStep]:
+    """
+    Load a json5 protocol file:
+
+    {
+      rest: 3,  // default rest before every step, seconds
+      repeat: 2,  // the steps are repeated this many times
+      steps: [
+        { gesture: "fist", duration: 5 },
+        { gesture: "pinch", duration: 4, rest: 5 },
+      ],
+    }
+    """
+    with open(path, "r") as f:
+        d: Dict[str, Any] = json5.load(f)
+
+    default_rest = float(d.get("rest", 3.0))
+    repeat = int(d.get("repeat", 1))
+
+    steps = [
+        ProtocolStep(
+            gesture=str(step["gesture"]),
+            duration=float(step["duration"]),
+            rest=float(step.get("rest", default_rest)),
+        )
+        for step in d["steps"]
+    ] * repeat
+
+    if not steps:
+        raise ValueError(f"Protocol {path} has no steps")
+    for step in steps:
+        step.validate()
+
+    return steps
+
+
+class ProtocolRunner:
+    """
+    Drives the recording state machine of `recording_loop` through the protocol steps.
+
+    Called once per coupled chunk, so every duration is counted in chunks:
+    a step rests for its rest chunks, starts the recording on the first chunk with a hand
+    and saves it after exactly `duration` recorded chunks. A recording paused by a hand or
+    signal loss is continued automatically as soon as both are back, one paused by the operator
+    is left for the operator to continue or save.
+    """
+
+    def __init__(self, steps: List[ProtocolStep], chunk_rate: float):
+        self.steps = steps
+        self.chunk_rate = chunk_rate  # chunks per second
+
+        self.step = 0
+        self._rest_left = self._chunks(steps[0].rest)
+        self._recording = False
+        self._announced = False
+
+    @property
+    def done(self) -> bool:
+        return self.step >= len(self.steps)
+
+    def _chunks(self, seconds: float) -> int:
+        return round(seconds * self.chunk_rate)
+
+    def drive(
+        self,
+        start_event: Any,  # Event | None, set when idle
+        stop_action: Any,  # Value | None, set when recording or paused
+        frames_recorded: int,
+        valid: bool,  # hand and signal are present on this chunk
+        lost: bool = False,  # the pause (if any) was caused by a hand or signal loss
+    ):
+        if self.done:
+            return
+
+        if start_event is not None:
+            if self._recording:
+                # the recording was saved (by the protocol or the operator)
+                self._recording = False
+                self._announced = False
+                self.step += 1
+                if self.done:
+                    print(">>> Protocol completed.")
+                    return
+                self._rest_left = self._chunks(self.steps[self.step].rest)
+
+            step = self.steps[self.step]
+            if not self._announced:
+                print(
+                    f">>> Step {self.step + 1}/{len(self.steps)}: '{step.gesture}' "
+                    f"for {step.duration:g}s in {step.rest:g}s."
+                )
+                self._announced = True
+
+            if self._rest_left > 0:
+                self._rest_left -= 1
+            elif valid and not start_event.is_set():
+                start_event.set()
+            return
+
+        assert stop_action is not None
+        self._recording = True
+        value = stop_action.value
+        if value == -1 and frames_recorded >= self._chunks(
+            self.steps[self.step].duration
+        ):
+            stop_action.value = 0
+        elif value == -2 and lost and valid:
+            stop_action.value = 1
+
+    def recording_metadata(self) -> Dict[str, Any]:
+        """Metadata of the recording being saved"""
+        if self.done:
+            return {}
+        step = self.steps[self.step]
+        return {
+            "gesture": step.gesture,
+            "protocol_step": self.step,
+            "target_frames": self._chunks(step.duration),
+        }
+
+    def status(self) -> Dict[str, Any]:
+        if self.done:
+            return {"done": True}
+        step = self.steps[self.step]
+        return {
+            "done": False,
+            "step": self.step,
+            "steps": len(self.steps),
+            "gesture": step.gesture,
+            "rest_left": self._rest_left / self.chunk_rate,
+        }
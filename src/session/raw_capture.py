@@ -0,0 +1,254 @@
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+import cv2
+import numpy as np
+import yaml
+
+from webcam_hand_triangulation.capture.finalizable_queue import (
+    EmptyFinalized,
+    FinalizableQueue,
+)
+
+from .messages import CoupledFrames
+from .mjpeg_capture import CompressedFrame
+
+# NOTE: a raw capture is a folder next to the dataset (flexN.z -> flexN.raw):
+#
+#   raw.yml       W, C, cameras, chunk rate, number of couples, couples without frames,
+#                 mirrored cameras, session metadata (written at open, updated on close)
+#   cam{id}.jpg   concatenated JPEG frames per camera, the k-th is the frame of the couple k
+#   cam{id}.end   (couples,) int64 end offset of every frame in cam{id}.jpg, an empty frame
+#                 is a couple dropped by a lagging writer and reads as the previous frame
+#   emg.f32       (couples, W, C) float32 signal chunks
+#   couples.i32   (couples, 2 + cameras) int32 rows of [index, coupling fps, *capture fps]
+#
+# couple indices are the coupling loop indices, recordings refer to them by
+# the `couples` ranges in their metadata (see `recording_loop`)
+# NOTE: MJPEG captured frames are written as the device delivered them (not mirrored yet, see
+#       `decode_frame`), decoded ones are encoded as they are, `mirror` in raw.yml tells which
+#       cameras are stored unmirrored
+
+
+def raw_capture_path(dataset_filepath: str) -> str:
+    return os.path.splitext(dataset_filepath)[0] + ".raw"
+
+
+class RawCaptureWriter:
+    """
+    A context manager writing the coupled camera frames and EMG chunks as they come
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cameras_ids: List[int],
+        W: int,
+        C: int,
+        chunk_rate: float,  # couples per second, the nominal video fps
+        metadata: Dict[str, Any] | None = None,
+        quality: int = 90,  # JPEG quality of the frames that come decoded
+    ):
+        self.path = path
+        self.cameras_ids = cameras_ids
+        self.W = W
+        self.C = C
+        self.chunk_rate = chunk_rate
+        self.metadata = dict(metadata or {})
+        self.quality = quality
+        self.count = 0
+        self.dropped = 0  # couples written without their frames
+        self._mirror: List[bool] | None = None  # per camera, decided on the first couple
+        self._jpegs: List[Any] = []
+        self._ends: List[Any] = []
+        self._offsets = [0] * len(cameras_ids)
+        self._emg = None
+        self._couples = None
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        for cam_id in self.cameras_ids:
+            self._jpegs.append(open(os.path.join(self.path, f"cam{cam_id}.jpg"), "wb"))
+            self._ends.append(open(os.path.join(self.path, f"cam{cam_id}.end"), "wb"))
+        self._emg = open(os.path.join(self.path, "emg.f32"), "wb")
+        self._couples = open(os.path.join(self.path, "couples.i32"), "wb")
+        # so that a capture cut short by a crash can still be read
+        self._write_info()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for f in [*self._jpegs, *self._ends, self._emg, self._couples]:
+            if f is not None:
+                f.close()
+        self._write_info()
+
+    def _write_info(self):
+        with open(os.path.join(self.path, "raw.yml"), "w") as f:
+            yaml.dump(
+                {
+                    "W": self.W,
+                    "C": self.C,
+                    "cameras": self.cameras_ids,
+                    "chunk_rate": self.chunk_rate,
+                    "couples": self.count,
+                    "dropped_frames": self.dropped,
+                    "mirror": self._mirror or [False] * len(self.cameras_ids),
+                    **self.metadata,
+                },
+                f,
+            )
+
+    def _jpeg(self, frame: "np.ndarray | CompressedFrame", mirror: bool) -> bytes:
+        """The frame as JPEG bytes in the orientation the camera is stored in"""
+        if isinstance(frame, CompressedFrame):
+            if mirror:
+                return frame.data.tobytes()  # as delivered, no re-encoding
+            # the backend switched to compressed buffers midway
+            image = cv2.flip(cv2.imdecode(frame.data, cv2.IMREAD_COLOR), 1)
+        else:
+            image = cv2.flip(frame, 1) if mirror else frame
+        ok, data = cv2.imencode(
+            ".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        )
+        if not ok:
+            raise ValueError("Frame can't be encoded")
+        return data.tobytes()
+
+    def write(
+        self,
+        index: int,
+        # (frame, capture fps) per camera, frames are None for a dropped couple
+        frames: List[Tuple["np.ndarray | CompressedFrame | None", int]],
+        coupling_fps: int,
+        signal_chunk: np.ndarray,  # (W, C)
+    ):
+        assert self._emg is not None and self._couples is not None
+
+        if index != self.count:
+            raise ValueError(f"Couple {index} came out of order, expected {self.count}")
+
+        if frames[0][0] is None:
+            self.dropped += 1
+        elif self._mirror is None:
+            self._mirror = [isinstance(frame, CompressedFrame) for frame, _ in frames]
+            self._write_info()
+
+        for cam, (frame, _) in enumerate(frames):
+            data = b"" if frame is None else self._jpeg(frame, self._mirror[cam])
+            self._jpegs[cam].write(data)
+            self._offsets[cam] += len(data)
+            self._ends[cam].write(np.array([self._offsets[cam]], dtype=np.int64).data)
+
+        self._emg.write(np.ascontiguousarray(signal_chunk, dtype=np.float32).data)
+        self._couples.write(
+            np.array(
+                [index, coupling_fps, *(fps for _, fps in frames)], dtype=np.int32
+            ).data
+        )
+        self.count += 1
+
+
+def raw_capture_loop(
+    writer: RawCaptureWriter,
+    raw_queue: FinalizableQueue,
+):
+    """
+    Writes `CoupledFrames` of the coupling loop,
+    it has its own queue so that writing never stalls the coupling.
+    """
+    with writer:
+        while True:
+            try:
+                coupled: CoupledFrames = raw_queue.get()
+            except EmptyFinalized:
+                break
+            writer.write(
+                coupled.index,
+                coupled.frames,
+                coupled.coupling_fps,
+                coupled.signal,
+            )
+            raw_queue.task_done()
+
+    print(f"Raw capture of {writer.count} couples is written to {writer.path}")
+    if writer.dropped:
+        print(
+            f">>> The raw capture writer fell behind, {writer.dropped} couples were written without their frames."
+        )
+
+
+class RawCaptureReader:
+    """
+    Reads a raw capture back as `CoupledFrames`
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "raw.yml"), "r") as f:
+            self.metadata: Dict[str, Any] = yaml.safe_load(f)
+        self.W: int = self.metadata["W"]
+        self.C: int = self.metadata["C"]
+        self.cameras_ids: List[int] = self.metadata["cameras"]
+        self.chunk_rate: float = self.metadata["chunk_rate"]
+
+        self.emg = np.memmap(
+            os.path.join(path, "emg.f32"), dtype=np.float32, mode="r"
+        ).reshape(-1, self.W, self.C)
+        self.couples = np.fromfile(
+            os.path.join(path, "couples.i32"), dtype=np.int32
+        ).reshape(-1, 2 + len(self.cameras_ids))
+        self.mirror: List[bool] = self.metadata.get(
+            "mirror", [False] * len(self.cameras_ids)
+        )
+
+    def __len__(self) -> int:
+        return min(len(self.emg), len(self.couples))
+
+    def __iter__(self) -> Iterator[CoupledFrames]:
+        return self.read()
+
+    def read(self, first: int = 0, last: int | None = None) -> Iterator[CoupledFrames]:
+        """Couples from `first` to `last` inclusive"""
+        last = len(self) - 1 if last is None else min(last, len(self) - 1)
+        if last < first:
+            return
+
+        jpegs = [
+            np.memmap(os.path.join(self.path, f"cam{cam_id}.jpg"), dtype=np.uint8, mode="r")
+            for cam_id in self.cameras_ids
+        ]
+        ends = [
+            np.fromfile(os.path.join(self.path, f"cam{cam_id}.end"), dtype=np.int64)
+            for cam_id in self.cameras_ids
+        ]
+        previous: List[np.ndarray | None] = [None] * len(self.cameras_ids)
+        for k in range(first, last + 1):
+            frames = []
+            for cam, fps in enumerate(self.couples[k, 2:]):
+                if k >= len(ends[cam]):
+                    print(f">>> Raw capture frames ended at couple {k}.")
+                    return
+                # a dropped frame reads as the last one written before it
+                j = k
+                while j > 0 and ends[cam][j] == ends[cam][j - 1]:
+                    j -= 1
+                start = ends[cam][j - 1] if j > 0 else 0
+                if start == ends[cam][j]:
+                    raise ValueError(f"No frame of camera {cam} up to couple {k}")
+                if j != k and previous[cam] is not None:
+                    frames.append((previous[cam], int(fps)))
+                    continue
+                frame = cv2.imdecode(
+                    np.asarray(jpegs[cam][start : ends[cam][j]]), cv2.IMREAD_COLOR
+                )
+                if frame is None:
+                    raise ValueError(f"Corrupted frame of couple {k} of camera {cam}")
+                if self.mirror[cam]:
+                    frame = cv2.flip(frame, 1)
+                previous[cam] = frame
+                frames.append((frame, int(fps)))
+            yield CoupledFrames(
+                int(self.couples[k, 0]),
+                frames,
+                int(self.couples[k, 1]),
+                np.array(self.emg[k]),
+            )
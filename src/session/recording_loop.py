@@ -1,20 +1,46 @@
 from multiprocessing.managers import SyncManager
+import queue
+import threading
+import time
+from typing import Any, Dict, List
 import numpy as np
+from .clock_drift import EmgTiming
+from .control import ControlRequest, RecordingStatus
+from .preview_relay import LatestState
+from .protocol import ProtocolRunner
+from .messages import HandSample
 from .dataset_writer import DatasetWriter, HandEmgRecordingSegmentCollector
+from .signal_quality import SignalQualityMonitor, SignalQualityStats
 from webcam_hand_triangulation.capture.coupling_loop import FinalizableQueue
 from webcam_hand_triangulation.capture.finalizable_queue import EmptyFinalized
 
 
 def recording_loop(
     manager: SyncManager,
-    command_channel: FinalizableQueue,
+    command_channels: List[FinalizableQueue],  # every controller follows the commands
     filepath: str,
     processing_results: FinalizableQueue,
-    hand_angles_fwd: FinalizableQueue,
-    signal_fwd: FinalizableQueue,
+    hand_angles_fwd: LatestState | None,  # None when headless
+    signal_fwd: FinalizableQueue | None,
+    W: int,
+    channels: int,
+    sample_rate: float,
+    metadata: Dict[str, Any],
+    recording_active: threading.Event | None = None,
+    status: RecordingStatus | None = None,
+    protocol: ProtocolRunner | None = None,
+    emg_timing: EmgTiming | None = None,
+    control_requests: queue.Queue | None = None,  # of ControlRequest, from the control API
+    cut_short: threading.Event | None = None,  # set on shutdown to skip the remaining frames
 ):
-    with DatasetWriter(filepath) as writer:
-        segment_collector = HandEmgRecordingSegmentCollector()
+    with DatasetWriter(filepath, W, metadata) as writer:
+        segment_collector = HandEmgRecordingSegmentCollector(W)
+        signal_monitor = SignalQualityMonitor(channels, sample_rate)
+        recording_signal_stats = SignalQualityStats(channels)
+
+        def publish(command):
+            for channel in command_channels:
+                channel.put(command)
 
         stop_action = None
         # None: not yet started
@@ -23,20 +49,126 @@ def recording_loop(
         # 0: save segments and start new recording
         # 1: continue recording
         start_event = manager.Event()
-        command_channel.put(start_event)
+        publish(start_event)
+
+        # The current -2 was published on a hand or signal loss, not set by the operator
+        lost = False
 
         frames_recorded = 0
+        frames_interpolated = 0
         segments = []
 
+        # Items come one per coupling index in order, so counting them gives the couple index
+        # of every recorded frame, recordings keep the [first, last] couples of their segments
+        couple_index = -1
+        couple_ranges: List[List[int]] = []
+
+        timing_at_start: List[Dict[str, Any]] = []  # devices stats when the recording started
+
+        def effective_rate() -> float:
+            return emg_timing.effective_rate() if emg_timing is not None else sample_rate
+
+        def apply_control_request(request: ControlRequest) -> str | None:
+            """Applies an API action like the rec window would, returns an error message if it can't"""
+            nonlocal stop_action, lost
+            action = request.action
+            if start_event is not None:
+                if action != "start":
+                    return "Not recording"
+                start_event.set()
+                return None
+
+            assert stop_action is not None
+            value = stop_action.value
+            if action == "pause" and value == -1:
+                # a new command rather than in place, so every controller sees the pause
+                stop_action = manager.Value("b", -2)
+                publish(stop_action)
+                lost = False
+                print("Recording paused.")
+            elif action == "continue" and value == -2:
+                stop_action.value = 1  # handled below, which publishes the next command
+            elif action == "save" and value == -2:
+                stop_action.value = 0
+            elif action == "start":
+                return "Already recording"
+            elif value == -1:
+                return "Recording is in progress, pause it first"
+            else:
+                return "Recording is not paused"
+            return None
+
+        def save_recording():
+            nonlocal couple_ranges, frames_interpolated
+
+            rec = writer.add_recording()
+            rec.metadata["signal_quality"] = recording_signal_stats.summary()
+            rec.metadata["interpolated_frames"] = frames_interpolated
+            rec.metadata["couples"] = couple_ranges
+            if emg_timing is not None:
+                rec.metadata["emg_timing"] = emg_timing.recording_metadata(
+                    timing_at_start
+                )
+            couple_ranges = []
+            if protocol is not None:
+                rec.metadata.update(protocol.recording_metadata())
+            recording_signal_stats.reset()
+            frames_interpolated = 0
+            for segment in segments:
+                rec.add_segment(segment)
+            segments.clear()
+            if not segment_collector.empty:
+                rec.add_segment(segment_collector.finalize())
+            return rec
+
+        def flush_on_shutdown():
+            """Saves what was recorded so far, whether recording or paused"""
+            if status is not None:
+                status.update(state="flushing")
+            if stop_action is not None and (segments or not segment_collector.empty):
+                print("Shutdown while recording, saving the latest record...")
+                rec = save_recording()
+                rec.metadata["flushed_on_shutdown"] = True
+                print(f"Recording {writer.recording_index} saved.")
+
         while True:
+            if cut_short is not None and cut_short.is_set():
+                print(
+                    f">>> Recorder is cut short, {processing_results.qsize()} frames are not recorded."
+                )
+                flush_on_shutdown()
+                break
+
             try:
-                hand_angles: np.ndarray
-                signal_chunk: np.ndarray
-                coupling_fps: int
-                hand_angles, signal_chunk, coupling_fps = processing_results.get()
+                sample: HandSample = processing_results.get()
             except EmptyFinalized:
-                print("Force shutdown while recording. Latest record cancelled.")
+                flush_on_shutdown()
                 break
+            couple_index += 1
+
+            hand_angles = sample.hand_angles
+            signal_chunk = sample.signal
+            valid = sample.valid
+
+            signal_monitor.update(signal_chunk)
+            signal_quality = signal_monitor.snapshot()
+
+            while control_requests is not None:
+                try:
+                    request: ControlRequest = control_requests.get_nowait()
+                except queue.Empty:
+                    break
+                if not request.cancelled:
+                    request.reply(apply_control_request(request))
+
+            if protocol is not None:
+                protocol.drive(
+                    start_event,
+                    stop_action,
+                    frames_recorded,
+                    valid,
+                    lost,
+                )
 
             if stop_action is not None:
                 assert start_event is None
@@ -49,11 +181,7 @@ def recording_loop(
                         print("Saving to the disk...")
 
                         # Save segment to the disk
-                        rec = writer.add_recording()
-                        for segment in segments:
-                            rec.add_segment(segment)
-                        segments.clear()
-                        rec.add_segment(segment_collector.finalize())
+                        save_recording()
 
                         # Drain frames that came while writing the segment
                         qsize = processing_results.qsize()
@@ -62,9 +190,10 @@ def recording_loop(
                             for _ in range(processing_results.qsize()):
                                 processing_results.get()
                                 processing_results.task_done()
+                                couple_index += 1
 
-                        # The time is calculated assuming 32 fps
-                        elapsed = frames_recorded / 32.0
+                        # The time is calculated by the device clock as estimated on the host
+                        elapsed = frames_recorded * W / effective_rate()
                         minutes, seconds = divmod(int(elapsed), 60)
                         milliseconds = int((elapsed - int(elapsed)) * 1000)
                         print(
@@ -75,18 +204,20 @@ def recording_loop(
                         # Set ready to start new recording
                         stop_action = None
                         start_event = manager.Event()
-                        command_channel.put(start_event)
+                        publish(start_event)
 
-                    elif hand_angles is not None and not np.isnan(signal_chunk).any():
+                    elif valid:
                         segments.append(segment_collector.finalize())
                         start_event = None
                         stop_action = manager.Value("b", -1)
-                        command_channel.put(stop_action)
+                        publish(stop_action)
+                        lost = False
                         print("Continuing recording.")
 
                     else:
                         stop_action = manager.Value("b", -2)
-                        command_channel.put(stop_action)
+                        publish(stop_action)
+                        lost = True
                         print(
                             "No hand detected or emg failure. Record continue was ignored."
                         )
@@ -94,14 +225,17 @@ def recording_loop(
             if start_event is not None and start_event.is_set():
                 assert stop_action is None
 
-                if hand_angles is not None and not np.isnan(signal_chunk).any():
+                if valid:
                     start_event = None
                     stop_action = manager.Value("b", -1)
-                    command_channel.put(stop_action)
+                    publish(stop_action)
+                    lost = False
                     print(f"Recording {writer.recording_index + 1} started.")
+                    if emg_timing is not None:
+                        timing_at_start = emg_timing.snapshot()
                 else:
                     start_event = manager.Event()
-                    command_channel.put(start_event)
+                    publish(start_event)
                     print("No hand detected or emg failure. Record start was ignored.")
 
             if start_event is None:
@@ -111,15 +245,68 @@ def recording_loop(
                 # if not was questioned to save or cancel, continue collecting
                 if stop_action.value != -2:
                     # alert if signal_chunk is having NaNs or hand was lost
-                    if hand_angles is None or np.isnan(signal_chunk).any():
+                    if not valid:
                         stop_action = manager.Value("b", -2)
-                        command_channel.put(stop_action)
+                        publish(stop_action)
+                        lost = True
                         print("Hand or signal was lost.")
                     else:
                         frames_recorded += 1
-                        segment_collector.add(signal_chunk, hand_angles)
+                        frames_interpolated += sample.interpolated
+                        if segment_collector.empty:
+                            couple_ranges.append([couple_index, couple_index])
+                        couple_ranges[-1][1] = couple_index
+                        assert hand_angles is not None
+                        segment_collector.add(
+                            signal_chunk, hand_angles, sample.interpolated
+                        )
+                        recording_signal_stats.add(signal_quality)
+
+            # Let the processing workers know a hand is wanted (start requested or recording)
+            if recording_active is not None:
+                if start_event is None or start_event.is_set():
+                    recording_active.set()
+                else:
+                    recording_active.clear()
+
+            if status is not None:
+                if start_event is not None:
+                    state = "starting" if start_event.is_set() else "idle"
+                else:
+                    assert stop_action is not None
+                    state = {
+                        -1: "recording",
+                        -2: "paused",
+                        0: "saving",
+                        1: "continuing",
+                    }[stop_action.value]
+                status.update(
+                    state=state,
+                    recording=writer.recording_index + 1,
+                    recordings_saved=len(writer.recordings),
+                    buffered_bytes=sum(segment.nbytes for segment in segments)
+                    + segment_collector.allocated_bytes,
+                    frames_recorded=frames_recorded,
+                    elapsed=frames_recorded * W / effective_rate(),
+                    interpolated_frames=frames_interpolated,
+                    hand=hand_angles is not None,
+                    coupling_fps=sample.coupling_fps,
+                    latency=time.perf_counter() - sample.t_coupled,
+                    protocol=protocol.status() if protocol is not None else None,
+                    signal_quality={
+                        "rms": signal_quality.rms.tolist(),
+                        "saturation": signal_quality.saturation.tolist(),
+                        "line_noise": [
+                            None if np.isnan(v) else float(v)
+                            for v in signal_quality.line_noise
+                        ],
+                        "packet_error_rate": signal_quality.packet_error_rate,
+                    },
+                )
 
-            signal_fwd.put((signal_chunk))
-            hand_angles_fwd.put((hand_angles, coupling_fps))
+            if signal_fwd is not None:
+                signal_fwd.put((signal_chunk, signal_quality))
+            if hand_angles_fwd is not None:
+                hand_angles_fwd.put((hand_angles, sample.coupling_fps))
 
             processing_results.task_done()
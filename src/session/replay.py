@@ -0,0 +1,295 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from webcam_hand_triangulation.capture.cam_conf import load_cameras_parameters
+from webcam_hand_triangulation.capture.finalizable_queue import (
+    EmptyFinalized,
+    FinalizableQueue,
+    ThreadFinalizableQueue,
+)
+from webcam_hand_triangulation.capture.landmark_transforms import landmark_transforms
+from webcam_hand_triangulation.capture.ordering_loop import ordering_loop
+from webcam_hand_triangulation.capture.processing_loop import HandTriangulator
+
+from .dataset_reader import DatasetReader
+from .dataset_writer import (
+    DatasetWriter,
+    HandEmgRecordingSegment,
+    HandEmgRecordingSegmentCollector,
+    allocate_dataset_file,
+)
+from .messages import HandSample
+from .pose_filter import PoseFilterParams, pose_filter_loop
+from .processing_loop import processing_loop
+from .raw_capture import RawCaptureReader
+
+
+def raw_reading_loop(
+    reader: RawCaptureReader,
+    max_backlog: int,
+    coupled_emg_frames_queue: FinalizableQueue,
+):
+    """Feeds the raw capture as `CoupledFrames`, keeping at most `max_backlog` decoded in memory"""
+    for item in reader:
+        while coupled_emg_frames_queue.qsize() >= max_backlog:
+            time.sleep(0.005)
+        coupled_emg_frames_queue.put(item)
+    coupled_emg_frames_queue.finalize()
+
+
+def replay_writing_loop(
+    writer: DatasetWriter,
+    source_recordings: Dict[int, Dict[str, Any]],  # recordings metadata of the source dataset
+    results: FinalizableQueue,
+):
+    """
+    Rebuilds the source recordings from ordered `HandSample`s: the couples of every source
+    segment that still have a hand and a valid signal are split into segments
+    the same way `recording_loop` does.
+    """
+    # (first, last, recording) couple ranges, in order
+    ranges: List[Tuple[int, int, int]] = sorted(
+        (first, last, rec)
+        for rec, meta in source_recordings.items()
+        for first, last in meta.get("couples", [])
+    )
+    if not ranges:
+        print(">>> The source dataset has no couple ranges to replay.")
+
+    collector = HandEmgRecordingSegmentCollector(writer.W)
+    segments: List[HandEmgRecordingSegment] = []
+    couple_ranges: List[List[int]] = []
+    frames_interpolated = 0
+
+    def close_segment():
+        if not collector.empty:
+            segments.append(collector.finalize())
+
+    def close_recording(source: int):
+        nonlocal couple_ranges, frames_interpolated
+        close_segment()
+        if segments:
+            rec = writer.add_recording()
+            rec.metadata.update(source_recordings[source])
+            rec.metadata["couples"] = couple_ranges
+            rec.metadata["interpolated_frames"] = frames_interpolated
+            rec.metadata["source_recording"] = source
+            for segment in segments:
+                rec.add_segment(segment)
+            print(f"Recording {source} replayed as {writer.recording_index}.")
+        else:
+            print(f">>> Recording {source} has no hand left after the replay, skipped.")
+        segments.clear()
+        couple_ranges = []
+        frames_interpolated = 0
+
+    r = 0
+    couple_index = -1
+    while True:
+        try:
+            sample: HandSample = results.get()
+        except EmptyFinalized:
+            break
+        couple_index += 1
+
+        if r < len(ranges) and ranges[r][0] <= couple_index:
+            if not sample.valid:
+                close_segment()
+            else:
+                assert sample.hand_angles is not None
+                if collector.empty:
+                    couple_ranges.append([couple_index, couple_index])
+                couple_ranges[-1][1] = couple_index
+                frames_interpolated += sample.interpolated
+                collector.add(sample.signal, sample.hand_angles, sample.interpolated)
+
+            if couple_index == ranges[r][1]:
+                close_segment()
+                if r + 1 == len(ranges) or ranges[r + 1][2] != ranges[r][2]:
+                    close_recording(ranges[r][2])
+                r += 1
+
+        results.task_done()
+
+    if r < len(ranges):
+        print(f">>> Raw capture ended at couple {couple_index}, before the last recording.")
+        close_recording(ranges[r][2])
+
+
+def replay(
+    raw_path: str,
+    source_dataset: str,
+    datasets_path: str,
+    cameras_params: Dict[int, Any],
+    workers_num: int,
+    pose_filter_params: PoseFilterParams | None,
+):
+    reader = RawCaptureReader(raw_path)
+    if list(cameras_params.keys()) != reader.cameras_ids:
+        raise ValueError(
+            f"Calibration cameras {list(cameras_params.keys())} don't match the captured ones {reader.cameras_ids}"
+        )
+
+    with DatasetReader(source_dataset) as source:
+        source_metadata = dict(source.metadata)
+    source_recordings: Dict[int, Dict[str, Any]] = source_metadata.pop("recordings", {})
+    for key in ("pose_format", "W", "C"):
+        source_metadata.pop(key, None)
+
+    if pose_filter_params is None:
+        pose_filter_params = (
+            PoseFilterParams(**source_metadata["pose_filter"])
+            if "pose_filter" in source_metadata
+            else PoseFilterParams(False, 1.0, 0.05, 1.0, 0)
+        )
+
+    filepath = allocate_dataset_file(datasets_path)
+    print(
+        f"Replaying {len(reader)} couples of {raw_path} with {workers_num} workers "
+        f"into {os.path.normpath(filepath)}"
+    )
+
+    coupled_emg_frames = ThreadFinalizableQueue()
+    processing_results = ThreadFinalizableQueue()
+    ordered_processing_results = ThreadFinalizableQueue()
+    filtered_angles = ThreadFinalizableQueue()
+
+    triangulators = [
+        HandTriangulator(
+            [landmark_transforms[cp.track] for cp in cameras_params.values()],
+            list(cameras_params.values()),
+        )
+        for _ in range(workers_num)
+    ]
+
+    started = time.time()
+    with DatasetWriter(
+        filepath,
+        reader.W,
+        {
+            **source_metadata,
+            "pose_filter": pose_filter_params.to_metadata(),
+            "triangulator": {},
+            "replay": {
+                "source": os.path.basename(source_dataset),
+                "raw": os.path.basename(os.path.normpath(raw_path)),
+            },
+        },
+    ) as writer:
+        threads = [
+            threading.Thread(
+                target=raw_reading_loop,
+                args=(reader, 4 * workers_num, coupled_emg_frames),
+                daemon=True,
+            ),
+            *(
+                threading.Thread(
+                    target=processing_loop,
+                    args=(
+                        triangulator,
+                        False,
+                        (0, 0),
+                        list(cameras_params.values()),
+                        coupled_emg_frames,
+                        processing_results,
+                        None,
+                    ),
+                    daemon=True,
+                )
+                for triangulator in triangulators
+            ),
+            threading.Thread(
+                target=ordering_loop,
+                args=(processing_results, ordered_processing_results),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=pose_filter_loop,
+                args=(
+                    pose_filter_params,
+                    reader.chunk_rate,
+                    ordered_processing_results,
+                    filtered_angles,
+                ),
+                daemon=True,
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+
+        writer_thread = threading.Thread(
+            target=replay_writing_loop,
+            args=(writer, source_recordings, filtered_angles),
+            daemon=True,
+        )
+        writer_thread.start()
+
+        # processing workers -> ordering
+        for thread in threads[: 1 + workers_num]:
+            thread.join()
+        processing_results.finalize()
+
+        for thread in threads[1 + workers_num :]:
+            thread.join()
+        writer_thread.join()
+
+    elapsed = time.time() - started
+    print(
+        f"Replayed {len(reader)} couples in {elapsed:.1f}s ({len(reader) / max(elapsed, 1e-9):.1f} couples/s)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-run the hand triangulation over a raw capture, writing a new dataset"
+    )
+    parser.add_argument("raw", type=str, help="Path to the raw capture folder (flexN.raw)")
+    parser.add_argument(
+        "--source",
+        type=str,
+        default=None,
+        help="Dataset recorded along with the raw capture, its recordings are rebuilt (defaults to flexN.z next to flexN.raw)",
+    )
+    parser.add_argument(
+        "-d",
+        "--datasets_path",
+        type=str,
+        default="datasets",
+        help="Path to where to append the replayed dataset",
+    )
+    parser.add_argument(
+        "--cfile",
+        type=str,
+        default="cameras.calib.json5",
+        help="Path to the cameras calibration file",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Size of triangulation workers pool",
+    )
+    args = parser.parse_args()
+
+    raw_path = os.path.normpath(args.raw)
+    source = (
+        args.source
+        if args.source is not None
+        else os.path.splitext(raw_path)[0] + ".z"
+    )
+    if not os.path.exists(source):
+        print(f"Error: source dataset {source} not found", file=sys.stderr)
+        sys.exit(1)
+
+    replay(
+        raw_path=raw_path,
+        source_dataset=source,
+        datasets_path=args.datasets_path,
+        cameras_params=load_cameras_parameters(args.cfile),
+        workers_num=args.workers,
+                pose_filter_params=None,
+    )
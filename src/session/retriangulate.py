@@ -0,0 +1,390 @@
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+import json5
+import numpy as np
+
+from webcam_hand_triangulation.capture.finalizable_queue import ThreadFinalizableQueue
+from webcam_hand_triangulation.capture.ordering_loop import ordering_loop
+
+from .dataset_reader import DatasetReader
+from .dataset_writer import DatasetWriter, allocate_dataset_file
+from .messages import HandSample
+from .processing_loop import hand_angles
+from .pose_filter import PoseFilterParams, pose_filter_loop
+from .raw_capture import RawCaptureReader
+from .replay import replay_writing_loop
+
+# NOTE: shards are kept in the raw capture folder under a hash of the triangulation settings,
+#       an interrupted run resumes from the shards already written with the same settings
+# NOTE: `--model_complexity` is a HandTriangulator option like the `-t` ones, refused upfront
+#       by a HandTriangulator that doesn't take it
+
+# Per worker process state, set by `_init_worker`
+_reader: RawCaptureReader | None = None
+_triangulator: Any = None
+_init_error: Exception | None = None
+
+MAX_MERGE_BACKLOG = 1024  # merged couples waiting for the angles conversion
+
+MODEL_COMPLEXITIES = (0, 1)  # of mediapipe Hands
+
+
+def validate_triangulator_options(options: Dict[str, Any]):
+    """Raises ValueError unless HandTriangulator explicitly takes every option"""
+    from webcam_hand_triangulation.capture.processing_loop import HandTriangulator
+
+    parameters = inspect.signature(HandTriangulator).parameters
+    accepted = [
+        name
+        for name, p in list(parameters.items())[2:]  # after the transforms and cameras
+        if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)
+    ]
+    unknown = [key for key in options if key not in accepted]
+    if unknown:
+        raise ValueError(
+            f"HandTriangulator doesn't take {unknown} (it takes {accepted or 'no options'})"
+        )
+
+
+def make_triangulator(cfile: str, triangulator_kwargs: Dict[str, Any]) -> Any:
+    from webcam_hand_triangulation.capture.cam_conf import load_cameras_parameters
+    from webcam_hand_triangulation.capture.landmark_transforms import (
+        landmark_transforms,
+    )
+    from webcam_hand_triangulation.capture.processing_loop import HandTriangulator
+
+    cameras_params = load_cameras_parameters(cfile)
+    return HandTriangulator(
+        [landmark_transforms[cp.track] for cp in cameras_params.values()],
+        list(cameras_params.values()),
+        **triangulator_kwargs,
+    )
+
+
+def _init_worker(
+    raw_path: str,
+    cfile: str,
+    triangulator_kwargs: Dict[str, Any],
+):
+    # an exception here would make the pool respawn the worker forever,
+    # so it's kept and raised by the first task instead
+    global _reader, _triangulator, _init_error
+    try:
+        _reader = RawCaptureReader(raw_path)
+        _triangulator = make_triangulator(cfile, triangulator_kwargs)
+    except Exception as e:
+        _init_error = e
+
+
+def _triangulate_shard(shard: Tuple[int, int, str]) -> Tuple[int, int, str]:
+    first, last, shard_path = shard
+    if _init_error is not None:
+        raise RuntimeError(f"Worker initialization failed: {_init_error!r}")
+    assert _reader is not None and _triangulator is not None
+
+    points = np.full((last - first + 1, 21, 3), np.nan, dtype=np.float32)
+    found = np.zeros(last - first + 1, dtype=np.bool_)
+    for coupled in _reader.read(first, last):
+        _, _, points_3d = _triangulator.triangulate([f for f, _ in coupled.frames])
+        if points_3d:
+            points[coupled.index - first] = np.asarray(points_3d)
+            found[coupled.index - first] = True
+
+    # written under a temporary name, so a shard file is either complete or absent
+    tmp_path = f"{shard_path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, points=points, found=found)
+    os.replace(tmp_path, shard_path)
+    return shard
+
+
+def make_shards(
+    ranges: List[Tuple[int, int]], shard_size: int, shards_path: str
+) -> List[Tuple[int, int, str]]:
+    """Splits couple ranges into (first, last, file) shards of at most `shard_size` couples"""
+    shards = []
+    for first, last in sorted(ranges):
+        for start in range(first, last + 1, shard_size):
+            end = min(start + shard_size - 1, last)
+            shards.append((start, end, os.path.join(shards_path, f"{start}-{end}.npz")))
+    return shards
+
+
+def retriangulate(
+    raw_path: str,
+    source_dataset: str,
+    datasets_path: str,
+    cfile: str,
+    triangulator_kwargs: Dict[str, Any],
+    processes: int,
+    shard_size: int,
+    keep_shards: bool,
+):
+    # Fail fast here rather than in the workers
+    validate_triangulator_options(triangulator_kwargs)
+    make_triangulator(cfile, triangulator_kwargs).close()
+
+    reader = RawCaptureReader(raw_path)
+
+    with DatasetReader(source_dataset) as source:
+        source_metadata = dict(source.metadata)
+    source_recordings: Dict[int, Dict[str, Any]] = source_metadata.pop("recordings", {})
+    for key in ("pose_format", "W", "C"):
+        source_metadata.pop(key, None)
+
+    # Same options as the capture (its HandTriangulator defaults without any) give the same poses
+    captured = source_metadata.get("triangulator")
+    if captured is None:
+        print(
+            f">>> {os.path.basename(source_dataset)} doesn't store its triangulator options, "
+            "they can't be compared to these ones."
+        )
+    elif captured == triangulator_kwargs:
+        print(
+            f">>> The recordings were triangulated with the same options ({captured or 'the defaults'}), "
+            "re-triangulating them changes nothing."
+        )
+
+    pose_filter_params = (
+        PoseFilterParams(**source_metadata["pose_filter"])
+        if "pose_filter" in source_metadata
+        else PoseFilterParams(False, 1.0, 0.05, 1.0, 0)
+    )
+
+    # Only the recorded couples are triangulated
+    ranges = [
+        (first, min(last, len(reader) - 1))
+        for meta in source_recordings.values()
+        for first, last in meta.get("couples", [])
+        if first < len(reader)
+    ]
+    with open(cfile, "rb") as f:
+        settings = hashlib.sha1(
+            f.read()
+            + json.dumps(
+                triangulator_kwargs,
+                sort_keys=True,
+            ).encode()
+        ).hexdigest()[:12]
+    shards_path = os.path.join(raw_path, "shards", settings)
+    os.makedirs(shards_path, exist_ok=True)
+
+    shards = make_shards(ranges, shard_size, shards_path)
+    pending = [shard for shard in shards if not os.path.exists(shard[2])]
+    total_couples = sum(last - first + 1 for first, last, _ in shards)
+    print(
+        f"{len(shards)} shards of {total_couples} couples, "
+        f"{len(shards) - len(pending)} already done, {processes} processes."
+    )
+
+    # Triangulate the pending shards
+    started = time.time()
+    done_couples = 0
+    pending_couples = sum(last - first + 1 for first, last, _ in pending)
+    if pending:
+        with multiprocessing.Pool(
+            processes,
+            initializer=_init_worker,
+            initargs=(raw_path, cfile, triangulator_kwargs),
+        ) as pool:
+            for i, (first, last, _) in enumerate(
+                pool.imap_unordered(_triangulate_shard, pending), start=1
+            ):
+                done_couples += last - first + 1
+                elapsed = time.time() - started
+                rate = done_couples / max(elapsed, 1e-9)
+                print(
+                    f"Shard {i}/{len(pending)}: {done_couples}/{pending_couples} couples, "
+                    f"{rate:.1f} couples/s, ETA {(pending_couples - done_couples) / rate:.0f}s"
+                )
+
+    # Merge the shards in order: couples outside of the recordings go without a hand
+    filepath = allocate_dataset_file(datasets_path)
+    print(f"Merging into {os.path.normpath(filepath)}")
+
+    processing_results = ThreadFinalizableQueue()
+    ordered_processing_results = ThreadFinalizableQueue()
+    filtered_angles = ThreadFinalizableQueue()
+
+    with DatasetWriter(
+        filepath,
+        reader.W,
+        {
+            **source_metadata,
+            "triangulator": triangulator_kwargs,
+            "replay": {
+                "source": os.path.basename(source_dataset),
+                "raw": os.path.basename(os.path.normpath(raw_path)),
+            },
+        },
+    ) as writer:
+        threads = [
+            threading.Thread(
+                target=ordering_loop,
+                args=(processing_results, ordered_processing_results),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=pose_filter_loop,
+                args=(
+                    pose_filter_params,
+                    reader.chunk_rate,
+                    ordered_processing_results,
+                    filtered_angles,
+                ),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=replay_writing_loop,
+                args=(writer, source_recordings, filtered_angles),
+                daemon=True,
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Fed in the couples order, so the ordering buffers nothing
+        coupling_fps = reader.couples[:, 1]
+
+        def merged(index: int, points_3d: np.ndarray | None):
+            signal = np.array(reader.emg[index])
+            sample = HandSample(
+                index,
+                points_3d,
+                signal,
+                int(coupling_fps[index]),
+                not np.isnan(signal).any(),
+                time.perf_counter(),
+            )
+            if points_3d is not None:
+                sample.hand_angles = hand_angles(points_3d)
+            return index, sample
+
+        shard_at = {first: (last, shard_path) for first, last, shard_path in shards}
+        index = 0
+        while index < len(reader):
+            while processing_results.qsize() >= MAX_MERGE_BACKLOG:
+                time.sleep(0.005)
+
+            if index not in shard_at:
+                processing_results.put(merged(index, None))
+                index += 1
+                continue
+
+            last, shard_path = shard_at[index]
+            data = np.load(shard_path)
+            for points, found in zip(data["points"], data["found"]):
+                processing_results.put(merged(index, points if found else None))
+                index += 1
+            assert index == last + 1
+        processing_results.finalize()
+
+        for thread in threads:
+            thread.join()
+
+    if not keep_shards:
+        shutil.rmtree(shards_path)
+
+    print(f"Re-triangulated in {time.time() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-triangulate the recordings of a raw capture offline, sharded across processes"
+    )
+    parser.add_argument("raw", type=str, help="Path to the raw capture folder (flexN.raw)")
+    parser.add_argument(
+        "--source",
+        type=str,
+        default=None,
+        help="Dataset recorded along with the raw capture (defaults to flexN.z next to flexN.raw)",
+    )
+    parser.add_argument(
+        "-d",
+        "--datasets_path",
+        type=str,
+        default="datasets",
+        help="Path to where to append the re-triangulated dataset",
+    )
+    parser.add_argument(
+        "--cfile",
+        type=str,
+        default="cameras.calib.json5",
+        help="Path to the cameras calibration file",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of triangulation processes",
+    )
+    parser.add_argument(
+        "--shard",
+        type=int,
+        default=256,
+        help="Couples per shard, the unit of work and of resuming",
+    )
+    parser.add_argument(
+        "-t",
+        "--triangulator_option",
+        type=str,
+        action="append",
+        default=[],
+        help="key=value (json5 value) passed to HandTriangulator, repeatable",
+    )
+    parser.add_argument(
+        "--model_complexity",
+        type=int,
+        choices=MODEL_COMPLEXITIES,
+        default=None,
+        help="mediapipe Hands landmark model passed to HandTriangulator (same as -t model_complexity=N), its own default if not given",
+    )
+    parser.add_argument(
+        "--keep_shards",
+        help="Keep the shard files after the merge",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    triangulator_kwargs: Dict[str, Any] = {}
+    for option in args.triangulator_option:
+        key, sep, value = option.partition("=")
+        if not sep:
+            print(f"Error: triangulator option '{option}' must be key=value", file=sys.stderr)
+            sys.exit(1)
+        triangulator_kwargs[key] = json5.loads(value)
+    if args.model_complexity is not None:
+        triangulator_kwargs["model_complexity"] = args.model_complexity
+
+    raw_path = os.path.normpath(args.raw)
+    source = (
+        args.source
+        if args.source is not None
+        else os.path.splitext(raw_path)[0] + ".z"
+    )
+    if not os.path.exists(source):
+        print(f"Error: source dataset {source} not found", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        retriangulate(
+            raw_path=raw_path,
+            source_dataset=source,
+            datasets_path=args.datasets_path,
+            cfile=args.cfile,
+            triangulator_kwargs=triangulator_kwargs,
+            processes=args.processes,
+            shard_size=args.shard,
+            keep_shards=args.keep_shards,
+        )
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
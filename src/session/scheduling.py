@@ -0,0 +1,153 @@
+from collections import deque
+import os
+import sys
+import threading
+from typing import Any, Callable, Deque, Dict, List, NamedTuple
+
+# NOTE: keep this module stdlib only, the child processes apply their policy before any import
+# NOTE: policies are applied from inside the thread (or process) they are for,
+#       on Linux the affinity, scheduler and niceness calls then affect only the calling thread
+
+STAGES = ("emg", "coupling", "cameras", "processing", "recording", "gui")
+
+
+class StagePolicy(NamedTuple):
+    cores: List[int] | None = None  # None to run on any core
+    fifo: int | None = None  # SCHED_FIFO priority (1..99), time critical priority on Windows
+    nice: int | None = None  # niceness, positive demotes
+
+
+def load_scheduling(path: str) -> Dict[str, StagePolicy]:
+    """
+    Load a json5 file of per stage policies, e.g.:
+
+    {
+      emg: { cores: [2], fifo: 50 },
+      coupling: { cores: [3], fifo: 40 },
+      processing: { cores: "rest" },  // the cores not taken by the other stages
+      gui: { nice: 10 },
+    }
+    """
+    import json5
+
+    with open(path, "r") as f:
+        d: Dict[str, Any] = json5.load(f)
+
+    unknown = set(d) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}, expected some of {STAGES}")
+
+    cpus = (
+        sorted(os.sched_getaffinity(0))
+        if hasattr(os, "sched_getaffinity")
+        else list(range(os.cpu_count() or 1))
+    )
+    taken = {
+        core
+        for stage in d.values()
+        if isinstance(stage.get("cores"), list)
+        for core in stage["cores"]
+    }
+    rest = [core for core in cpus if core not in taken]
+
+    policies: Dict[str, StagePolicy] = {}
+    for name, stage in d.items():
+        cores = stage.get("cores")
+        if cores == "rest":
+            if not rest:
+                raise ValueError(f"No cores are left for '{name}'")
+            cores = rest
+        policies[name] = StagePolicy(
+            cores=[int(c) for c in cores] if cores is not None else None,
+            fifo=int(stage["fifo"]) if "fifo" in stage else None,
+            nice=int(stage["nice"]) if "nice" in stage else None,
+        )
+    return policies
+
+
+def apply_policy(label: str, policy: StagePolicy):
+    """Applies the policy to the calling thread, failures are reported and ignored"""
+    if sys.platform == "win32":
+        _apply_windows(label, policy)
+        return
+
+    if policy.cores is not None:
+        try:
+            os.sched_setaffinity(0, policy.cores)
+        except (AttributeError, OSError) as e:
+            print(f">>> Can't pin {label} to cores {policy.cores}: {e}")
+
+    if policy.fifo is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(policy.fifo))
+        except (AttributeError, OSError) as e:
+            print(
+                f">>> Can't set SCHED_FIFO for {label}: {e} (needs CAP_SYS_NICE or an rtprio limit)"
+            )
+
+    if policy.nice is not None:
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), policy.nice)
+        except (AttributeError, OSError) as e:
+            print(f">>> Can't set niceness of {label}: {e}")
+
+
+def _apply_windows(label: str, policy: StagePolicy):
+    try:
+        import win32api
+        import win32process
+    except ImportError:
+        print(f">>> pywin32 is not installed, scheduling of {label} is left as is.")
+        return
+
+    thread = win32api.GetCurrentThread()
+    if policy.cores is not None:
+        win32process.SetThreadAffinityMask(thread, sum(1 << c for c in policy.cores))
+    if policy.fifo is not None:
+        win32process.SetThreadPriority(thread, win32process.THREAD_PRIORITY_TIME_CRITICAL)
+    elif policy.nice is not None:
+        win32process.SetThreadPriority(
+            thread,
+            (
+                win32process.THREAD_PRIORITY_BELOW_NORMAL
+                if policy.nice > 0
+                else win32process.THREAD_PRIORITY_ABOVE_NORMAL
+            ),
+        )
+
+
+def run_with_policy(label: str, policy: StagePolicy, target: Callable, *args):
+    """Thread target wrapper"""
+    apply_policy(label, policy)
+    return target(*args)
+
+
+class JitterStats:
+    """Deviations of the intervals between periodic events from their nominal period"""
+
+    def __init__(self, period: float, window: int = 4096):
+        self.period = period
+        self._last: float | None = None
+        self._deviations: Deque[float] = deque(maxlen=window)
+
+    def add(self, timestamp: float):
+        if self._last is not None:
+            self._deviations.append(timestamp - self._last - self.period)
+        self._last = timestamp
+
+    def gap(self):
+        """The next event doesn't follow the previous one (e.g. after an error)"""
+        self._last = None
+
+    def summary(self) -> Dict[str, float]:
+        """Milliseconds over the window"""
+        if not self._deviations:
+            return {}
+        d = [v * 1000 for v in self._deviations]
+        mean = sum(d) / len(d)
+        magnitudes = sorted(abs(v) for v in d)
+        return {
+            "std_ms": round((sum((v - mean) ** 2 for v in d) / len(d)) ** 0.5, 3),
+            "p99_ms": round(magnitudes[min(len(d) - 1, int(0.99 * len(d)))], 3),
+            "max_late_ms": round(max(d), 3),
+        }
@@ -0,0 +1,93 @@
+import multiprocessing
+import threading
+import time
+from typing import Callable, List, NamedTuple, Sequence
+
+# NOTE: stages are drained in the pipeline order, every stage gets its own deadline counted
+#       from when it's asked to finish, so a stuck stage delays the exit by its deadline at most
+#       (threads are daemons and are left behind, processes are terminated), except for stages
+#       with an `overtime` that are asked to wrap up and then waited for as long as they take
+
+
+class StageDrain(NamedTuple):
+    name: str
+    seconds: float
+    stuck: int  # workers still alive after the deadline and left
+    late: int = 0  # workers still alive after the deadline, waited for or left
+
+
+class Shutdown:
+    """Joins the pipeline stages with deadlines and reports how long each one took to drain"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: List[StageDrain] = []
+
+    def stage(
+        self,
+        name: str,
+        workers: Sequence[threading.Thread | multiprocessing.Process | None],
+        deadline: float,  # seconds
+        then: Callable[[], None] | None = None,  # e.g. finalizing the queues of the next stage
+        overtime: Callable[[], None] | None = None,  # asks the late workers to wrap up
+    ) -> bool:
+        """True if every worker finished in time, `then` is called anyway"""
+        start = time.perf_counter()
+        end = start + deadline
+
+        stuck = []
+        for worker in workers:
+            if worker is None:
+                continue
+            worker.join(max(0.0, end - time.perf_counter()))
+            if worker.is_alive():
+                stuck.append(worker)
+
+        # e.g. the recorder amid writing its archive, leaving it would break the archive
+        late = len(stuck)
+        if stuck and overtime is not None:
+            print(f">>> {name}: not done in {deadline:.0f}s, waiting for it to wrap up...")
+            overtime()
+            for worker in stuck:
+                while worker.is_alive():
+                    worker.join(10.0)
+                    if worker.is_alive():
+                        print(f">>> {name}: still wrapping up...")
+            stuck = []
+
+        for worker in stuck:
+            if isinstance(worker, multiprocessing.Process):
+                worker.terminate()
+                worker.join(1.0)
+
+        seconds = time.perf_counter() - start
+        self.stages.append(StageDrain(name, seconds, len(stuck), late))
+        if stuck:
+            print(
+                f">>> {name}: {len(stuck)} of {sum(w is not None for w in workers)} didn't finish"
+                f" in {deadline:.0f}s, "
+                + (
+                    "terminated."
+                    if isinstance(stuck[0], multiprocessing.Process)
+                    else "left behind."
+                )
+            )
+
+        if then is not None:
+            then()
+
+        return not stuck
+
+    def report(self):
+        print(
+            f"Shutdown took {time.perf_counter() - self.start:.2f}s: "
+            + ", ".join(
+                f"{s.name} {s.seconds:.2f}s"
+                + (
+                    f" ({s.stuck} stuck)"
+                    if s.stuck
+                    else f" ({s.late} late)" if s.late else ""
+                )
+                for s in self.stages
+            )
+        )
@@ -0,0 +1,182 @@
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Tuple
+import numpy as np
+
+# NOTE: chunks are expected normalized to [0, 1] as produced by `EmgDevice.read_packets`,
+#       so 0 and 1 are the ADC rails (0 and `EmgDevice.max_value`)
+
+
+class SignalQuality(NamedTuple):
+    rms: np.ndarray  # (C,) RMS around the window mean
+    saturation: np.ndarray  # (C,) ratio of samples on the ADC rails
+    line_noise: np.ndarray  # (C,) ratio of AC power at the mains frequency and its harmonics
+    packet_error_rate: float  # ratio of packets dropped by the parser
+
+
+class SignalQualityMonitor:
+    """
+    Per-channel signal quality metrics over a sliding window of the last `window` samples.
+
+    Every metric is maintained incrementally - an update only touches the samples
+    of the incoming chunk and the ones they overwrite in the ring buffer.
+
+    Line noise is measured with a sliding DFT evaluated only at the bins nearest to
+    the mains harmonics, magnitude of an integer bin does not depend on the ring rotation
+    so the ring never needs to be reordered.
+    """
+
+    def __init__(
+        self,
+        channels: int,
+        sample_rate: float = 2048.0,
+        window: int = 2048,
+        line_freq: float = 50.0,
+        harmonics: int = 3,
+    ):
+        self.channels = channels
+        self.window = window
+
+        self._ring = np.zeros((window, channels), dtype=np.float64)
+        self._head = 0
+        self._filled = 0
+        self._sum = np.zeros(channels)
+        self._sqsum = np.zeros(channels)
+        self._saturated = np.zeros(channels, dtype=np.int64)
+
+        bins = sorted(
+            {
+                k
+                for k in (
+                    round(line_freq * h * window / sample_rate)
+                    for h in range(1, harmonics + 1)
+                )
+                if 0 < k < window // 2
+            }
+        )
+        self._basis = np.exp(
+            -2j * np.pi * np.outer(np.arange(window), bins) / window
+        )  # (window, H)
+        self._spectrum = np.zeros((len(bins), channels), dtype=np.complex128)
+
+        # (packets, failed) per chunk, limited to the last `window` packets
+        self._packets: Deque[Tuple[int, bool]] = deque()
+        self._packets_total = 0
+        self._packets_failed = 0
+
+    def update(self, chunk: np.ndarray):  # (W, C)
+        n = chunk.shape[0]
+        failed = bool(np.isnan(chunk).any())
+
+        self._packets.append((n, failed))
+        self._packets_total += n
+        self._packets_failed += n if failed else 0
+        while self._packets_total - self._packets[0][0] >= self.window:
+            m, m_failed = self._packets.popleft()
+            self._packets_total -= m
+            self._packets_failed -= m if m_failed else 0
+
+        # NaN chunks carry no samples, only account them as parser errors
+        if failed:
+            return
+
+        if n > self.window:
+            chunk = chunk[-self.window :]
+            n = self.window
+
+        slots = (self._head + np.arange(n)) % self.window
+        new = chunk.astype(np.float64)
+        old = self._ring[slots]
+
+        self._sum += new.sum(axis=0) - old.sum(axis=0)
+        self._sqsum += (new * new).sum(axis=0) - (old * old).sum(axis=0)
+        old_rails = self._rails(old)
+        if self._filled < self.window:
+            # slots past the filled part hold zero padding, not rail samples
+            old_rails &= (slots < self._filled)[:, None]
+        self._saturated += self._rails(new).sum(axis=0) - old_rails.sum(axis=0)
+        self._spectrum += self._basis[slots].T @ (new - old)
+
+        self._ring[slots] = new
+        self._head = (self._head + n) % self.window
+        self._filled = min(self._filled + n, self.window)
+
+        # Recompute the accumulators once per ring revolution so rounding errors can't pile up
+        if self._head < n:
+            self._resync()
+
+    def snapshot(self) -> SignalQuality:
+        # zero padding of a not yet filled ring adds nothing to the sums
+        n = max(self._filled, 1)
+        mean = self._sum / n
+        var = np.maximum(self._sqsum / n - mean * mean, 0.0)
+
+        if self._filled < self.window:
+            # the ring is still padded with zeros, so its spectrum is not representative
+            line_noise = np.full(self.channels, np.nan)
+        else:
+            line_power = 2.0 * (np.abs(self._spectrum) ** 2).sum(axis=0) / (n * n)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                line_noise = np.where(var > 0, line_power / var, 0.0)
+
+        return SignalQuality(
+            rms=np.sqrt(var),
+            saturation=self._saturated / n,
+            line_noise=line_noise,
+            packet_error_rate=(
+                self._packets_failed / self._packets_total
+                if self._packets_total
+                else 0.0
+            ),
+        )
+
+    def _rails(self, samples: np.ndarray) -> np.ndarray:
+        return (samples >= 1.0) | (samples <= 0.0)
+
+    def _resync(self):
+        self._sum = self._ring.sum(axis=0)
+        self._sqsum = (self._ring * self._ring).sum(axis=0)
+        # only the filled part is real data, zero padding would count as saturated
+        self._saturated = self._rails(self._ring[: self._filled]).sum(axis=0)
+        self._spectrum = self._basis.T @ self._ring
+
+
+class SignalQualityStats:
+    """
+    Aggregates monitor snapshots over a recording to be stored in the recording metadata
+    """
+
+    def __init__(self, channels: int):
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._rms = np.zeros(self.channels)
+        self._saturation = np.zeros(self.channels)
+        self._line_noise = np.zeros(self.channels)
+        self._line_noise_count = np.zeros(self.channels, dtype=np.int64)
+        self._packet_error_rate = 0.0
+
+    def add(self, quality: SignalQuality):
+        self._count += 1
+        self._rms += quality.rms
+        self._saturation = np.maximum(self._saturation, quality.saturation)
+        known = ~np.isnan(quality.line_noise)
+        self._line_noise[known] += quality.line_noise[known]
+        self._line_noise_count += known
+        self._packet_error_rate += quality.packet_error_rate
+
+    def summary(self) -> Dict[str, Any]:
+        count = max(self._count, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            line_noise = self._line_noise / self._line_noise_count
+
+        def to_list(values: np.ndarray):
+            return [None if np.isnan(v) else round(float(v), 6) for v in values]
+
+        return {
+            "mean_rms": to_list(self._rms / count),
+            "max_saturation": to_list(self._saturation),
+            "mean_line_noise": to_list(line_noise),
+            "mean_packet_error_rate": round(self._packet_error_rate / count, 6),
+        }
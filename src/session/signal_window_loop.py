@@ -1,6 +1,8 @@
 from collections import deque
 import multiprocessing
 import multiprocessing.synchronize
+import time
+from typing import Any
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Button
 import numpy as np
@@ -11,6 +13,7 @@ from webcam_hand_triangulation.capture.finalizable_queue import (
 )
 
 from .position_loader import load_position, save_position
+from .signal_quality import SignalQuality
 
 
 def signal_window_loop(
@@ -18,7 +21,12 @@ def signal_window_loop(
     channels_num: int,
     stop_event: multiprocessing.synchronize.Event,
     signal_queue: FinalizableQueue,
+    sizes_queue: Any = None,  # multiprocessing.Queue, gets the buffer sizes for the memory profile
 ):
+    if sizes_queue is not None:
+        sizes_queue.cancel_join_thread()  # unread reports must not hold the exit
+    last_sizes_report = 0.0
+
     # Create a deque for each channel to store the last N records
     dmaxlen = 10000  # Define the maximum length of the deque
     data = [deque([0] * dmaxlen, maxlen=dmaxlen) for _ in range(channels_num)]
@@ -35,6 +43,29 @@ def signal_window_loop(
     ax.set_xlabel("Sample")
     ax.set_ylabel("Value")
 
+    # Live signal quality readout
+    quality_text = ax.text(
+        0.01,
+        0.99,
+        "",
+        transform=ax.transAxes,
+        va="top",
+        ha="left",
+        family="monospace",
+        fontsize=8,
+    )
+
+    def show_quality(quality: SignalQuality):
+        rows = [f"Packet errors: {quality.packet_error_rate * 100:5.1f}%"]
+        for i in range(channels_num):
+            line_noise = quality.line_noise[i]
+            rows.append(
+                f"Ch {i}: RMS {quality.rms[i] * 100:6.2f}"
+                f"  Sat {quality.saturation[i] * 100:5.1f}%"
+                f"  Line {'  -  ' if np.isnan(line_noise) else f'{line_noise * 100:5.1f}%'}"
+            )
+        quality_text.set_text("\n".join(rows))
+
     def on_close(_):
         stop_event.set()
 
@@ -79,6 +110,8 @@ def signal_window_loop(
             for i in range(channels_num):
                 data[i].append(sample[i] * 100)
 
+    quality: SignalQuality | None = None
+
     while True:
         try:
             # track latest x, y
@@ -90,7 +123,8 @@ def signal_window_loop(
 
         try:
             for _ in range(max(1, signal_queue.qsize())):
-                signal_chunk: np.ndarray = signal_queue.get()
+                signal_chunk: np.ndarray
+                signal_chunk, quality = signal_queue.get()
                 fill_data(signal_chunk)
                 signal_queue.task_done()
         except EmptyFinalized:
@@ -101,6 +135,13 @@ def signal_window_loop(
         for i, line in enumerate(lines):
             line.set_ydata(data[i])
 
+        if quality is not None:
+            show_quality(quality)
+
+        if sizes_queue is not None and time.time() - last_sizes_report > 1.0:
+            last_sizes_report = time.time()
+            sizes_queue.put({"signal window samples": sum(len(d) for d in data)})
+
         # Redraw the plot
         fig.canvas.draw_idle()
         plt.pause(0.01)  # Allow matplotlib to process GUI events
@@ -0,0 +1,88 @@
+import contextlib
+import importlib
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+# NOTE: keep this module stdlib only, it's the entry point of every child process
+
+
+class StartupProfiler:
+    """
+    Collects a timeline of the session startup: import and initialization spans of the main
+    process and import times of the child processes (reported back through a queue).
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.t0 = time.time()
+        self._lock = threading.Lock()
+        self._spans: List[Tuple[str, float, float]] = []  # (label, start, end)
+        self._children: Any = multiprocessing.Queue() if enabled else None
+        self._started: Dict[str, float] = {}  # child label -> when it was started
+
+    @contextlib.contextmanager
+    def span(self, label: str):
+        start = time.time()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                with self._lock:
+                    self._spans.append((label, start, time.time()))
+
+    def child(self, label: str) -> Any:
+        """Report channel to pass to `process_main`, call right before starting the process"""
+        if not self.enabled:
+            return None
+        self._started[label] = time.time()
+        return self._children
+
+    def report(self, timeout: float = 10.0):
+        """Prints the timeline, waits up to `timeout` for the children to report"""
+        if not self.enabled:
+            return
+
+        spans = list(self._spans)
+        deadline = time.time() + timeout
+        for _ in range(len(self._started)):
+            try:
+                label, spawned, imported = self._children.get(
+                    timeout=max(0.0, deadline - time.time())
+                )
+            except queue.Empty:
+                print(">>> Some child processes have not reported their startup.")
+                break
+            spans.append((f"{label} (spawn)", self._started[label], spawned))
+            spans.append((f"{label} (import)", spawned, imported))
+
+        print("Startup timeline:")
+        for label, start, end in sorted(spans, key=lambda s: (s[1], s[2])):
+            print(
+                f"  {start - self.t0:7.3f}s .. {end - self.t0:7.3f}s  {end - start:7.3f}s  {label}"
+            )
+
+
+def process_main(
+    label: str,
+    module: str,
+    func: str,
+    args: Tuple[Any, ...],
+    report: Any,  # StartupProfiler.child()
+    policy: Any = None,  # scheduling.StagePolicy
+):
+    """
+    Child process entry point - applies the scheduling policy, imports only the module
+    of its target (and reports how long it took if profiling)
+    """
+    spawned = time.time()
+    if policy is not None:
+        from .scheduling import apply_policy
+
+        apply_policy(label, policy)
+    target = getattr(importlib.import_module(module), func)
+    if report is not None:
+        report.put((label, spawned, time.time()))
+    target(*args)
@@ -1,44 +1,68 @@
 import threading
 import time
+import numpy as np
+
+from .device_profile import EmgDeviceProfile
 
 
 class SyntheticSerial:
     """Mock serial port for generating synthetic ADC data."""
 
-    def __init__(self, channels: int = 6):
+    def __init__(self, profile: EmgDeviceProfile, timeout: float | None = None):
+        self.timeout = timeout
         self.current_count = 0
         self.buffer = bytearray()  # Use a bytearray to store bytes
         self.buffer_lock = threading.Lock()  # Lock for thread-safe access to the buffer
         self.data_available = threading.Condition(self.buffer_lock)
-        self.channels = channels  # Example number of channels
+        self.profile = profile
+        self.channels = profile.channels
         self.running = True
+        self._cancelled = False
 
         # Start the worker thread to add bytes to the buffer
         self.worker_thread = threading.Thread(target=self._worker)
         self.worker_thread.start()
 
+    def _packets(self, amount: int) -> bytes:
+        """Generate synthetic packets with incrementing values"""
+        p = self.profile
+        counts = self.current_count + np.arange(amount, dtype=np.uint64)
+        values = (counts[:, None] + np.arange(self.channels, dtype=np.uint64) * 64) % (
+            1 << p.payload_bits
+        )
+        self.current_count += amount
+
+        # Little-endian bytes of every value, truncated to the channel width
+        payload = (
+            values.astype("<u4")
+            .view(np.uint8)
+            .reshape(amount, self.channels, 4)[:, :, : p.bytes_per_channel]
+            .reshape(amount, -1)
+        )
+        counters = (
+            counts.astype("<u4")
+            .view(np.uint8)
+            .reshape(amount, 4)[:, : p.counter_bytes]
+        )
+        delimiters = np.tile(np.frombuffer(p.delimiter, dtype=np.uint8), (amount, 1))
+        return np.hstack((payload, counters, delimiters)).tobytes()
+
     def _worker(self):
-        """Worker thread that adds 64 packets each 0.03125 second to the buffer (so that the rate 2048 packets per second)."""
+        """Worker thread that adds 64 packets each 64 / sample_rate seconds to the buffer (so that the rate is sample_rate packets per second)."""
+        period = 64 / self.profile.sample_rate
         while self.running:
-            start_time = time.time()  # Track the start time of the 1-second period
+            start_time = time.time()  # Track the start time of the period
 
-            # Generate a synthetic packet with incrementing values
-            packets = bytearray()
-            for _ in range(64):
-                for channel in range(self.channels):
-                    value = (self.current_count + channel * 64) % 4096
-                    packets += value.to_bytes(2, byteorder="little")
-                packets += b"\xff\xff"  # Delimiter
-                self.current_count += 1
+            packets = self._packets(64)
 
             # Add the packet bytes to the buffer (thread-safe)
             with self.buffer_lock:
                 self.buffer.extend(packets)
                 self.data_available.notify_all()
 
-            # Calculate the remaining time to sleep to maintain the 1-second period
+            # Calculate the remaining time to sleep to maintain the period
             elapsed_time = time.time() - start_time
-            sleep_time = 0.03125 - elapsed_time
+            sleep_time = period - elapsed_time
 
             if sleep_time > 0:
                 time.sleep(sleep_time)  # Sleep for the remaining time
@@ -50,14 +74,25 @@ class SyntheticSerial:
             return len(self.buffer)
 
     def read(self, size: int = 1):
-        """Read bytes from the buffer."""
+        """Read bytes from the buffer, fewer on timeout or cancel like a serial port."""
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
         with self.data_available:
-            while len(self.buffer) < size:
-                self.data_available.wait()  # Block until enough data is available
+            while len(self.buffer) < size and not self._cancelled:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.data_available.wait(remaining)  # Block until enough data is available
+            self._cancelled = False
             result = self.buffer[:size]
             del self.buffer[:size]
             return result
 
+    def cancel_read(self):
+        """Make the current (or the next) read return immediately."""
+        with self.data_available:
+            self._cancelled = True
+            self.data_available.notify_all()
+
     def close(self):
         """Stop the worker thread and clean up."""
         self.running = False
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+from typing import Any, Callable, Tuple
+
+
+class TriangulationCache:
+    """
+    Triangulation results of the latest frame sets, shared by the processing workers and keyed
+    by the per camera capture sequence numbers of the frames (see `emg_coupling_loop`).
+
+    A key being triangulated by a worker is reserved with a future,
+    so a duplicate picked by another worker meanwhile waits for it instead of recomputing.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[Tuple[int, ...], Future]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get_or_compute(self, key: Tuple[int, ...], compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._results.get(key)
+            if future is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                owner = False
+            else:
+                future = Future()
+                self._results[key] = future
+                if len(self._results) > self.maxsize:
+                    self._results.popitem(last=False)
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                if self._results.get(key) is future:
+                    del self._results[key]
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the session and the capture submodule are imported from src, as `python -m session` does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
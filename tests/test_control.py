@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+import types
+
+import pytest
+
+from session import control
+from session.control import ControlClient, ControlServer, RecordingStatus
+
+
+class FakeManager:
+    """The few SyncManager proxies `recording_loop` makes, as plain in-process objects"""
+
+    def Event(self):
+        return threading.Event()
+
+    def Value(self, typecode: str, value: int):
+        return types.SimpleNamespace(value=value)
+
+
+class Commands:
+    """A controller channel, keeps what the recorder publishes"""
+
+    def __init__(self):
+        self.published = []
+
+    def put(self, command):
+        self.published.append(command)
+
+
+class Recorder:
+    """The real `recording_loop` fed with valid samples until closed"""
+
+    def __init__(self, path: str, requests: queue.Queue, status: RecordingStatus):
+        np = pytest.importorskip("numpy")
+        finalizable_queue = pytest.importorskip(
+            "webcam_hand_triangulation.capture.finalizable_queue"
+        )
+        from session.messages import HandSample
+        from session.recording_loop import recording_loop
+
+        self.samples = finalizable_queue.ThreadFinalizableQueue()
+        self.commands = Commands()
+        self._feeding = True
+
+        def feed():
+            index = 0
+            while self._feeding:
+                if self.samples.qsize() < 4:
+                    signal = np.zeros((4, 2), np.float32)
+                    sample = HandSample(
+                        index, None, signal, 30, True, time.perf_counter()
+                    )
+                    sample.hand_angles = np.zeros(20, np.float32)
+                    self.samples.put(sample)
+                    index += 1
+                time.sleep(0.001)
+            self.samples.finalize()
+
+        self._threads = [
+            threading.Thread(target=feed, daemon=True),
+            threading.Thread(
+                target=recording_loop,
+                args=(
+                    FakeManager(),
+                    [self.commands],
+                    path,
+                    self.samples,
+                    None,
+                    None,
+                    4,  # W
+                    2,  # channels
+                    400.0,
+                    {},
+                ),
+                kwargs={"status": status, "control_requests": requests},
+                daemon=True,
+            ),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        self._feeding = False
+        for thread in self._threads:
+            thread.join()
+
+
+def wait_state(status: RecordingStatus, state: str, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while status.snapshot()["state"] != state:
+        assert time.monotonic() < deadline, f"{status.snapshot()['state']} is not {state}"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def session():
+    requests = queue.Queue()
+    status = RecordingStatus()
+    stop_event = threading.Event()
+    server = ControlServer("127.0.0.1", 0, requests, status, stop_event)
+    server.start()
+    yield server, requests, status, stop_event
+    server.close()
+
+
+def test_round_trip(session, tmp_path):
+    server, requests, status, stop_event = session
+    path = str(tmp_path / "flex0.z")
+    recorder = Recorder(path, requests, status)
+    client = ControlClient(*server.address)
+    try:
+        wait_state(status, "idle")
+        with pytest.raises(RuntimeError, match="Not recording"):
+            client.pause()
+
+        client.start()
+        wait_state(status, "recording")
+        with pytest.raises(RuntimeError, match="pause it first"):
+            client.save()
+
+        client.pause()
+        wait_state(status, "paused")
+        client.resume()
+        wait_state(status, "recording")
+
+        client.pause()
+        wait_state(status, "paused")
+        client.save()
+        wait_state(status, "idle")
+        assert status.snapshot()["recordings_saved"] == 1
+
+        client.stop()
+        assert stop_event.is_set()
+    finally:
+        recorder.close()
+
+    # every controller saw the commands of the API actions
+    kinds = [type(command).__name__ for command in recorder.commands.published]
+    assert kinds.count("Event") == 2  # ready to start, then again after the save
+    assert kinds.count("SimpleNamespace") == 4  # recording, paused, recording, paused
+
+    from session.dataset_reader import DatasetReader
+
+    with DatasetReader(path) as reader:
+        assert len(reader.recordings()) == 1
+
+
+def test_recorder_not_responding(session, monkeypatch):
+    server, requests, _, _ = session
+    monkeypatch.setattr(control, "REQUEST_TIMEOUT", 0.1)
+    with pytest.raises(RuntimeError, match="not responding"):
+        ControlClient(*server.address).start()
+
+    # a request given up on is not applied later
+    request = requests.get_nowait()
+    assert request.cancelled
@@ -0,0 +1,60 @@
+import json
+import zipfile
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from session.dataset_reader import DatasetReader
+from session.dataset_writer import (
+    MANIFEST,
+    DatasetWriter,
+    HandEmgRecordingSegmentCollector,
+)
+
+
+def segment(W: int, couples: int):
+    collector = HandEmgRecordingSegmentCollector(W)
+    for _ in range(couples + 1):
+        collector.add(np.zeros((W, 2), dtype=np.float32), np.zeros(20, dtype=np.float32))
+    return collector.finalize()
+
+
+def test_manifest_of_an_unclosed_archive(tmp_path):
+    path = str(tmp_path / "flex0.z")
+    W = 4
+    with DatasetWriter(path, W, {"device": {"sample_rate": 400.0}}) as writer:
+        for couples in ([3, 5], [7]):
+            rec = writer.add_recording()
+            rec.metadata["gesture"] = "fist"
+            for n in couples:
+                rec.add_segment(segment(W, n))
+
+    with DatasetReader(path) as reader:
+        complete = reader.manifest()
+    assert complete is not None and "partial" not in complete
+
+    # every segment leaves only its own entry, the members don't grow along the recording
+    with zipfile.ZipFile(path) as archive:
+        for rec in complete["recordings"]:
+            for entry in rec["segments"]:
+                member = json.loads(
+                    archive.read(
+                        f"recordings/{rec['index']}/manifest.{entry['segment']}.json"
+                    )
+                )
+                assert member["segment"] == entry
+
+    # what a zip recovery of a session killed before closing its archive would leave
+    recovered = str(tmp_path / "flex1.z")
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(recovered, "w") as dst:
+        for name in src.namelist():
+            if name not in (MANIFEST, "metadata.yml"):
+                dst.writestr(name, src.read(name))
+
+    with DatasetReader(recovered) as reader:
+        partial = reader.manifest()
+        assert partial is not None and partial["partial"]
+        assert partial["recordings"] == complete["recordings"]
+        assert (partial["W"], partial["C"]) == (W, 2)
+        assert reader.verify() == []
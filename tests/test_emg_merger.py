@@ -0,0 +1,57 @@
+import queue
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("serial")
+
+from session.emg_reader import EmgChunk, EmgMerger
+
+W = 10
+SAMPLE_RATE = 100.0  # a 0.1 s chunk period
+
+
+class StalledReader:
+    """Stands for an EmgReader, chunks are queued by the test"""
+
+    def __init__(self):
+        self.name = "stalled"
+        self.W = W
+        self.channels = 2
+        self.chunks: queue.Queue[EmgChunk] = queue.Queue()
+
+    def get(self, timeout: float) -> EmgChunk:
+        return self.chunks.get(timeout=timeout)
+
+    def put(self, timestamp: float, value: float):
+        self.chunks.put(EmgChunk(timestamp, np.full((W, self.channels), value)))
+
+
+def test_late_chunk_of_a_stalled_device_is_dropped():
+    reader = StalledReader()
+    merger = EmgMerger([reader], SAMPLE_RATE, timeout_chunks=1.0)
+
+    # nothing delivered in time, the step is filled with NaNs
+    assert np.isnan(merger.read()).all()
+    emitted = time.perf_counter()
+
+    # the device catches up: the late chunk of that step, then the one of the next step
+    reader.put(emitted, 1.0)
+    reader.put(emitted + merger.period, 2.0)
+
+    assert (merger.read() == 2.0).all()
+    assert (merger.timeouts, merger.dropped) == ([1], [1])
+
+
+def test_chunks_on_time_are_kept():
+    reader = StalledReader()
+    merger = EmgMerger([reader], SAMPLE_RATE, timeout_chunks=1.0)
+
+    now = time.perf_counter()
+    reader.put(now, 1.0)
+    reader.put(now + 0.01, 2.0)  # read in a burst, still not after a timeout
+
+    assert (merger.read() == 1.0).all()
+    assert (merger.read() == 2.0).all()
+    assert (merger.timeouts, merger.dropped) == ([0], [0])
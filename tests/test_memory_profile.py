@@ -0,0 +1,36 @@
+import json
+import os
+import queue
+import time
+import tracemalloc
+
+from session.memory_profile import MemoryProfiler, ReportedSizes
+
+
+def test_samples(tmp_path):
+    reports = queue.Queue()
+    reports.put({"signal window samples": 10})
+    reports.put({"signal window samples": 20})
+    sizes = ReportedSizes(reports)
+
+    path = str(tmp_path / "flex0.mem.jsonl")
+    profiler = MemoryProfiler(
+        path,
+        0.01,
+        lambda: {"main": os.getpid()},
+        {"signal window samples": lambda: sizes.get("signal window samples")},
+        jitter=lambda: {"coupling": {"std_ms": 0.1, "p99_ms": 0.5, "max_late_ms": 0.7}},
+    )
+    profiler.start()
+    assert tracemalloc.get_traceback_limit() == 1
+    time.sleep(0.05)
+    profiler.close()
+
+    with open(path) as f:
+        samples = [json.loads(line) for line in f]
+    assert len(samples) >= 2
+    for sample in samples:
+        assert sample["sizes"]["signal window samples"] == 20  # the latest report
+        assert sample["snapshot_ms"] >= 0
+        assert sample["emg_jitter"]["coupling"]["p99_ms"] == 0.5
+        assert all(len(site["site"].split(" <- ")) == 1 for site in sample["top"])
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("json5")
+
+from session.protocol import ProtocolRunner, ProtocolStep
+
+
+class Value:
+    def __init__(self, value: int):
+        self.value = value
+
+
+def recording_runner() -> ProtocolRunner:
+    runner = ProtocolRunner([ProtocolStep("fist", 10.0, 0.0)], chunk_rate=1.0)
+    runner.drive(None, Value(-1), 0, True)  # recording
+    return runner
+
+
+def test_continues_after_a_loss():
+    runner = recording_runner()
+    stop_action = Value(-2)
+    runner.drive(None, stop_action, 3, False, lost=True)
+    assert stop_action.value == -2
+    runner.drive(None, stop_action, 3, True, lost=True)
+    assert stop_action.value == 1
+
+
+def test_leaves_an_operator_pause():
+    runner = recording_runner()
+    stop_action = Value(-2)
+    for _ in range(5):
+        runner.drive(None, stop_action, 3, True, lost=False)
+    assert stop_action.value == -2
+
+
+def test_saves_after_the_duration():
+    runner = recording_runner()
+    stop_action = Value(-1)
+    runner.drive(None, stop_action, 9, True)
+    assert stop_action.value == -1
+    runner.drive(None, stop_action, 10, True)
+    assert stop_action.value == 0
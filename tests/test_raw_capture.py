@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+yaml = pytest.importorskip("yaml")
+pytest.importorskip("webcam_hand_triangulation.capture.finalizable_queue")
+
+from session.mjpeg_capture import CompressedFrame, decode_frame
+from session.raw_capture import RawCaptureReader, RawCaptureWriter
+
+
+def image(seed: int):
+    # smooth, so JPEG keeps it close
+    y, x = np.mgrid[0:48, 0:64]
+    return np.stack([(x * 4 + seed) % 256, (y * 5) % 256, (x + y) % 256], 2).astype(
+        np.uint8
+    )
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "flex0.raw")
+    W, C = 4, 2
+    compressed = [
+        CompressedFrame(cv2.imencode(".jpg", image(k))[1].reshape(-1)) for k in range(3)
+    ]
+    with RawCaptureWriter(path, [0, 1], W, C, 10.0) as writer:
+        for k in range(3):
+            writer.write(
+                k,
+                [(compressed[k], 30), (image(k), 31)],
+                20,
+                np.full((W, C), k, dtype=np.float32),
+            )
+
+    # compressed frames are kept as delivered
+    with open(tmp_path / "flex0.raw" / "cam0.jpg", "rb") as f:
+        assert f.read() == b"".join(frame.data.tobytes() for frame in compressed)
+
+    reader = RawCaptureReader(path)
+    assert len(reader) == 3
+    couples = list(reader.read(1))
+    assert [c.index for c in couples] == [1, 2]
+    for k, coupled in zip([1, 2], couples):
+        (mjpeg, mjpeg_fps), (decoded, decoded_fps) = coupled.frames
+        assert (mjpeg_fps, decoded_fps, coupled.coupling_fps) == (30, 31, 20)
+        # the same orientation the live processing sees
+        assert np.array_equal(mjpeg, decode_frame(compressed[k], cv2.IMREAD_COLOR))
+        assert np.abs(decoded.astype(int) - image(k)).mean() < 4
+        assert np.all(coupled.signal == k)
+
+
+def test_dropped_couple_reads_as_the_previous_frame(tmp_path):
+    path = str(tmp_path / "flex0.raw")
+    W, C = 4, 2
+    with RawCaptureWriter(path, [0], W, C, 10.0) as writer:
+        # described as soon as it is open
+        with open(tmp_path / "flex0.raw" / "raw.yml") as f:
+            assert yaml.safe_load(f)["couples"] == 0
+        writer.write(0, [(image(0), 30)], 20, np.zeros((W, C), dtype=np.float32))
+        writer.write(1, [(None, 30)], 20, np.ones((W, C), dtype=np.float32))
+
+    reader = RawCaptureReader(path)
+    assert (reader.metadata["couples"], reader.metadata["dropped_frames"]) == (2, 1)
+    first, second = reader.read()
+    assert np.array_equal(first.frames[0][0], second.frames[0][0])
+    assert np.all(second.signal == 1)
+
+    # also when the read starts at the dropped couple
+    (alone,) = reader.read(1)
+    assert np.array_equal(alone.frames[0][0], first.frames[0][0])
@@ -0,0 +1,26 @@
+import threading
+
+from session.shutdown import Shutdown
+
+
+def test_overtime_waits_for_the_late_worker():
+    wrap_up = threading.Event()
+    worker = threading.Thread(target=wrap_up.wait, daemon=True)
+    worker.start()
+
+    shutdown = Shutdown()
+    assert shutdown.stage("recording", [worker], 0.05, overtime=wrap_up.set)
+    assert not worker.is_alive()
+    assert (shutdown.stages[0].stuck, shutdown.stages[0].late) == (0, 1)
+
+
+def test_late_threads_are_left_without_overtime():
+    release = threading.Event()
+    worker = threading.Thread(target=release.wait, daemon=True)
+    worker.start()
+
+    shutdown = Shutdown()
+    assert not shutdown.stage("ordering", [worker, None], 0.05)
+    assert worker.is_alive()
+    assert (shutdown.stages[0].stuck, shutdown.stages[0].late) == (1, 1)
+    release.set()